@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+import mimetypes
+from backend import static_assets
+from backend import static_gc
+
+router = APIRouter(prefix="/static", tags=["static"])
+
+def _etag_matches(header, etag):
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+def serve_static(path: str, request: Request):
+    """Static geometry with strong ETags, cache headers, precompressed variants and byte ranges."""
+    file_path = static_assets.resolve(path)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    static_gc.touch(path)
+
+    # Ranges address the identity bytes, so range requests never get a compressed variant
+    if "range" in request.headers:
+        send_path, encoding = file_path, None
+    else:
+        send_path, encoding = static_assets.negotiate(file_path, request.headers.get("accept-encoding"))
+
+    content_hash = static_assets.content_hash(file_path)
+    headers = {
+        # One strong ETag per representation
+        "etag": f'"{content_hash}-{encoding}"' if encoding else f'"{content_hash}"',
+        "cache-control": static_assets.IMMUTABLE_CACHE_CONTROL if static_assets.is_immutable(path) else static_assets.REVALIDATE_CACHE_CONTROL,
+    }
+    if static_assets.has_variants(file_path):
+        headers["vary"] = "Accept-Encoding"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, headers["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["content-encoding"] = encoding
+    media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    # FileResponse handles Range / If-Range (206, multipart, 416) against the ETag set here
+    return FileResponse(send_path, media_type=media_type, headers=headers)
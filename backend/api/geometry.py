@@ -1,20 +1,23 @@
 import os
+import asyncio
 import tempfile
 import shutil
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Header, Request
+from typing import Optional, List
+from fastapi.responses import FileResponse
 from backend.database import get_db
-import trimesh
-try:
-    import gmsh
-    GMSH_AVAILABLE = True
-except OSError as e:
-    # Render or environment missing libGLU
-    logging.warning(f"GMSH import failed (likely missing libGLU): {e}. STEP conversion disabled.")
-    GMSH_AVAILABLE = False
-except ImportError as e:
-    logging.warning(f"GMSH not installed: {e}. STEP conversion disabled.")
-    GMSH_AVAILABLE = False
+from backend import geometry_store
+from backend import upload_sessions
+from backend import mesh_jobs
+from backend import mesh_analysis
+from backend import static_assets
+from backend import static_gc
+from backend import jobs
+from backend import simulation_cache
+from backend.api import jobs as jobs_api
+from backend.workers import get_geometry_pool, get_gmsh_pool, WorkerError, WorkerTimeout
+from starlette.concurrency import run_in_threadpool
 
 from pydantic import BaseModel
 import numpy as np
@@ -26,211 +29,352 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/geometry", tags=["geometry"])
 
-def safe_convert_step_to_stl(input_path: str, output_path: str):
-    """Safely converts STEP to STL using GMSH."""
-    if not GMSH_AVAILABLE:
-        # Retry import in case it was a transient load issue (Docker should have it)
-        try:
-            import gmsh
-            GMSH_AVAILABLE = True
-        except:
-             raise HTTPException(status_code=503, detail="Server missing GMSH libraries. If on Free Tier, switch to Docker Runtime.")
+async def safe_convert_step_to_stl(input_path: str, output_path: str, mesh_size: float = None, threads: int = None):
+    """Safely converts STEP to STL using a persistent GMSH worker process."""
+    if not mesh_jobs.GMSH_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Server missing GMSH libraries. If on Free Tier, switch to Docker Runtime.")
 
     try:
-        if not gmsh.is_initialized():
-            gmsh.initialize()
-        
-        gmsh.clear()
-        
-        # Optimize for Low Memory / Render Free Tier
-        gmsh.option.setNumber("General.NumThreads", 1)  # Avoid thread overhead
-        gmsh.option.setNumber("Mesh.Algorithm", 6)      # Frontal-Delaunay 2D (Usually efficient)
-        gmsh.option.setNumber("General.Terminal", 1)    # Log output
-        
-        gmsh.open(input_path)
-        gmsh.model.mesh.generate(2)
-        
-        # Write Binary STL (Faster, smaller)
-        gmsh.option.setNumber("Mesh.Binary", 1)
-        gmsh.write(output_path)
-    except Exception as e:
+        await get_gmsh_pool().run(mesh_jobs.convert_step_to_stl, input_path, output_path, mesh_size=mesh_size, threads=threads)
+    except WorkerTimeout as e:
+        logger.error(f"GMSH Conversion Timed Out: {e}")
+        raise HTTPException(status_code=422, detail=f"Geometry conversion timed out. Try a smaller file or STL. Internal: {str(e)}")
+    except WorkerError as e:
         logger.error(f"GMSH Conversion Failed: {e}")
-        try:
-           if gmsh.is_initialized():
-                gmsh.finalize()
-        except: pass
         # Provide specific user feedback
         raise HTTPException(status_code=422, detail=f"Geometry conversion failed (Likely Memory Limit). Try a smaller file or STL. Internal: {str(e)}")
-    finally:
-        # Proper cleanup if needed, though finalize might block re-init on some setups. 
-        # Keeping open is often safer in single-process, but here we finalize to be clean.
-        try:
-           if gmsh.is_initialized():
-                gmsh.finalize()
-        except: pass
+
+async def convert_and_store(db, digest, file_path, file_ext, temp_dir, mesh_size=None, threads=None):
+    """Converts (if STEP) and analyzes an upload off the event loop, then stores the STL under its content hash."""
+    output_path = file_path
+
+    # Conversion Logic
+    if file_ext in ['.step', '.stp']:
+        output_path = os.path.join(temp_dir, "converted.stl")
+        jobs.report_progress("converting", 0.1)
+        await safe_convert_step_to_stl(file_path, output_path, mesh_size=mesh_size, threads=threads)
+
+    # Analysis and viewer LODs, side by side on the geometry pool
+    jobs.report_progress("analyzing", 0.4)
+    pool = get_geometry_pool()
+    analysis = pool.run(mesh_jobs.analyze_stl, output_path)
+    lods = pool.run(mesh_jobs.build_lods, output_path, geometry_store.lod_dir(), digest)
+    try:
+        geometry_stats, levels = await asyncio.gather(analysis, lods)
+    except WorkerError as e:
+        logger.error(f"Mesh analysis failed: {e}")
+        raise HTTPException(status_code=422, detail=f"Geometry Analysis Failed: {str(e)}")
+
+    # Persist to Static Directory (Mocking S3)
+    jobs.report_progress("storing", 0.8)
+    try:
+        blob = await run_in_threadpool(geometry_store.store, db, digest, output_path, geometry_stats, geometry_store.lod_entries(levels))
+    except Exception as e:
+        logger.error(f"Failed to move file to static: {e}")
+        raise HTTPException(status_code=500, detail="File storage failed")
+
+    # gzip/brotli siblings for /static; without them the files are still served, just uncompressed
+    assets = [os.path.join(geometry_store.STATIC_DIR, blob["filename"])] + [level["path"] for level in levels]
+    try:
+        await pool.run(static_assets.precompress, assets)
+    except WorkerError as e:
+        logger.warning(f"Precompression failed for {digest[:12]}: {e}")
+    return blob
+
+async def ingest_geometry(db, file_path, filename, digest, project_id=None, mesh_size=None, mesh_threads=None):
+    """Shared tail of single-shot and chunked uploads: dedupe, convert, analyze, store, link to project."""
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext not in ['.step', '.stp', '.stl']:
+        raise HTTPException(status_code=400, detail="Unsupported file format. Use .stl or .step")
+    if file_ext == '.stl':
+        mesh_size = None
+    digest = geometry_store.blob_key(digest, mesh_size)
+
+    # Same bytes seen before: reuse the converted STL and its analysis, skipping gmsh and trimesh
+    blob = await run_in_threadpool(geometry_store.lookup, db, digest)
+    if blob:
+        logger.info(f"Geometry cache hit for {filename} ({digest[:12]})")
+    else:
+        temp_dir = os.path.dirname(file_path)
+        blob = await convert_and_store(db, digest, file_path, file_ext, temp_dir, mesh_size, mesh_threads)
+
+    geometry_stats = blob["stats"]
+    final_filename = blob["filename"]
+    file_url = blob["file_url"]
+
+    # DB Insertion (If Project ID provided)
+    jobs.report_progress("linking", 0.95)
+    part_id = str(uuid.uuid4())
+    if project_id:
+        logger.info(f"Linking geometry to Project {project_id}")
+        part_record = {
+            "id": part_id,
+            "project_id": project_id,
+            "file_url": file_url,
+            "file_name": filename,
+            "volume": geometry_stats["volume_mm3"],
+            "projected_area": geometry_stats["projected_area_mm2"],
+            "bbox_x": geometry_stats["bbox"]["x"],
+            "bbox_y": geometry_stats["bbox"]["y"],
+            "bbox_z": geometry_stats["bbox"]["z"],
+            "content_hash": digest,
+            # Blobs analyzed before the thickness map existed have none; simulation falls back to vol/area
+            "wall_thickness": geometry_stats.get("wall_thickness")
+        }
+        await run_in_threadpool(db.table("parts").insert(part_record).execute)
+
+    logger.info(f"Upload successful: {final_filename}")
+    return {
+        "url": file_url,
+        "filename": final_filename,
+        "part_id": part_id,
+        "stats": geometry_stats,
+        # Coarse to full: the viewer can render the first level at once and refine
+        "lods": [{key: level[key] for key in ("ratio", "url", "triangles", "size_bytes")} for level in blob.get("lods", [])]
+    }
 
 @router.post("/upload")
 async def upload_geometry(
     file: UploadFile = File(...),
     project_id: str = Form(None), # Optional for now to support legacy/wizard
+    mesh_size: float = Form(None), # STEP only: max element size (mm)
+    mesh_threads: int = Form(None), # STEP only: GMSH threads for this conversion
+    background: bool = Form(False), # Answer 202 with a job id at once; the result comes from /jobs/{id}/result
     db = Depends(get_db)
 ):
     logger.info(f"Received file upload: {file.filename} for Project: {project_id}")
     
-    # Max upload size: 15MB
+    # Max single-request upload size: 15MB. Larger files go through /geometry/uploads (chunked).
     MAX_FILE_SIZE_MB = 15
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > MAX_FILE_SIZE_MB * 1024 * 1024:
-            raise HTTPException(status_code=413, detail=f"File too large ({file_size/1024/1024:.1f}MB). Max size {MAX_FILE_SIZE_MB}MB.")
 
-    # Use TemporaryDirectory for automatic cleanup
-    with tempfile.TemporaryDirectory() as temp_dir:
-        file_path = os.path.join(temp_dir, file.filename)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_path = os.path.join(temp_dir, os.path.basename(file.filename))
         
-        # Save uploaded file safely
+        # Save uploaded file safely, hashing it as it streams to disk and stopping at the size limit
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            digest, _ = await run_in_threadpool(geometry_store.save_and_hash, file.file, file_path, MAX_FILE_SIZE_MB * 1024 * 1024)
+        except geometry_store.FileTooLarge:
+            raise HTTPException(status_code=413, detail=f"File too large. Max size {MAX_FILE_SIZE_MB}MB; use the chunked upload API for larger files.")
         except Exception as e:
             logger.error(f"File save error: {e}")
             raise HTTPException(status_code=500, detail="Failed to save uploaded file")
-        
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        output_path = file_path
-        
-        # Conversion Logic
-        if file_ext in ['.step', '.stp']:
-            output_path = os.path.join(temp_dir, "converted.stl")
-            safe_convert_step_to_stl(file_path, output_path)
-        elif file_ext != '.stl':
-            raise HTTPException(status_code=400, detail="Unsupported file format. Use .stl or .step")
-
-        # Analysis Logic
-        geometry_stats = {}
-        try:
-            mesh = trimesh.load(output_path, file_type='stl')
-            
-            if mesh.is_empty:
-                 raise ValueError("Mesh is empty")
-
-            volume_mm3 = float(mesh.volume)
-            bbox_min, bbox_max = mesh.bounds
-            dims = bbox_max - bbox_min
-            
-            projected_area_mm2 = float(dims[0] * dims[1])
-
-            geometry_stats = {
-                "volume_mm3": volume_mm3,
-                "projected_area_mm2": projected_area_mm2,
-                "bbox": {
-                    "x": float(dims[0]),
-                    "y": float(dims[1]),
-                    "z": float(dims[2])
-                }
-            }
-        except Exception as e:
-            logger.error(f"Mesh analysis failed: {e}")
-            raise HTTPException(status_code=422, detail=f"Geometry Analysis Failed: {str(e)}")
-
-        # Persist to Static Directory (Mocking S3)
-        static_dir = "static"
-        os.makedirs(static_dir, exist_ok=True)
-        final_filename = f"model_{uuid.uuid4().hex[:8]}.stl"
-        final_path = os.path.join(static_dir, final_filename)
-        
-        try:
-            shutil.copy2(output_path, final_path)
-        except Exception as e:
-            logger.error(f"Failed to move file to static: {e}")
-            raise HTTPException(status_code=500, detail="File storage failed")
-        
-        file_url = f"/static/{final_filename}"
-
-        # DB Insertion (If Project ID provided)
-        part_id = str(uuid.uuid4())
-        if project_id:
-            logger.info(f"Linking geometry to Project {project_id}")
-            part_record = {
-                "id": part_id,
-                "project_id": project_id,
-                "file_url": file_url,
-                "file_name": file.filename,
-                "volume": geometry_stats["volume_mm3"],
-                "projected_area": geometry_stats["projected_area_mm2"],
-                "bbox_x": geometry_stats["bbox"]["x"],
-                "bbox_y": geometry_stats["bbox"]["y"],
-                "bbox_z": geometry_stats["bbox"]["z"]
-            }
-            db.table("parts").insert(part_record).execute()
-
-        logger.info(f"Upload successful: {final_filename}")
-        return {
-            "url": file_url,
-            "filename": final_filename,
-            "part_id": part_id,
-            "stats": geometry_stats
-        }
 
-class TransformInput(BaseModel):
+        if background:
+            response = jobs_api.submit("upload", ingest_in_background, temp_dir, db, file_path, file.filename, digest, project_id, mesh_size, mesh_threads)
+            temp_dir = None # The job owns it now
+            return response
+        return await ingest_geometry(db, file_path, file.filename, digest, project_id, mesh_size, mesh_threads)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+async def ingest_in_background(temp_dir, *args):
+    """ingest_geometry() as a queued job; removes the upload's temp directory when done."""
+    try:
+        return await ingest_geometry(*args)
+    finally:
+        await run_in_threadpool(shutil.rmtree, temp_dir, True)
+
+# --- Chunked, resumable uploads (init -> PUT chunks -> complete) ---
+
+class ChunkedUploadInit(BaseModel):
     filename: str
+    size: int
+    chunk_size: Optional[int] = None
+    sha256: Optional[str] = None # Whole-file checksum, verified on complete
+    project_id: Optional[str] = None
+
+class ChunkedUploadComplete(BaseModel):
+    mesh_size: Optional[float] = None
+    mesh_threads: Optional[int] = None
+    background: bool = False # Run assembly + ingest as a job and answer 202 with its id
+
+def _upload_session_response(session):
+    received = upload_sessions.received_chunks(session)
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "chunk_count": session["chunk_count"],
+        "received_chunks": received,
+        "complete": len(received) == session["chunk_count"]
+    }
+
+@router.post("/uploads")
+def init_chunked_upload(input_data: ChunkedUploadInit):
+    try:
+        session = upload_sessions.create(input_data.filename, input_data.size, input_data.chunk_size, input_data.sha256, input_data.project_id)
+    except upload_sessions.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _upload_session_response(session)
+
+@router.get("/uploads/{upload_id}")
+def get_chunked_upload(upload_id: str):
+    # Clients resume by re-sending only the chunks missing from received_chunks
+    try:
+        return _upload_session_response(upload_sessions.load(upload_id))
+    except upload_sessions.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request, x_chunk_sha256: str = Header(...)):
+    try:
+        session = await run_in_threadpool(upload_sessions.load, upload_id)
+        size = await upload_sessions.write_chunk(session, index, request.stream(), x_chunk_sha256)
+    except upload_sessions.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"upload_id": upload_id, "index": index, "size": size}
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_chunked_upload(upload_id: str, input_data: ChunkedUploadComplete = None, db = Depends(get_db)):
+    input_data = input_data or ChunkedUploadComplete()
+    try:
+        session = await run_in_threadpool(upload_sessions.load, upload_id)
+    except upload_sessions.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if input_data.background:
+        return jobs_api.submit("upload", finish_chunked_upload, db, session, input_data.mesh_size, input_data.mesh_threads)
+    return await finish_chunked_upload(db, session, input_data.mesh_size, input_data.mesh_threads)
+
+async def finish_chunked_upload(db, session, mesh_size=None, mesh_threads=None):
+    """Assembles a complete chunked upload and ingests it."""
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, session["filename"])
+            jobs.report_progress("assembling", 0.05)
+            digest = await run_in_threadpool(upload_sessions.assemble, session, file_path)
+            result = await ingest_geometry(db, file_path, session["filename"], digest, session["project_id"], mesh_size, mesh_threads)
+    except upload_sessions.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await run_in_threadpool(upload_sessions.discard, session)
+    return result
+
+class TransformInput(BaseModel):
+    filename: Optional[str] = None # Stored STL to rotate...
+    part_id: Optional[str] = None # ...or a part, whose stored transform is updated
     rotation_x: float = 0.0
     rotation_y: float = 0.0
     rotation_z: float = 0.0
+    transform: Optional[List[List[float]]] = None # With filename: the transform returned by the previous call, to chain on
 
 @router.post("/transform")
-def transform_geometry(input_data: TransformInput):
-    static_dir = "static"
-    file_path = os.path.join(static_dir, input_data.filename)
-    
-    if not os.path.exists(file_path):
+def transform_geometry(input_data: TransformInput, db = Depends(get_db)):
+    """Rotates a stored mesh without writing a new file.
+
+    The rotation is composed onto the current 4x4 transform (the part's, or the one passed in),
+    stats are computed from the cached base mesh, and the returned url materializes the
+    transformed STL only when it is downloaded.
+    """
+    part = None
+    if input_data.part_id:
+        part_res = db.table("parts").select("*").eq("id", input_data.part_id).execute()
+        if not part_res.data:
+            raise HTTPException(status_code=404, detail="Part not found")
+        part = part_res.data[0]
+        filename = geometry_store.static_filename(part["file_url"])
+        base = part.get("transform")
+    elif input_data.filename:
+        filename = input_data.filename
+        base = input_data.transform
+    else:
+        raise HTTPException(status_code=400, detail="Provide a filename or a part_id")
+
+    base = np.eye(4) if base is None else np.asarray(base, dtype=np.float64)
+    if base.shape != (4, 4):
+        raise HTTPException(status_code=400, detail="transform must be a 4x4 matrix")
+
+    if geometry_store.static_path(filename) is None:
         raise HTTPException(status_code=404, detail="File not found")
-        
+
     try:
-        mesh = trimesh.load(file_path, file_type='stl')
-        
-        # Apply rotations
-        if input_data.rotation_x:
-            mesh.apply_transform(trimesh.transformations.rotation_matrix(
-                np.radians(input_data.rotation_x), [1, 0, 0]
-            ))
-        if input_data.rotation_y:
-            mesh.apply_transform(trimesh.transformations.rotation_matrix(
-                np.radians(input_data.rotation_y), [0, 1, 0]
-            ))
-        if input_data.rotation_z:
-            mesh.apply_transform(trimesh.transformations.rotation_matrix(
-                np.radians(input_data.rotation_z), [0, 0, 1]
-            ))
-            
-        new_filename = f"rotated_{uuid.uuid4().hex[:8]}.stl"
-        output_path = os.path.join(static_dir, new_filename)
-        mesh.export(output_path)
-        
-        # Recalculate stats
-        volume_mm3 = float(mesh.volume)
-        bbox_min, bbox_max = mesh.bounds
-        dims = bbox_max - bbox_min
-        projected_area_mm2 = float(dims[0] * dims[1])
-
-        geometry_stats = {
-            "volume_mm3": volume_mm3,
-            "projected_area_mm2": projected_area_mm2,
-            "bbox": {
-                "x": float(dims[0]),
-                "y": float(dims[1]),
-                "z": float(dims[2])
-            }
-        }
+        # Chain: the new rotation applies after everything already applied
+        matrix = mesh_analysis.rotation_transform(input_data.rotation_x, input_data.rotation_y, input_data.rotation_z) @ base
+        triangles = geometry_store.load_base_triangles(filename)
 
-        return {
-            "url": f"/static/{new_filename}",
-            "filename": new_filename,
-            "stats": geometry_stats
-        }
+        # Recalculate stats (wall thickness does not change with orientation)
+        geometry_stats = mesh_analysis.stats_from_triangles(mesh_analysis.apply_transform(triangles, matrix), thickness=False)
+        if geometry_stats is None:
+            raise ValueError("Mesh is empty")
 
+        key = geometry_store.record_transform(db, filename, matrix)
     except Exception as e:
         logger.error(f"Transformation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Transformation failed: {str(e)}")
+
+    if part:
+        db.table("parts").update({
+            "transform": matrix.tolist(),
+            "projected_area": geometry_stats["projected_area_mm2"],
+            "bbox_x": geometry_stats["bbox"]["x"],
+            "bbox_y": geometry_stats["bbox"]["y"],
+            "bbox_z": geometry_stats["bbox"]["z"]
+        }).eq("id", part["id"]).execute()
+        simulation_cache.invalidate(part_id=part["id"])
+
+    return {
+        "url": f"/geometry/mesh/{key}",
+        "filename": filename,
+        "transform": matrix.tolist(),
+        "stats": geometry_stats
+    }
+
+@router.get("/mesh/{key}")
+def download_transformed_mesh(key: str, db = Depends(get_db)):
+    """The transformed STL behind a /geometry/transform url, written on first download."""
+    path = geometry_store.materialize(db, key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Transformed mesh not found")
+    return FileResponse(path, media_type="model/stl", filename=f"{key[:12]}.stl")
+
+class OrientInput(BaseModel):
+    filename: str
+    top_n: int = 5
+    machine_id: Optional[str] = None # Tie-bar spacing from this machine...
+    tie_bar_x_mm: Optional[float] = None # ...or given directly
+    tie_bar_y_mm: Optional[float] = None
+
+@router.post("/orient")
+async def orient_geometry(input_data: OrientInput, db = Depends(get_db)):
+    """Searches hundreds of molding orientations at once and returns the best top_n.
+
+    Each result carries the rotation_x/y/z to pass to /geometry/transform to apply it.
+    """
+    file_path = geometry_store.static_path(input_data.filename)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not 1 <= input_data.top_n <= 20:
+        raise HTTPException(status_code=400, detail="top_n must be between 1 and 20")
+
+    tie_bars = None
+    if input_data.machine_id:
+        machine_res = await run_in_threadpool(db.table("machines").select("*").eq("id", input_data.machine_id).execute)
+        if not machine_res.data:
+            raise HTTPException(status_code=404, detail="Machine not found")
+        machine = machine_res.data[0]
+        tie_bars = (float(machine["tie_bar_spacing_x"]), float(machine["tie_bar_spacing_y"]))
+    elif input_data.tie_bar_x_mm and input_data.tie_bar_y_mm:
+        tie_bars = (input_data.tie_bar_x_mm, input_data.tie_bar_y_mm)
+
+    try:
+        result = await get_geometry_pool().run(mesh_jobs.orient_stl, file_path, input_data.top_n, tie_bars)
+    except WorkerError as e:
+        logger.error(f"Orientation search failed: {e}")
+        raise HTTPException(status_code=422, detail=f"Orientation search failed: {str(e)}")
+
+    return {
+        "filename": input_data.filename,
+        "tie_bars_mm": list(tie_bars) if tie_bars else None,
+        **result
+    }
+
+@router.get("/storage")
+def storage_stats():
+    """Static store collector stats: runs so far, files evicted and bytes reclaimed, and the last pass."""
+    return static_gc.totals()
+
+@router.post("/storage/gc")
+def run_storage_gc(db = Depends(get_db)):
+    """Runs a collection pass now instead of waiting for the background collector."""
+    return static_gc.collect(db)
@@ -0,0 +1,71 @@
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from backend import jobs
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# A comment line is sent this often while nothing changes, so proxies keep the stream open
+STREAM_KEEPALIVE_S = 15.0
+
+def _job_or_404(job_id):
+    job = jobs.get_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def accepted(status):
+    """202 response for a freshly submitted job, pointing at where to follow it."""
+    links = {
+        "status_url": f"/jobs/{status['id']}",
+        "result_url": f"/jobs/{status['id']}/result",
+        "events_url": f"/jobs/{status['id']}/events",
+    }
+    return JSONResponse(status_code=202, content={**status, **links}, headers={"Location": links["status_url"]})
+
+def submit(job_type, fn, *args, **kwargs):
+    """Queues a job for an endpoint and returns its 202 response."""
+    try:
+        return accepted(jobs.get_queue().submit(job_type, fn, *args, **kwargs))
+    except jobs.QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Job queue is full ({e}). Retry later.")
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    status = jobs.get_queue().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id: str):
+    job = _job_or_404(job_id)
+    if job.status == jobs.SUCCEEDED:
+        return job.result
+    if job.status == jobs.FAILED:
+        # Same status and detail the endpoint would have answered with if run inline
+        raise HTTPException(status_code=job.error["status_code"], detail=job.error["detail"])
+    return JSONResponse(status_code=202, content=jobs.get_queue().status(job_id))
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Server-sent events: a `progress` event on every status change, then one `done` event."""
+    job = _job_or_404(job_id)
+    queue = jobs.get_queue()
+
+    async def events():
+        version = None
+        while True:
+            if version != job.version:
+                version = job.version
+                status = queue.status(job_id) or job.describe()
+                done = status["status"] in jobs.FINISHED
+                yield f"event: {'done' if done else 'progress'}\ndata: {json.dumps(status)}\n\n"
+                if done:
+                    return
+            if await request.is_disconnected():
+                return
+            if await queue.wait_for_change(job, version, STREAM_KEEPALIVE_S) == version:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
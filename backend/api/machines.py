@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List
 # from sqlmodel import Session, select
 from backend.database import get_db
+from backend import machine_catalog
 from backend.models_fixed import Machine
 
 router = APIRouter(prefix="/machines", tags=["machines"])
@@ -8,7 +10,8 @@ router = APIRouter(prefix="/machines", tags=["machines"])
 @router.post("/", response_model=Machine)
 def create_machine(machine: Machine, db = Depends(get_db)):
     # Mock DB: Insert
-    res = db.table("machines").insert(machine.dict()).execute()
+    res = db.table("machines").insert(machine.model_dump()).execute()
+    machine_catalog.invalidate()
     return res.data[0]
 
 @router.get("/", response_model=List[Machine])
@@ -17,11 +20,9 @@ def read_machines(
     limit: int = Query(default=100, le=100),
     db = Depends(get_db)
 ):
-    # Mock DB: Select All
-    res = db.table("machines").select("*").execute()
-    machines = res.data
-    # Manual pagination for mock
-    return machines[offset : offset + limit]
+    # Mock DB: Select Page (range bounds are inclusive)
+    res = db.table("machines").select("*").range(offset, offset + limit - 1).execute()
+    return res.data
 
 @router.get("/{machine_id}", response_model=Machine)
 def read_machine(machine_id: str, db = Depends(get_db)):
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 from backend.database import get_db
+from backend import simulation_cache
 
 router = APIRouter(prefix="/materials", tags=["materials"])
 
@@ -12,6 +13,17 @@ class MaterialRead(BaseModel):
     melt_temp_c: float
     mold_temp_c: float
     shrinkage: float
+    thermal_conductivity_w_mk: Optional[float] = None
+    specific_heat_j_kgk: Optional[float] = None
+
+class MaterialUpdate(BaseModel):
+    name: Optional[str] = None
+    density_g_cm3: Optional[float] = None
+    melt_temp_c: Optional[float] = None
+    mold_temp_c: Optional[float] = None
+    shrinkage: Optional[float] = None
+    thermal_conductivity_w_mk: Optional[float] = None
+    specific_heat_j_kgk: Optional[float] = None
 
 @router.get("/", response_model=List[MaterialRead])
 def list_materials(db = Depends(get_db)):
@@ -22,3 +34,15 @@ def list_materials(db = Depends(get_db)):
         raise HTTPException(status_code=500, detail=response.error)
         
     return response.data
+
+@router.patch("/{material_id}", response_model=MaterialRead)
+def update_material(material_id: str, material: MaterialUpdate, db = Depends(get_db)):
+    values = {key: value for key, value in material.model_dump().items() if value is not None}
+    if not values:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    response = db.table("materials").update(values).eq("id", material_id).execute()
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Material not found")
+    # Cached simulation results for the old properties can no longer be hit
+    simulation_cache.invalidate(material_id=material_id)
+    return response.data[0]
@@ -61,16 +61,17 @@ def get_project(project_id: str, db = Depends(get_db)):
     parts_res = db.table("parts").select("*").eq("project_id", project_id).execute()
     project["parts"] = parts_res.data if parts_res.data else []
     
-    # 3. Get Simulations
-    sim_res = db.table("simulations").select("*").eq("project_id", project_id).execute()
-    # Sort by created_at desc to get latest
-    sims = sorted(sim_res.data, key=lambda x: x["created_at"], reverse=True) if sim_res.data else []
-    project["simulation_result"] = sims[0]["result"] if sims else None
+    # 3. Get Latest Simulation
+    sim_res = db.table("simulations").select("result").eq("project_id", project_id).order("created_at", desc=True).limit(1).execute()
+    project["simulation_result"] = sim_res.data[0]["result"] if sim_res.data else None
 
     return project
 
 @router.delete("/{project_id}")
 def delete_project(project_id: str, db = Depends(get_db)):
-    # Note: Mock DB doesn't support delete yet in client, but API exists
-    return {"message": "Project deleted (Mock)"}
+    # Cascades to the project's parts and simulations
+    res = db.table("projects").delete().eq("id", project_id).execute()
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return {"message": "Project deleted"}
 
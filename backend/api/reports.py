@@ -44,6 +44,10 @@ def generate_report(input_data: ReportInput, db = Depends(get_db)):
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
 
+    # The simulation's own pick when the request names no machine
+    selected = input_data.simulation_result.get("machine") or {}
+    auto_machine = f"{selected['name']} (Auto-Selected)" if selected.get("name") else "Auto-Selected"
+
     # Generate HTML Content
     # In a real app, use Jinja2 templates. For MVP, f-strings are fine.
     
@@ -86,7 +90,7 @@ def generate_report(input_data: ReportInput, db = Depends(get_db)):
                 <tr><th>Project Name</th><td>{input_data.project_name}</td></tr>
                 <tr><th>Designer</th><td>{input_data.designer_name}</td></tr>
                 <tr><th>Material</th><td>{material['name']} ({material.get('family', 'Generic')}) - {material.get('manufacturer', 'Generic')}</td></tr>
-                <tr><th>Machine</th><td>{machine['name'] if machine else "Auto-Selected"}</td></tr>
+                <tr><th>Machine</th><td>{machine['name'] if machine else auto_machine}</td></tr>
             </table>
         </div>
 
@@ -1,16 +1,33 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, Dict, List
-import math
+import os
+import json
 import uuid
+import hashlib
 import datetime
+import time
+import asyncio
+import numpy as np
+from starlette.concurrency import run_in_threadpool
 from backend.database import get_db
+from backend import physics
+from backend import doe
+from backend import simulation_cache
+from backend import machine_catalog
+from backend import geometry_store
+from backend import static_gc
+from backend import mesh_jobs
+from backend import fill_solver
+from backend.workers import get_geometry_pool, WorkerError
+from backend.api import jobs as jobs_api
 
 router = APIRouter(prefix="/simulation", tags=["simulation"])
 
 class SimulationRequest(BaseModel):
     project_id: str
     material_id: Optional[str] = None # Optional override if not in project
+    background: bool = False # Queue it and answer 202 with a job id; the result comes from /jobs/{id}/result
 
 class SimulationResult(BaseModel):
     fill_time_s: float
@@ -22,25 +39,16 @@ class SimulationResult(BaseModel):
     feasibility: str
     warnings: List[str]
     recommendations: List[str]
-
-def estimate_thickness(vol, area):
-    if area == 0: return 1.0
-    thickness = vol / area
-    return max(thickness, 0.5)
-
-def calculate_cooling_time(thickness_mm, melt_temp, mold_temp, eject_temp, alpha=0.08):
-    try:
-        term1 = (thickness_mm ** 2) / (math.pi ** 2 * alpha)
-        if (eject_temp - mold_temp) == 0: return 10.0
-        ratio = (4 / math.pi) * (melt_temp - mold_temp) / (eject_temp - mold_temp)
-        if ratio <= 0: return 1.0
-        term2 = math.log(ratio)
-        return max(term1 * term2, 1.0)
-    except:
-        return 10.0
+    machine: Optional[Dict] = None # Smallest machine on file with the tonnage, shot volume and tie-bar clearance
+    runner_up_machine: Optional[Dict] = None
+    cooling_limiting_region: Optional[Dict] = None # Thickness bin whose centreline reaches ejection last
+    cooling_by_thickness: Optional[List[Dict]] = None # Time to ejection per wall-thickness bin
 
 @router.post("/run", response_model=SimulationResult)
 def run_simulation(input_data: SimulationRequest, db = Depends(get_db)):
+    if input_data.background:
+        return jobs_api.submit("simulation", run_simulation, input_data.model_copy(update={"background": False}), db)
+
     # 1. Fetch Project & Part
     project_res = db.table("projects").select("*").eq("id", input_data.project_id).execute()
     if not project_res.data:
@@ -62,76 +70,364 @@ def run_simulation(input_data: SimulationRequest, db = Depends(get_db)):
          raise HTTPException(status_code=404, detail="Material not found in DB.")
     material = mat_res.data[0]
 
-    # 3. Prepare Physics Data
-    vol = float(part.get("volume", 0))
-    area = float(part.get("projected_area", 1))
-    bbox_x = float(part.get("bbox_x", 0))
-    bbox_y = float(part.get("bbox_y", 0))
-    bbox_z = float(part.get("bbox_z", 0))
-
-    # Material Props (Handle missing gracefully with defaults)
-    melt_temp = float(material.get("melt_temp_c", 230))
-    mold_temp = float(material.get("mold_temp_c", 50))
-    density = float(material.get("density_g_cm3", 1.0))
-    shrinkage = float(material.get("shrinkage", 0.01))
-
-    # 4. Run Heuristics
-    thickness = estimate_thickness(vol, area)
-    
-    # Flow Length (Diagonal of bbox)
-    flow_length = math.sqrt(bbox_x**2 + bbox_y**2 + bbox_z**2)
-    
-    # L/t Ratio
-    lt_ratio = flow_length / thickness
-    max_lt = 200 # Generic limit
-    
-    warnings = []
-    feasibility = "Feasible"
-    
-    if lt_ratio > max_lt:
-        warnings.append(f"High Flow/Thickness ratio ({lt_ratio:.1f}). Risk of short shot.")
-        feasibility = "Not Recommended"
-    
-    # Pressure
-    viscosity_factor = 1.0 # Placeholder
-    pressure_mpa = 40 * viscosity_factor * (lt_ratio / 100)
-    if pressure_mpa > 180:
-        warnings.append("High injection pressure required.")
-        feasibility = "Borderline"
-
-    # Clamp Force
-    cavity_pressure = pressure_mpa * 0.5 
-    clamp_force_n = area * cavity_pressure
-    clamp_tonnage = clamp_force_n / 9800 * 1.1
-
-    # Cooling
-    eject_temp = melt_temp - 100 # Approx
-    cooling_time = calculate_cooling_time(thickness, melt_temp, mold_temp, eject_temp)
-    cycle_time = cooling_time + 5
-
-    # Shot Weight
-    shot_weight = (vol / 1000) * density
-
-    result_data = {
-        "fill_time_s": round(max(0.5, flow_length / 100), 2),
-        "injection_pressure_mpa": round(pressure_mpa, 1),
-        "clamp_tonnage_tons": round(clamp_tonnage, 1),
-        "cooling_time_s": round(cooling_time, 1),
-        "cycle_time_s": round(cycle_time, 1),
-        "shot_weight_g": round(shot_weight, 1),
-        "feasibility": feasibility,
-        "warnings": warnings,
-        "recommendations": [f"Expected shrinkage: ~{shrinkage*100:.1f}%"]
-    }
+    # 3. Same part geometry, material and solver as an earlier run: reuse its result
+    key = simulation_cache.cache_key(part, material, machine_catalog.version())
+    cached = simulation_cache.get(key)
+    if cached:
+        if input_data.project_id not in cached["saved_for"]:
+            # First run for this project, or its latest record is another result: save it once
+            _save_simulation(db, input_data.project_id, cached["result"])
+            simulation_cache.mark_saved(cached, input_data.project_id)
+        return cached["result"]
+
+    # 4. Run Heuristics (the one-material case of the sweep's array code)
+    results = physics.evaluate(part, [material])
+    result_data = physics.summarize(results, 0)
+    result_data.update(_select_machines(db, part, results, result_data["warnings"]))
 
     # 5. Save Result
+    _save_simulation(db, input_data.project_id, result_data)
+    simulation_cache.put(key, result_data, part.get("id"), mat_id, input_data.project_id)
+
+    return result_data
+
+def _machine_choice(machine, tonnage, shot_volume_cm3):
+    return {
+        "id": machine.get("id"),
+        "name": machine.get("name"),
+        "clamp_tonnage": machine.get("clamp_tonnage"),
+        "max_shot_volume": machine.get("max_shot_volume"),
+        "tonnage_utilization": round(tonnage / float(machine["clamp_tonnage"]), 3) if machine.get("clamp_tonnage") else None,
+        "shot_utilization": round(shot_volume_cm3 / float(machine["max_shot_volume"]), 3) if machine.get("max_shot_volume") else None,
+    }
+
+def _select_machines(db, part, results, warnings):
+    """Best and runner-up machine for the part from the catalog index; warns when none fits."""
+    catalog = machine_catalog.get(db)
+    tonnage = float(results["clamp_tonnage_tons"][0])
+    shot_volume = float(results["shot_volume_cm3"][0])
+    chosen = catalog.select(tonnage, shot_volume, physics.part_inputs(part)["bbox"])
+    if len(catalog) and not chosen:
+        warnings.append("No machine on file has the clamp tonnage, shot volume and tie-bar clearance for this part.")
+    choices = [_machine_choice(m, tonnage, shot_volume) for m in chosen]
+    return {
+        "machine": choices[0] if choices else None,
+        "runner_up_machine": choices[1] if len(choices) > 1 else None,
+    }
+
+@router.get("/cache")
+def simulation_cache_stats():
+    """Hit/miss counts and size of the /simulation/run result cache."""
+    return simulation_cache.stats()
+
+def _save_simulation(db, project_id, result_data):
     sim_record = {
         "id": str(uuid.uuid4()),
-        "project_id": input_data.project_id,
+        "project_id": project_id,
         "created_at": datetime.datetime.now().isoformat(),
         "result": result_data
     }
     db.table("simulations").insert(sim_record).execute()
+    # Now the project's latest simulation: cached results saved for it earlier must write again
+    simulation_cache.forget_project(project_id)
 
-    return result_data
+class SweepRequest(BaseModel):
+    project_id: str
+    material_ids: Optional[List[str]] = None # Default: every material
+    machine_ids: Optional[List[str]] = None # Default: every machine
+    top_n: Optional[int] = None # Rows returned; the saved record always has the full table
+    save: bool = True
+
+def _select_by_id(db, table, ids, label):
+    rows = db.table(table).select("*").execute().data or []
+    if ids is None:
+        return rows
+    by_id = {str(row["id"]): row for row in rows}
+    missing = [i for i in ids if i not in by_id]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"{label} not found: {', '.join(missing)}")
+    return [by_id[i] for i in ids]
+
+@router.post("/sweep")
+def run_sweep(input_data: SweepRequest, db = Depends(get_db)):
+    """Evaluates the project's part against every material x machine pair in one pass and ranks them.
+
+    Feasible results come first, then pairs whose machine has the tonnage, shot volume and
+    tie-bar clearance for the part, then shorter cycles, then smaller machines.
+    """
+    project_res = db.table("projects").select("id").eq("id", input_data.project_id).execute()
+    if not project_res.data:
+        raise HTTPException(status_code=404, detail="Project not found")
+    parts_res = db.table("parts").select("*").eq("project_id", input_data.project_id).execute()
+    if not parts_res.data:
+        raise HTTPException(status_code=400, detail="Project has no geometry/part uploaded.")
+    part = parts_res.data[0] # Assume one part for now
+
+    materials = _select_by_id(db, "materials", input_data.material_ids, "Materials")
+    if not materials:
+        raise HTTPException(status_code=400, detail="No materials to sweep.")
+    machines = _select_by_id(db, "machines", input_data.machine_ids, "Machines")
+
+    results = physics.evaluate(part, materials)
+    summaries = [physics.summarize(results, i) for i in range(len(materials))]
+    k = len(materials)
+
+    if machines:
+        fit = physics.machine_fit(results, part, machines)
+        fits = (fit["tonnage_ok"] & fit["shot_volume_ok"] & fit["tie_bar_ok"]).ravel()
+        material_index = np.repeat(np.arange(k), len(machines))
+        machine_index = np.tile(np.arange(len(machines)), k)
+        tonnage = np.array([float(m.get("clamp_tonnage", 0)) for m in machines])[machine_index]
+    else:
+        # No machines on file: rank materials alone
+        fit = None
+        fits = np.ones(k, dtype=bool)
+        material_index = np.arange(k)
+        machine_index = np.full(k, -1)
+        tonnage = np.zeros(k)
+
+    order = np.lexsort((tonnage, results["cycle_time_s"][material_index], ~fits, results["feasibility"][material_index]))
+
+    rows = []
+    for rank, row in enumerate(order, start=1):
+        i, j = int(material_index[row]), int(machine_index[row])
+        machine = machines[j] if j >= 0 else None
+        rows.append({
+            "rank": rank,
+            "material_id": materials[i]["id"],
+            "material_name": materials[i].get("name"),
+            "machine_id": machine["id"] if machine else None,
+            "machine_name": machine.get("name") if machine else None,
+            "machine_fit": bool(fits[row]),
+            "machine_checks": {
+                "clamp_tonnage": bool(fit["tonnage_ok"][i, j]),
+                "shot_volume": bool(fit["shot_volume_ok"][i, j]),
+                "tie_bar_spacing": bool(fit["tie_bar_ok"][i, j]),
+            } if machine else None,
+            **summaries[i]
+        })
+
+    # One write for the whole sweep; its result is the best pair's, so the project's latest simulation is that one
+    best = rows[0]
+    if input_data.save:
+        db.table("simulations").insert({
+            "id": str(uuid.uuid4()),
+            "project_id": input_data.project_id,
+            "created_at": datetime.datetime.now().isoformat(),
+            "material_id": best["material_id"],
+            "machine_id": best["machine_id"],
+            "result": summaries[int(material_index[order[0]])],
+            "sweep": rows
+        }).execute()
+        # The sweep record is now the project's latest simulation
+        simulation_cache.forget_project(input_data.project_id)
+
+    return {
+        "project_id": input_data.project_id,
+        "part_id": part.get("id"),
+        "materials": k,
+        "machines": len(machines),
+        "combinations": len(rows),
+        "best": best,
+        "rows": rows[:input_data.top_n] if input_data.top_n else rows
+    }
 
+# --- Process window (design of experiments over process settings) ---
+
+# Front points returned; the full front size is always reported
+DOE_MAX_FRONT = 100
+# Defaults around the material's nominal settings when a factor's range is not given
+DEFAULT_TEMP_SPAN_C = 20
+DEFAULT_THICKNESS_SCALE = (0.8, 1.2)
+DEFAULT_GATE_COUNT = (1, 4)
+
+class FactorRange(BaseModel):
+    min: float
+    max: float
+    levels: int = 5 # Grid designs only
+
+class ProcessWindowRequest(BaseModel):
+    project_id: str
+    material_id: Optional[str] = None # Default: the project's material
+    melt_temp_c: Optional[FactorRange] = None
+    mold_temp_c: Optional[FactorRange] = None
+    thickness_scale: Optional[FactorRange] = None # Multiplies the nominal wall thickness
+    gate_count: Optional[FactorRange] = None
+    design: str = "grid" # "grid" (full factorial) or "lhs" (Latin hypercube)
+    samples: int = 1000 # lhs only
+    seed: int = 0
+    machine_id: Optional[str] = None # Cases needing more clamp tonnage than this machine has are infeasible
+    background: bool = False
+
+def _factor_ranges(input_data, material):
+    melt = float(material.get("melt_temp_c") or 230)
+    mold = float(material.get("mold_temp_c") or 50)
+    defaults = {
+        "melt_temp_c": (melt - DEFAULT_TEMP_SPAN_C, melt + DEFAULT_TEMP_SPAN_C, 5),
+        "mold_temp_c": (max(mold - DEFAULT_TEMP_SPAN_C, 0), mold + DEFAULT_TEMP_SPAN_C, 5),
+        "thickness_scale": (*DEFAULT_THICKNESS_SCALE, 5),
+        "gate_count": (*DEFAULT_GATE_COUNT, DEFAULT_GATE_COUNT[1] - DEFAULT_GATE_COUNT[0] + 1),
+    }
+    ranges = {}
+    for name in doe.FACTORS:
+        given = getattr(input_data, name)
+        ranges[name] = (given.min, given.max, given.levels) if given else defaults[name]
+        low, high, levels = ranges[name]
+        if low > high or levels < 1:
+            raise HTTPException(status_code=400, detail=f"{name}: need min <= max and levels >= 1")
+    if ranges["thickness_scale"][0] <= 0:
+        raise HTTPException(status_code=400, detail="thickness_scale must be positive")
+    if ranges["gate_count"][0] < 1:
+        raise HTTPException(status_code=400, detail="gate_count must be at least 1")
+    return ranges
+
+@router.post("/process-window")
+async def explore_process_window(input_data: ProcessWindowRequest, db = Depends(get_db)):
+    """Evaluates a grid or Latin hypercube of process settings for the project's part and material.
+
+    Returns the feasible window (per factor: feasible range and feasibility by level) and the
+    Pareto front of feasible cases over cycle time, injection pressure and clamp tonnage.
+    """
+    if input_data.background:
+        return jobs_api.submit("simulation", explore_process_window, input_data.model_copy(update={"background": False}), db)
+    if input_data.design not in ("grid", "lhs"):
+        raise HTTPException(status_code=400, detail="design must be 'grid' or 'lhs'")
+
+    project_res = await run_in_threadpool(db.table("projects").select("*").eq("id", input_data.project_id).execute)
+    if not project_res.data:
+        raise HTTPException(status_code=404, detail="Project not found")
+    parts_res = await run_in_threadpool(db.table("parts").select("*").eq("project_id", input_data.project_id).execute)
+    if not parts_res.data:
+        raise HTTPException(status_code=400, detail="Project has no geometry/part uploaded.")
+    part = parts_res.data[0] # Assume one part for now
+    mat_id = input_data.material_id or project_res.data[0].get("material_id")
+    if not mat_id:
+        raise HTTPException(status_code=400, detail="Material not selected for project.")
+    mat_res = await run_in_threadpool(db.table("materials").select("*").eq("id", mat_id).execute)
+    if not mat_res.data:
+        raise HTTPException(status_code=404, detail="Material not found in DB.")
+    material = mat_res.data[0]
+    tonnage_limit = None
+    if input_data.machine_id:
+        machine_res = await run_in_threadpool(db.table("machines").select("*").eq("id", input_data.machine_id).execute)
+        if not machine_res.data:
+            raise HTTPException(status_code=404, detail="Machine not found")
+        tonnage_limit = float(machine_res.data[0]["clamp_tonnage"])
+
+    ranges = _factor_ranges(input_data, material)
+    count = doe.case_count(ranges, input_data.design, input_data.samples)
+    if not 1 <= count <= doe.DOE_MAX_CASES:
+        raise HTTPException(status_code=400, detail=f"Design has {count} cases; the limit is {doe.DOE_MAX_CASES}")
+
+    started = time.monotonic()
+    if input_data.design == "lhs":
+        cases = doe.latin_hypercube(ranges, input_data.samples, input_data.seed)
+    else:
+        cases = doe.grid(ranges)
+    # Integer factors can collapse grid levels, so count again
+    count = len(cases[doe.FACTORS[0]])
+
+    # Contiguous chunks, one per worker, evaluated side by side
+    pool = get_geometry_pool()
+    chunks = doe.split(cases, max(1, min(pool.size, count // doe.DOE_MIN_CHUNK)))
+    geometry = physics.part_inputs(part)
+    props = physics.material_arrays([material])
+    try:
+        outputs = await asyncio.gather(*(pool.run(doe.evaluate_chunk, geometry, props, chunk, tonnage_limit) for chunk in chunks))
+    except WorkerError as e:
+        raise HTTPException(status_code=500, detail=f"Process window evaluation failed: {str(e)}")
+
+    offsets = np.cumsum([0] + [len(chunk[doe.FACTORS[0]]) for chunk in chunks])
+    results = {key: np.concatenate([out[key] for out in outputs]) for key in outputs[0] if key != "front"}
+    candidates = np.concatenate([out["front"] + offset for out, offset in zip(outputs, offsets)])
+    objectives = np.stack([results[name] for name in doe.OBJECTIVES], axis=1)
+    front = candidates[doe.pareto_front(objectives[candidates])] if len(candidates) else candidates
+    feasible = results["feasible"]
+
+    def case(i):
+        return {
+            **{name: float(cases[name][i]) for name in doe.FACTORS},
+            **{name: round(float(results[name][i]), 2) for name in ("cycle_time_s", "cooling_time_s", "fill_time_s", "injection_pressure_mpa", "clamp_tonnage_tons", "shot_weight_g")}
+        }
+
+    fastest = int(np.flatnonzero(feasible)[np.argmin(results["cycle_time_s"][feasible])]) if feasible.any() else None
+    return {
+        "project_id": input_data.project_id,
+        "material_id": mat_id,
+        "design": input_data.design,
+        "cases": count,
+        "chunks": len(chunks),
+        "feasible_cases": int(feasible.sum()),
+        "feasible_fraction": float(feasible.mean()),
+        "infeasible_reasons": {reason: int(results[reason].sum()) for reason in ("short_shot_risk", "high_pressure", "over_tonnage")},
+        "window": doe.window(cases, feasible),
+        "fastest_feasible": case(fastest) if fastest is not None else None,
+        "pareto_front_size": len(front),
+        "pareto_front": [case(int(i)) for i in front[:DOE_MAX_FRONT]],
+        "duration_s": round(time.monotonic() - started, 3)
+    }
+
+# --- Fill solver (voxel fill-front propagation) ---
+
+FILL_MAX_GATES = 16
+
+class FillRequest(BaseModel):
+    project_id: str
+    gates: Optional[List[List[float]]] = None # Gate points (mm) in the part's current orientation; default: one near its centroid
+    resolution: Optional[int] = None # Voxels along the longest axis; default: fine enough for the nominal wall
+    background: bool = False
+
+@router.post("/fill")
+async def run_fill(input_data: FillRequest, db = Depends(get_db)):
+    """Propagates the melt front through the voxelized part from its gates.
+
+    Returns fill time, a fill curve, last-to-fill regions and weld-line candidates; the full
+    fill-time field is a binary buffer at field_url (see fill_solver.encode_field). Results are
+    kept per mesh, transform and settings, so asking again is free.
+    """
+    if input_data.background:
+        return jobs_api.submit("simulation", run_fill, input_data.model_copy(update={"background": False}), db)
+    gates = input_data.gates
+    if gates is not None and (len(gates) > FILL_MAX_GATES or any(len(g) != 3 for g in gates)):
+        raise HTTPException(status_code=400, detail=f"gates must be up to {FILL_MAX_GATES} [x, y, z] points")
+    if input_data.resolution is not None and not 16 <= input_data.resolution <= fill_solver.FILL_MAX_RESOLUTION:
+        raise HTTPException(status_code=400, detail=f"resolution must be between 16 and {fill_solver.FILL_MAX_RESOLUTION}")
+
+    parts_res = await run_in_threadpool(db.table("parts").select("*").eq("project_id", input_data.project_id).execute)
+    if not parts_res.data:
+        raise HTTPException(status_code=404, detail="Project not found or has no geometry/part uploaded.")
+    part = parts_res.data[0] # Assume one part for now
+    filename = geometry_store.static_filename(part["file_url"])
+    path = os.path.join(geometry_store.STATIC_DIR, filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Part geometry file not found")
+    wall_mm = (part.get("wall_thickness") or {}).get("median_mm")
+
+    key = hashlib.sha256(json.dumps({
+        "solver": fill_solver.FILL_SOLVER_VERSION,
+        "mesh": filename,
+        "transform": part.get("transform"),
+        "gates": gates,
+        "resolution": input_data.resolution,
+        "wall_mm": wall_mm,
+    }, sort_keys=True).encode()).hexdigest()
+    out_dir = geometry_store.fill_dir()
+    summary_path = os.path.join(out_dir, f"{key}.json")
+    cached = os.path.exists(summary_path) and os.path.exists(os.path.join(out_dir, f"{key}.bin"))
+    if cached:
+        with open(summary_path) as f:
+            summary = json.load(f)
+        static_gc.touch(f"{geometry_store.FILL_SUBDIR}/{key}.json")
+    else:
+        try:
+            summary = await get_geometry_pool().run(mesh_jobs.fill_stl, path, out_dir, key, part.get("transform"), gates, wall_mm, input_data.resolution)
+        except WorkerError as e:
+            raise HTTPException(status_code=422, detail=f"Fill solver failed: {str(e)}")
+
+    return {
+        "project_id": input_data.project_id,
+        "part_id": part.get("id"),
+        "cached": cached,
+        "field_url": f"/{geometry_store.STATIC_DIR}/{geometry_store.FILL_SUBDIR}/{key}.bin",
+        **summary
+    }
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import trimesh
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import fill_solver
+from backend import physics
+
+# Fill solver benchmark. Accuracy: a flat plate gated at its centre fills in the straight-line time
+# to its farthest corner, and two gates at opposite ends weld in the middle. Budget: a thin-walled
+# enclosure at increasing resolutions, measured per occupied voxel. Exits non-zero when a check
+# drifts or the per-voxel cost goes over FILL_BUDGET_US_PER_VOXEL / FILL_BUDGET_BYTES_PER_VOXEL.
+PLATE = (120.0, 80.0, 4.0)
+ENCLOSURE = (150.0, 100.0, 50.0)
+ENCLOSURE_WALL = 2.0
+ENCLOSURE_RESOLUTIONS = [128, 192, 288] # Coarser grids are dominated by fixed costs
+FILL_BUDGET_US_PER_VOXEL = float(os.environ.get("FILL_BUDGET_US_PER_VOXEL", "6"))
+FILL_BUDGET_BYTES_PER_VOXEL = float(os.environ.get("FILL_BUDGET_BYTES_PER_VOXEL", "640"))
+
+def plate():
+    return trimesh.creation.box(extents=PLATE).triangles
+
+def enclosure():
+    """Closed box shell, ENCLOSURE_WALL thick: an outer box around an inverted inner one."""
+    outer = trimesh.creation.box(extents=ENCLOSURE)
+    inner = trimesh.creation.box(extents=[e - 2 * ENCLOSURE_WALL for e in ENCLOSURE])
+    inner.invert()
+    return np.concatenate([outer.triangles, inner.triangles])
+
+def measured(fn, *args, **kwargs):
+    """(value, seconds, peak traced bytes): timed on its own, then run again under tracemalloc, which slows it."""
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, elapsed, peak
+
+print("=== Fill Solver Benchmark ===")
+ok = True
+
+print("\n[Accuracy]")
+summary, _, _, _ = fill_solver.solve(plate(), gates=[[0.0, 0.0, 0.0]], resolution=128)
+expected = float(np.hypot(PLATE[0] / 2, PLATE[1] / 2)) / physics.FLOW_SPEED_MM_S
+error = abs(summary["fill_time_s"] - expected) / expected
+passed = error <= 0.05
+ok &= passed
+print(f"plate fill time: {summary['fill_time_s']:.4f}s (expected {expected:.4f}s, error {error*100:.2f}%) {'OK' if passed else 'FAIL'}")
+
+ends = [[-PLATE[0] / 2, 0.0, 0.0], [PLATE[0] / 2, 0.0, 0.0]]
+summary, _, _, _ = fill_solver.solve(plate(), gates=ends, resolution=128)
+welds = summary["weld_line_candidates"]
+weld_x = welds[0]["centroid_mm"][0] if welds else float("inf")
+passed = abs(weld_x) <= PLATE[0] * 0.02
+ok &= passed
+print(f"two-gate weld line at x = {weld_x:.2f}mm (expected 0) {'OK' if passed else 'FAIL'}")
+
+print("\n[Budget: thin-walled enclosure]")
+triangles = enclosure()
+print(f"{'resolution':>10} {'voxels':>10} {'time':>8} {'us/voxel':>9} {'peak MB':>8} {'B/voxel':>8}")
+for resolution in ENCLOSURE_RESOLUTIONS:
+    (summary, _, _, _), elapsed, peak = measured(fill_solver.solve, triangles, resolution=resolution)
+    voxels = summary["voxels"]
+    us_per_voxel = elapsed / voxels * 1e6
+    bytes_per_voxel = peak / voxels
+    within = us_per_voxel <= FILL_BUDGET_US_PER_VOXEL and bytes_per_voxel <= FILL_BUDGET_BYTES_PER_VOXEL
+    ok &= within
+    print(f"{resolution:>10} {voxels:>10} {elapsed:>7.2f}s {us_per_voxel:>9.2f} {peak/2**20:>8.1f} {bytes_per_voxel:>8.0f}"
+          f" {'OK' if within else 'OVER BUDGET'}")
+    if summary["unfilled_fraction"] > 0:
+        ok = False
+        print(f"  melt did not reach {summary['unfilled_fraction']*100:.2f}% of the enclosure: FAIL")
+
+sys.exit(0 if ok else 1)
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import trimesh
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import mesh_analysis
+from backend import mesh_jobs
+
+# Geometry analysis benchmark: a hollow sphere (outer radius 50mm, 2mm wall) of ~500k triangles,
+# run through the same analyze_stl() the upload workers call. Exits non-zero when the analysis
+# is slower than BENCH_BUDGET_S or its results drift from the analytic answer.
+OUTER_RADIUS = 50.0
+WALL = 2.0
+SPHERE_COUNT = [178, 355] # UV-sphere rows/columns; two spheres give ~250k triangles each
+BENCH_BUDGET_S = float(os.environ.get("BENCH_BUDGET_S", "5"))
+
+def build_part():
+    outer = trimesh.creation.uv_sphere(radius=OUTER_RADIUS, count=SPHERE_COUNT)
+    inner = trimesh.creation.uv_sphere(radius=OUTER_RADIUS - WALL, count=SPHERE_COUNT)
+    inner.invert()
+    return np.concatenate([outer.triangles, inner.triangles]).astype(np.float32)
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:6.2f}s")
+    return value, elapsed
+
+print("=== Geometry Analysis Benchmark ===")
+triangles = build_part()
+print(f"Triangles: {len(triangles)}")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    path = os.path.join(temp_dir, "hollow_sphere.stl")
+    mesh_analysis.write_binary_stl(path, triangles)
+
+    print("\n[Stages]")
+    timed("volume + bounds", mesh_analysis.triangle_stats, mesh_analysis.load_triangles(path))
+    timed("projected area (raster)", mesh_analysis.projected_area, mesh_analysis.load_triangles(path))
+    timed("wall thickness (BVH rays)", mesh_analysis.wall_thickness, mesh_analysis.load_triangles(path))
+
+    print("\n[End to end]")
+    stats, total = timed("analyze_stl", mesh_jobs.analyze_stl, path)
+
+expected_area = np.pi * OUTER_RADIUS ** 2
+wall = stats["wall_thickness"]
+checks = [
+    ("projected area", stats["projected_area_mm2"], expected_area, 0.01),
+    ("median wall thickness", wall["median_mm"], WALL, 0.02),
+]
+
+print("\n[Accuracy]")
+ok = True
+for label, value, expected, tolerance in checks:
+    error = abs(value - expected) / expected
+    passed = error <= tolerance
+    ok &= passed
+    print(f"{label}: {value:.3f} (expected {expected:.3f}, error {error*100:.2f}%) {'OK' if passed else 'FAIL'}")
+print(f"bbox area (old estimate): {stats['bbox_projected_area_mm2']:.1f}")
+print(f"thickness rays: {wall['rays']}, unresolved: {wall['unresolved_fraction']*100:.2f}%")
+
+print("\n[Budget]")
+within = total <= BENCH_BUDGET_S
+print(f"analyze_stl: {total:.2f}s of {BENCH_BUDGET_S:.1f}s {'OK' if within else 'OVER BUDGET'}")
+
+sys.exit(0 if ok and within else 1)
@@ -0,0 +1,148 @@
+import numpy as np
+
+# BVH over a triangle soup, built and traversed with whole-array NumPy passes. The tree is an
+# implicit complete binary tree: node i at level k covers sorted triangles
+# [i*n // 2**k, (i+1)*n // 2**k), its children are 2i and 2i+1 at level k+1, and every level is
+# just two arrays of AABB corners. Building is a top-down median split on each node's longest
+# axis, one segmented sort per level.
+
+class TriangleBVH:
+    def __init__(self, triangles, leaf_size=4):
+        tri = np.asarray(triangles, dtype=np.float64)
+        n = len(tri)
+        self.leaf_size = leaf_size
+        self.depth = max(0, int(np.ceil(np.log2(max(1, -(-n // leaf_size))))))
+        centroids = tri.mean(axis=1)
+
+        order = np.arange(n)
+        for level in range(self.depth):
+            # Segment (node) of every sorted position at this level
+            bounds = np.arange(2 ** level + 1) * n // 2 ** level
+            seg = np.repeat(np.arange(2 ** level), np.diff(bounds))
+            c = centroids[order]
+            nonempty = bounds[:-1][np.diff(bounds) > 0]
+            lo = np.full((2 ** level, 3), np.inf)
+            hi = np.full((2 ** level, 3), -np.inf)
+            lo[np.diff(bounds) > 0] = np.minimum.reduceat(c, nonempty, axis=0)
+            hi[np.diff(bounds) > 0] = np.maximum.reduceat(c, nonempty, axis=0)
+            axis = np.argmax(hi - lo, axis=1)[seg]
+            extent = np.maximum((hi - lo)[seg, axis], 1e-12)
+            # Node id plus the position along its longest axis in [0, 1): one sort splits every node at its median
+            key = seg + 0.999 * (c[np.arange(n), axis] - lo[seg, axis]) / extent
+            order = order[np.argsort(key)]
+
+        leaves = 2 ** self.depth
+        bounds = np.arange(leaves + 1) * n // leaves
+        # Slot j of leaf i holds sorted triangle bounds[i] + j, or -1 past the end of the leaf
+        slot_pos = bounds[:-1, None] + np.arange(leaf_size)
+        slot_pos = np.where(slot_pos < bounds[1:, None], slot_pos, -1).ravel()
+        filled = slot_pos >= 0
+
+        slots = leaves * leaf_size
+        self.index = np.full(slots, -1, dtype=np.int64)
+        self.index[filled] = order[slot_pos[filled]]
+        sorted_tri = tri[self.index[filled]]
+        self.v0 = np.zeros((slots, 3))
+        self.e1 = np.zeros((slots, 3))
+        self.e2 = np.zeros((slots, 3))
+        self.v0[filled] = sorted_tri[:, 0]
+        self.e1[filled] = sorted_tri[:, 1] - sorted_tri[:, 0]
+        self.e2[filled] = sorted_tri[:, 2] - sorted_tri[:, 0]
+
+        # Empty slots get an inverted box, so they never widen their leaf
+        tri_lo = np.full((slots, 3), np.inf)
+        tri_hi = np.full((slots, 3), -np.inf)
+        tri_lo[filled] = sorted_tri.min(axis=1)
+        tri_hi[filled] = sorted_tri.max(axis=1)
+        level_lo = tri_lo.reshape(-1, leaf_size, 3).min(axis=1)
+        level_hi = tri_hi.reshape(-1, leaf_size, 3).max(axis=1)
+        self.lo = [level_lo]
+        self.hi = [level_hi]
+        while len(level_lo) > 1:
+            level_lo = np.minimum(level_lo[0::2], level_lo[1::2])
+            level_hi = np.maximum(level_hi[0::2], level_hi[1::2])
+            self.lo.insert(0, level_lo)
+            self.hi.insert(0, level_hi)
+
+    def intersect(self, origins, directions, t_max, ignore=None, batch=16384, rounds=4):
+        """Nearest hit along each ray within t_max.
+
+        Returns (t, triangle index); rays without a hit get t_max and -1. `ignore` holds one
+        triangle index per ray that must not count as a hit (the face the ray starts on).
+
+        Traversal is breadth-first, so it cannot shrink a ray as soon as it finds a hit. Instead
+        rays are traced with a length limit that grows 4x per round (t_max / 4**(rounds-1) first),
+        and only rays still without a hit go on to the next round. Short hits, the common case,
+        never visit the far side of the part.
+        """
+        origins = np.asarray(origins, dtype=np.float64)
+        directions = np.asarray(directions, dtype=np.float64)
+        t_out = np.full(len(origins), float(t_max))
+        i_out = np.full(len(origins), -1, dtype=np.int64)
+        pending = np.arange(len(origins))
+        for r in reversed(range(rounds)):
+            limit = t_max / 4 ** r
+            for start in range(0, len(pending), batch):
+                sel = pending[start:start + batch]
+                t, i = self._intersect_batch(origins[sel], directions[sel], limit, None if ignore is None else ignore[sel])
+                t_out[sel[i >= 0]], i_out[sel] = t[i >= 0], i
+            pending = pending[i_out[pending] < 0]
+            if not len(pending):
+                break
+        return t_out, i_out
+
+    def _intersect_batch(self, o, d, t_max, ignore):
+        count = len(o)
+        best_t = np.full(count, float(t_max))
+        best_i = np.full(count, -1, dtype=np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_d = 1.0 / np.where(np.abs(d) < 1e-12, 1e-12, d)
+
+        # Wavefront traversal: (ray, node) pairs that survive the slab test descend one level at a time
+        rays = np.arange(count)
+        nodes = np.zeros(count, dtype=np.int64)
+        for level in range(self.depth + 1):
+            ray_o, ray_inv = o[rays], inv_d[rays]
+            t0 = (self.lo[level][nodes] - ray_o) * ray_inv
+            t1 = (self.hi[level][nodes] - ray_o) * ray_inv
+            near = np.minimum(t0, t1)
+            far = np.maximum(t0, t1)
+            # Column-wise max/min: much faster than reducing over a length-3 axis
+            t_near = np.maximum(np.maximum(near[:, 0], near[:, 1]), near[:, 2])
+            t_far = np.minimum(np.minimum(far[:, 0], far[:, 1]), far[:, 2])
+            keep = (t_near <= t_far) & (t_far >= 0) & (t_near <= best_t[rays])
+            rays, nodes = rays[keep], nodes[keep]
+            if level < self.depth:
+                rays = np.repeat(rays, 2)
+                nodes = (nodes[:, None] * 2 + np.array([0, 1])).ravel()
+            if not len(rays):
+                return best_t, best_i
+
+        # Leaf level: Moller-Trumbore against every triangle slot of each surviving leaf
+        slots = (nodes[:, None] * self.leaf_size + np.arange(self.leaf_size)).ravel()
+        rays = np.repeat(rays, self.leaf_size)
+        tri_index = self.index[slots]
+        valid = tri_index >= 0
+        if ignore is not None:
+            valid &= tri_index != ignore[rays]
+        rays, slots, tri_index = rays[valid], slots[valid], tri_index[valid]
+
+        ray_d = d[rays]
+        e1, e2 = self.e1[slots], self.e2[slots]
+        p = np.cross(ray_d, e2)
+        det = np.einsum("ij,ij->i", e1, p)
+        ok = np.abs(det) > 1e-12
+        inv_det = np.where(ok, 1.0 / np.where(ok, det, 1.0), 0.0)
+        s = o[rays] - self.v0[slots]
+        u = np.einsum("ij,ij->i", s, p) * inv_det
+        q = np.cross(s, e1)
+        v = np.einsum("ij,ij->i", ray_d, q) * inv_det
+        t = np.einsum("ij,ij->i", e2, q) * inv_det
+        hit = ok & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0) & (t < best_t[rays])
+        rays, t, tri_index = rays[hit], t[hit], tri_index[hit]
+
+        # Keep the nearest hit per ray
+        np.minimum.at(best_t, rays, t)
+        nearest = t == best_t[rays]
+        best_i[rays[nearest]] = tri_index[nearest]
+        return best_t, best_i
@@ -2,59 +2,487 @@ import json
 import os
 import uuid
 import datetime
+import heapq
+import mmap
+import struct
+import threading
+import time
+import zlib
 
-# Mock DB File Path
-MOCK_DB_FILE = os.path.join(os.path.dirname(__file__), "mock_db.json")
+# Mock DB File Paths
+MOCK_DB_DIR = os.environ.get("MOCK_DB_DIR", os.path.dirname(__file__))
+# Binary snapshot: magic, one zlib-compressed JSON segment per table, a JSON offset index and a trailer
+MOCK_DB_SNAPSHOT = os.path.join(MOCK_DB_DIR, "mock_db.snapshot")
+# Legacy single-file JSON database, migrated to MOCK_DB_SNAPSHOT on first start
+MOCK_DB_FILE = os.path.join(MOCK_DB_DIR, "mock_db.json")
+# Write-ahead journal: one JSON line per mutation, folded into MOCK_DB_SNAPSHOT on compaction
+MOCK_DB_JOURNAL = os.path.join(MOCK_DB_DIR, "mock_db.journal")
+
+SNAPSHOT_MAGIC = b"MOCKDB\x00\x01"
+# Trailer: index offset, index length, magic (detects truncated files)
+SNAPSHOT_TRAILER = struct.Struct("<QQ8s")
+SNAPSHOT_COMPRESSION = int(os.environ.get("MOCK_DB_SNAPSHOT_COMPRESSION", "1"))
+
+# Journal fsync policy: "always" (fsync every write), "interval" (fsync in the background) or "off".
+# A commit returns once its journal line is written: with "always" that is durable; with "interval"
+# it is only flushed to the OS (it survives a process crash, but a power loss can take the last
+# MOCK_DB_FSYNC_INTERVAL_S of commits); with "off" the OS decides.
+JOURNAL_FSYNC = os.environ.get("MOCK_DB_FSYNC", "interval")
+JOURNAL_FSYNC_INTERVAL_S = float(os.environ.get("MOCK_DB_FSYNC_INTERVAL_S", "1.0"))
+# Compact the journal into a fresh snapshot once it holds this many records
+COMPACT_THRESHOLD = int(os.environ.get("MOCK_DB_COMPACT_THRESHOLD", "1000"))
+COMPACT_INTERVAL_S = float(os.environ.get("MOCK_DB_COMPACT_INTERVAL_S", "30"))
+# Group commit: concurrent inserts arriving within this window share one journal write/fsync
+GROUP_COMMIT_WINDOW_S = float(os.environ.get("MOCK_DB_COMMIT_WINDOW_MS", "2")) / 1000
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("MOCK_DB_COMMIT_MAX_BATCH", "256"))
+
+# Secondary hash indexes, maintained on insert. eq() on an indexed column skips the table scan.
+INDEXED_COLUMNS = {
+    "projects": ("id", "user_id"),
+    "parts": ("id", "project_id"),
+    "simulations": ("id", "project_id"),
+}
+DEFAULT_INDEXED_COLUMNS = ("id",)
+
+# Rows are appended in creation order, so ordering a table scan on this column needs no sort;
+# rows served from an index bucket are sorted by their insert position (updates move them within it)
+INSERTION_ORDER_COLUMN = "created_at"
+
+# Deleting a row also deletes the child rows pointing at it: {table: ((child_table, foreign_key), ...)}
+CASCADES = {
+    "projects": (("parts", "project_id"), ("simulations", "project_id")),
+}
+
+# Storage backend served by get_db(): "mock" (binary snapshot + journal) or "sqlite"
+DB_BACKEND = os.environ.get("DB_BACKEND", "mock")
+
+def seed_materials():
+    # Full 18 Standard Materials. Thermal conductivity and specific heat are typical values over the
+    # processing range; they set each material's diffusivity in the cooling model
+    return [
+        {"id": str(uuid.uuid4()), "name": "PP (Polypropylene)", "density_g_cm3": 0.905, "melt_temp_c": 230, "mold_temp_c": 40, "shrinkage": 0.015, "thermal_conductivity_w_mk": 0.17, "specific_heat_j_kgk": 2740},
+        {"id": str(uuid.uuid4()), "name": "ABS (Generic)", "density_g_cm3": 1.04, "melt_temp_c": 230, "mold_temp_c": 60, "shrinkage": 0.006, "thermal_conductivity_w_mk": 0.17, "specific_heat_j_kgk": 2100},
+        {"id": str(uuid.uuid4()), "name": "PA6 (Nylon 6)", "density_g_cm3": 1.13, "melt_temp_c": 260, "mold_temp_c": 80, "shrinkage": 0.012, "thermal_conductivity_w_mk": 0.25, "specific_heat_j_kgk": 2600},
+        {"id": str(uuid.uuid4()), "name": "PC (Polycarbonate)", "density_g_cm3": 1.20, "melt_temp_c": 300, "mold_temp_c": 90, "shrinkage": 0.007, "thermal_conductivity_w_mk": 0.2, "specific_heat_j_kgk": 1900},
+        {"id": str(uuid.uuid4()), "name": "POM (Acetal)", "density_g_cm3": 1.41, "melt_temp_c": 190, "mold_temp_c": 90, "shrinkage": 0.020, "thermal_conductivity_w_mk": 0.28, "specific_heat_j_kgk": 2200},
+        {"id": str(uuid.uuid4()), "name": "LDPE", "density_g_cm3": 0.92, "melt_temp_c": 210, "mold_temp_c": 40, "shrinkage": 0.020, "thermal_conductivity_w_mk": 0.25, "specific_heat_j_kgk": 2600},
+        {"id": str(uuid.uuid4()), "name": "HDPE", "density_g_cm3": 0.95, "melt_temp_c": 220, "mold_temp_c": 40, "shrinkage": 0.025, "thermal_conductivity_w_mk": 0.3, "specific_heat_j_kgk": 2700},
+        {"id": str(uuid.uuid4()), "name": "PS (Polystyrene)", "density_g_cm3": 1.05, "melt_temp_c": 220, "mold_temp_c": 50, "shrinkage": 0.004, "thermal_conductivity_w_mk": 0.15, "specific_heat_j_kgk": 2000},
+        {"id": str(uuid.uuid4()), "name": "PVC (Rigid)", "density_g_cm3": 1.40, "melt_temp_c": 180, "mold_temp_c": 40, "shrinkage": 0.004, "thermal_conductivity_w_mk": 0.16, "specific_heat_j_kgk": 1400},
+        {"id": str(uuid.uuid4()), "name": "PMMA (Acrylic)", "density_g_cm3": 1.18, "melt_temp_c": 240, "mold_temp_c": 60, "shrinkage": 0.004, "thermal_conductivity_w_mk": 0.19, "specific_heat_j_kgk": 2100},
+        {"id": str(uuid.uuid4()), "name": "PBT", "density_g_cm3": 1.31, "melt_temp_c": 260, "mold_temp_c": 70, "shrinkage": 0.018, "thermal_conductivity_w_mk": 0.21, "specific_heat_j_kgk": 2000},
+        {"id": str(uuid.uuid4()), "name": "PET", "density_g_cm3": 1.38, "melt_temp_c": 270, "mold_temp_c": 100, "shrinkage": 0.015, "thermal_conductivity_w_mk": 0.2, "specific_heat_j_kgk": 1900},
+        {"id": str(uuid.uuid4()), "name": "ASA", "density_g_cm3": 1.07, "melt_temp_c": 250, "mold_temp_c": 60, "shrinkage": 0.005, "thermal_conductivity_w_mk": 0.17, "specific_heat_j_kgk": 2000},
+        {"id": str(uuid.uuid4()), "name": "SAN", "density_g_cm3": 1.08, "melt_temp_c": 230, "mold_temp_c": 60, "shrinkage": 0.004, "thermal_conductivity_w_mk": 0.16, "specific_heat_j_kgk": 2000},
+        {"id": str(uuid.uuid4()), "name": "TPE (Generic)", "density_g_cm3": 1.10, "melt_temp_c": 190, "mold_temp_c": 30, "shrinkage": 0.015, "thermal_conductivity_w_mk": 0.15, "specific_heat_j_kgk": 2200},
+        {"id": str(uuid.uuid4()), "name": "TPU (95A)", "density_g_cm3": 1.20, "melt_temp_c": 200, "mold_temp_c": 40, "shrinkage": 0.012, "thermal_conductivity_w_mk": 0.2, "specific_heat_j_kgk": 1900},
+        {"id": str(uuid.uuid4()), "name": "PLA (Biodegradable)", "density_g_cm3": 1.24, "melt_temp_c": 190, "mold_temp_c": 30, "shrinkage": 0.004, "thermal_conductivity_w_mk": 0.13, "specific_heat_j_kgk": 1800},
+        {"id": str(uuid.uuid4()), "name": "PEEK (High Temp)", "density_g_cm3": 1.32, "melt_temp_c": 380, "mold_temp_c": 180, "shrinkage": 0.010, "thermal_conductivity_w_mk": 0.25, "specific_heat_j_kgk": 2100}
+    ]
 
 class MockSupabaseClient:
     def __init__(self):
-        self.data = self._load_db()
-        print(f"[MOCK DB] Loaded Data. Materials: {len(self.data.get('materials', []))}")
+        # _lock guards data, indexes and the commit queue; _journal_lock guards the journal file
+        self._lock = threading.Lock()
+        self._commit_cond = threading.Condition(self._lock)
+        self._journal_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._seq = 0
+        # Loaded tables only; the rest stay in the memory-mapped snapshot until first access
+        self.data = {}
+        self._indexes = {}
+        # Insert position of every live row, by object identity: the order INSERTION_ORDER_COLUMN follows
+        self._positions = {}
+        self._next_position = 0
+        # Deleted rows stay in their table list (by object identity) until compaction reclaims them
+        self._tombstones = {}
+        # Unloaded snapshot tables {table: (offset, length, rows)} and journal entries waiting on them
+        self._segments = {}
+        self._deferred = {}
+        self._snapshot_file = None
+        self._snapshot_map = None
+        self._load_db()
+        self._journal_records = self._replay_journal()
+        self._journal = open(MOCK_DB_JOURNAL, "a", encoding="utf-8")
+        # (seq, journal line, entry) waiting for the writer; entries are applied once written
+        self._pending = []
+        self._durable_seq = self._seq
+        # seq -> error for commits whose journal write failed (never applied)
+        self._failed = {}
+        self._last_compaction = time.monotonic()
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._journal_writer_loop, name="mock-db-journal", daemon=True)
+        self._writer.start()
+        self._maintenance = threading.Thread(target=self._maintenance_loop, name="mock-db-maintenance", daemon=True)
+        self._maintenance.start()
+        materials = len(self.data["materials"]) if "materials" in self.data else self._segments.get("materials", (0, 0, 0))[2]
+        print(f"[MOCK DB] Loaded Data. Materials: {materials}")
 
     def _load_db(self):
+        if not os.path.exists(MOCK_DB_SNAPSHOT):
+            legacy = self._read_legacy_json()
+            if legacy is None:
+                print("[MOCK DB] Creating new mock database...")
+                legacy = ({
+                    "projects": [],
+                    "parts": [],
+                    "simulations": [],
+                    "materials": seed_materials()
+                }, 0)
+            self._save_db(*legacy)
+            if os.path.exists(MOCK_DB_FILE):
+                os.replace(MOCK_DB_FILE, MOCK_DB_FILE + ".migrated")
+                print("[MOCK DB] Migrated mock_db.json to the binary snapshot format.")
+
+        try:
+            self._open_snapshot()
+        except (OSError, ValueError, struct.error) as e:
+            print(f"[MOCK DB] Snapshot unreadable ({e}). Moving it aside and starting empty.")
+            self._close_snapshot()
+            os.replace(MOCK_DB_SNAPSHOT, MOCK_DB_SNAPSHOT + ".corrupt")
+            self._save_db({"projects": [], "parts": [], "simulations": [], "materials": []})
+
+    def _read_legacy_json(self):
         if not os.path.exists(MOCK_DB_FILE):
-             print("[MOCK DB] Creating new mock database...")
-             initial_data = {
-                 "projects": [],
-                 "parts": [],
-                 "simulations": [],
-                 "materials": self._seed_materials()
-             }
-             self._save_db(initial_data)
-             return initial_data
-        
+            return None
         try:
             with open(MOCK_DB_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {"projects": [], "parts": [], "simulations": [], "materials": []}
-            
-    def _save_db(self, data):
-        with open(MOCK_DB_FILE, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
-
-    def _seed_materials(self):
-        # Full 18 Standard Materials
-        return [
-            {"id": str(uuid.uuid4()), "name": "PP (Polypropylene)", "density_g_cm3": 0.905, "melt_temp_c": 230, "mold_temp_c": 40, "shrinkage": 0.015},
-            {"id": str(uuid.uuid4()), "name": "ABS (Generic)", "density_g_cm3": 1.04, "melt_temp_c": 230, "mold_temp_c": 60, "shrinkage": 0.006},
-            {"id": str(uuid.uuid4()), "name": "PA6 (Nylon 6)", "density_g_cm3": 1.13, "melt_temp_c": 260, "mold_temp_c": 80, "shrinkage": 0.012},
-            {"id": str(uuid.uuid4()), "name": "PC (Polycarbonate)", "density_g_cm3": 1.20, "melt_temp_c": 300, "mold_temp_c": 90, "shrinkage": 0.007},
-            {"id": str(uuid.uuid4()), "name": "POM (Acetal)", "density_g_cm3": 1.41, "melt_temp_c": 190, "mold_temp_c": 90, "shrinkage": 0.020},
-            {"id": str(uuid.uuid4()), "name": "LDPE", "density_g_cm3": 0.92, "melt_temp_c": 210, "mold_temp_c": 40, "shrinkage": 0.020},
-            {"id": str(uuid.uuid4()), "name": "HDPE", "density_g_cm3": 0.95, "melt_temp_c": 220, "mold_temp_c": 40, "shrinkage": 0.025},
-            {"id": str(uuid.uuid4()), "name": "PS (Polystyrene)", "density_g_cm3": 1.05, "melt_temp_c": 220, "mold_temp_c": 50, "shrinkage": 0.004},
-            {"id": str(uuid.uuid4()), "name": "PVC (Rigid)", "density_g_cm3": 1.40, "melt_temp_c": 180, "mold_temp_c": 40, "shrinkage": 0.004},
-            {"id": str(uuid.uuid4()), "name": "PMMA (Acrylic)", "density_g_cm3": 1.18, "melt_temp_c": 240, "mold_temp_c": 60, "shrinkage": 0.004},
-            {"id": str(uuid.uuid4()), "name": "PBT", "density_g_cm3": 1.31, "melt_temp_c": 260, "mold_temp_c": 70, "shrinkage": 0.018},
-            {"id": str(uuid.uuid4()), "name": "PET", "density_g_cm3": 1.38, "melt_temp_c": 270, "mold_temp_c": 100, "shrinkage": 0.015},
-            {"id": str(uuid.uuid4()), "name": "ASA", "density_g_cm3": 1.07, "melt_temp_c": 250, "mold_temp_c": 60, "shrinkage": 0.005},
-            {"id": str(uuid.uuid4()), "name": "SAN", "density_g_cm3": 1.08, "melt_temp_c": 230, "mold_temp_c": 60, "shrinkage": 0.004},
-            {"id": str(uuid.uuid4()), "name": "TPE (Generic)", "density_g_cm3": 1.10, "melt_temp_c": 190, "mold_temp_c": 30, "shrinkage": 0.015},
-            {"id": str(uuid.uuid4()), "name": "TPU (95A)", "density_g_cm3": 1.20, "melt_temp_c": 200, "mold_temp_c": 40, "shrinkage": 0.012},
-            {"id": str(uuid.uuid4()), "name": "PLA (Biodegradable)", "density_g_cm3": 1.24, "melt_temp_c": 190, "mold_temp_c": 30, "shrinkage": 0.004},
-            {"id": str(uuid.uuid4()), "name": "PEEK (High Temp)", "density_g_cm3": 1.32, "melt_temp_c": 380, "mold_temp_c": 180, "shrinkage": 0.010}
-        ]
+                data = json.load(f)
+        except ValueError as e:
+            print(f"[MOCK DB] Legacy mock_db.json unreadable ({e}); not migrating it.")
+            return None
+        return data, data.pop("_meta", {}).get("seq", 0)
+
+    def _save_db(self, data, seq=0, raw_segments=None):
+        self._write_snapshot(data, seq, raw_segments)
+        self._install_snapshot()
+
+    def _write_snapshot(self, data, seq, raw_segments=None):
+        """Writes a snapshot to a temp file. raw_segments {table: (bytes, rows)} are copied through as-is."""
+        tables = {}
+        with open(MOCK_DB_SNAPSHOT + ".tmp", 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            for table, rows in data.items():
+                encoded = json.dumps(rows, default=str, separators=(",", ":")).encode("utf-8")
+                segment = zlib.compress(encoded, SNAPSHOT_COMPRESSION)
+                tables[table] = (f.tell(), len(segment), len(rows))
+                f.write(segment)
+            for table, (segment, rows) in (raw_segments or {}).items():
+                tables[table] = (f.tell(), len(segment), rows)
+                f.write(segment)
+            index = json.dumps({"seq": seq, "tables": tables}).encode("utf-8")
+            index_offset = f.tell()
+            f.write(index)
+            f.write(SNAPSHOT_TRAILER.pack(index_offset, len(index), SNAPSHOT_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _install_snapshot(self):
+        # Swap the temp file in, so a crash never leaves a truncated snapshot.
+        # The old mapping is closed first because Windows cannot replace a mapped file.
+        self._close_snapshot()
+        os.replace(MOCK_DB_SNAPSHOT + ".tmp", MOCK_DB_SNAPSHOT)
+        self._open_snapshot()
+
+    def _open_snapshot(self):
+        self._snapshot_file = open(MOCK_DB_SNAPSHOT, 'rb')
+        self._snapshot_map = mmap.mmap(self._snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._snapshot_map
+        index_offset, index_length, magic = SNAPSHOT_TRAILER.unpack(mm[-SNAPSHOT_TRAILER.size:])
+        if mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or magic != SNAPSHOT_MAGIC:
+            raise ValueError("not a mock DB snapshot")
+        index = json.loads(mm[index_offset:index_offset + index_length])
+        self._seq = max(self._seq, index["seq"])
+        self._segments = {table: tuple(seg) for table, seg in index["tables"].items() if table not in self.data}
+
+    def _close_snapshot(self):
+        if self._snapshot_map is not None:
+            self._snapshot_map.close()
+            self._snapshot_map = None
+        if self._snapshot_file is not None:
+            self._snapshot_file.close()
+            self._snapshot_file = None
+
+    def _ensure_loaded(self, table):
+        """Decodes a table's snapshot segment on first access and applies journal entries held for it."""
+        segment = self._segments.pop(table, None)
+        if segment is None:
+            return
+        offset, length, _ = segment
+        self.data[table] = json.loads(zlib.decompress(self._snapshot_map[offset:offset + length]))
+        self._build_indexes(table)
+        for entry in self._deferred.pop(table, ()):
+            self._apply(entry)
+
+    # --- Write-ahead journal ---
+
+    def _replay_journal(self):
+        """Re-applies journal entries newer than the snapshot. Returns the number of live journal records."""
+        if not os.path.exists(MOCK_DB_JOURNAL):
+            return 0
+        count = 0
+        good_bytes = 0
+        with open(MOCK_DB_JOURNAL, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = None
+                if entry is None or not line.endswith(b"\n"):
+                    # Torn write from a crash: everything before it is intact
+                    print("[MOCK DB] Discarding incomplete journal tail.")
+                    break
+                good_bytes += len(line)
+                if entry["seq"] <= self._seq:
+                    continue
+                for piece in self._split_entry(entry):
+                    if piece["table"] in self._segments:
+                        # Applied when the table is first loaded
+                        self._deferred.setdefault(piece["table"], []).append(piece)
+                    else:
+                        self._apply(piece)
+                self._seq = entry["seq"]
+                count += 1
+        if good_bytes < os.path.getsize(MOCK_DB_JOURNAL):
+            # Cut the tail so new appends do not land behind garbage
+            with open(MOCK_DB_JOURNAL, 'r+b') as f:
+                f.truncate(good_bytes)
+        if count:
+            print(f"[MOCK DB] Replayed {count} journal records.")
+        return count
+
+    @staticmethod
+    def _split_entry(entry):
+        """Splits a journal entry into single-table pieces (a cascading delete touches several tables)."""
+        if entry["op"] != "delete":
+            return [entry]
+        return [{**entry, "table": table, "targets": {table: ids}} for table, ids in entry["targets"].items()]
+
+    def _apply(self, entry):
+        table = entry["table"]
+        if entry["op"] == "insert":
+            self._ensure_loaded(table)
+            rows = self.data.setdefault(table, [])
+            for record in entry.get("records") or [entry["record"]]:
+                rows.append(record)
+                self._index_row(table, record)
+        elif entry["op"] == "update":
+            for row_id in entry["ids"]:
+                for row in self._lookup(table, "id", row_id):
+                    self._unindex_row(table, row)
+                    row.update(entry["values"])
+                    self._index_row(table, row)
+        elif entry["op"] == "delete":
+            for target, ids in entry["targets"].items():
+                for row_id in ids:
+                    for row in self._lookup(target, "id", row_id):
+                        self._unindex_row(target, row)
+                        self._positions.pop(id(row), None)
+                        self._tombstones.setdefault(target, set()).add(id(row))
+
+    def _delete_targets(self, table, rows, targets=None):
+        """Collects the ids to delete for rows in table, following CASCADES to their children."""
+        targets = {} if targets is None else targets
+        targets.setdefault(table, []).extend(r["id"] for r in rows)
+        for child, foreign_key in CASCADES.get(table, ()):
+            children = [c for r in rows for c in self._lookup(child, foreign_key, r["id"]) or []]
+            if children:
+                self._delete_targets(child, children, targets)
+        return targets
+
+    def _live_rows(self, table):
+        self._ensure_loaded(table)
+        rows = self.data.get(table, [])
+        dead = self._tombstones.get(table)
+        return [r for r in rows if id(r) not in dead] if dead else rows
+
+    # --- Secondary indexes ---
+
+    def _build_indexes(self, table):
+        columns = INDEXED_COLUMNS.get(table, DEFAULT_INDEXED_COLUMNS)
+        self._indexes[table] = {col: {} for col in columns}
+        for row in self._live_rows(table):
+            self._index_row(table, row)
+
+    def _index_row(self, table, row):
+        if table not in self._indexes:
+            self._build_indexes(table)
+            return
+        if id(row) not in self._positions:
+            self._positions[id(row)] = self._next_position
+            self._next_position += 1
+        for col, index in self._indexes[table].items():
+            # Keys are stringified to match the str() comparison of an unindexed eq().
+            # Buckets are keyed by row identity so removal is O(1) and insertion order is kept.
+            index.setdefault(str(row.get(col)), {})[id(row)] = row
+
+    def _unindex_row(self, table, row):
+        for col, index in self._indexes.get(table, {}).items():
+            key = str(row.get(col))
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(id(row), None)
+                if not bucket:
+                    del index[key]
+
+    def _lookup(self, table, column, value):
+        """Rows whose column equals value, or None when the column is not indexed."""
+        self._ensure_loaded(table)
+        index = self._indexes.get(table, {}).get(column)
+        if index is None:
+            return None
+        return list(index.get(str(value), {}).values())
+
+    def _commit(self, op, table, **payload):
+        """Queues a mutation for the journal, blocks until it is written, then applies it in memory.
+
+        Concurrent callers are flushed together by the journal writer (group commit), so one
+        write and one fsync cover every mutation that arrived within the commit window. Readers
+        never see a mutation the journal does not have.
+        """
+        # Encode outside the lock; only the sequence number is stitched in while holding it
+        body = json.dumps({"op": op, "table": table, **payload}, default=str)
+        with self._commit_cond:
+            self._commit_locked(op, table, payload, body)
+
+    def _settle(self):
+        """Waits until every queued commit is applied. Caller holds _commit_cond."""
+        while self._durable_seq < self._seq:
+            self._commit_cond.wait()
+
+    def _commit_locked(self, op, table, payload, body=None):
+        """_commit() for a caller already holding _commit_cond (e.g. one that just matched the rows)."""
+        if body is None:
+            body = json.dumps({"op": op, "table": table, **payload}, default=str)
+        self._seq += 1
+        seq = self._seq
+        self._pending.append((seq, f'{{"seq": {seq}, {body[1:]}\n', {"seq": seq, "op": op, "table": table, **payload}))
+        self._commit_cond.notify_all()
+        while self._durable_seq < seq:
+            self._commit_cond.wait()
+        error = self._failed.pop(seq, None)
+        if error is not None:
+            raise RuntimeError(f"Commit failed: {error}")
+
+    def _journal_writer_loop(self):
+        while True:
+            with self._commit_cond:
+                while not self._pending and not self._stop.is_set():
+                    self._commit_cond.wait()
+                if not self._pending:
+                    return
+                # Hold the batch open briefly so concurrent commits share one flush
+                deadline = time.monotonic() + GROUP_COMMIT_WINDOW_S
+                while len(self._pending) < GROUP_COMMIT_MAX_BATCH and not self._stop.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._commit_cond.wait(remaining)
+                batch, self._pending = self._pending, []
+
+            try:
+                with self._journal_lock:
+                    start = self._journal.tell()
+                    try:
+                        self._journal.write("".join(line for _, line, _ in batch))
+                        self._journal.flush()
+                        if JOURNAL_FSYNC == "always":
+                            os.fsync(self._journal.fileno())
+                    except Exception:
+                        # Drop whatever part of the batch reached the file, so a restart does not replay it
+                        try:
+                            self._journal.truncate(start)
+                        except Exception:
+                            pass
+                        raise
+                    self._journal_records += len(batch)
+                error = None
+            except Exception as e:
+                print(f"[MOCK DB] Journal write failed: {e}")
+                error = e
+
+            with self._commit_cond:
+                # Applied in sequence order, so data always reflects exactly the commits up to _durable_seq
+                for seq, _, entry in batch:
+                    if error is not None:
+                        self._failed[seq] = error
+                        continue
+                    try:
+                        self._apply(entry)
+                    except Exception as e:
+                        print(f"[MOCK DB] Applying commit {seq} failed: {e}")
+                        self._failed[seq] = e
+                self._durable_seq = batch[-1][0]
+                self._commit_cond.notify_all()
+
+    def compact(self):
+        """Folds the journal into a fresh snapshot. Inserts keep flowing while the snapshot is written."""
+        with self._compact_lock:
+            with self._commit_cond:
+                if not self._journal_records and not self._pending:
+                    return
+                # Tables with journal entries held back must be loaded before those entries leave the journal
+                for table in list(self._deferred):
+                    self._ensure_loaded(table)
+                # Commits queued so far must be written (and so applied) before the copy
+                queued = self._seq
+                while self._durable_seq < queued:
+                    self._commit_cond.wait()
+                # Holding the lock, data reflects exactly the commits up to _durable_seq
+                seq = self._durable_seq
+                # Reclaim tombstoned rows, then copy so updates can proceed while the snapshot is written
+                for table in list(self._tombstones):
+                    self.data[table] = self._live_rows(table)
+                self._tombstones = {}
+                data = {table: [dict(r) for r in rows] for table, rows in self.data.items()}
+                # Tables never loaded are carried over byte-for-byte
+                raw_segments = {
+                    table: (self._snapshot_map[offset:offset + length], rows)
+                    for table, (offset, length, rows) in self._segments.items()
+                }
+
+            self._write_snapshot(data, seq, raw_segments)
+            with self._lock:
+                self._install_snapshot()
+
+            # Keep only the records committed while the snapshot was being written
+            with self._journal_lock:
+                self._journal.close()
+                with open(MOCK_DB_JOURNAL, 'r', encoding="utf-8") as f:
+                    tail = [line for line in f if json.loads(line)["seq"] > seq]
+                tmp_path = MOCK_DB_JOURNAL + ".tmp"
+                with open(tmp_path, 'w', encoding="utf-8") as f:
+                    f.writelines(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, MOCK_DB_JOURNAL)
+                self._journal = open(MOCK_DB_JOURNAL, "a", encoding="utf-8")
+                self._journal_records = len(tail)
+                self._last_compaction = time.monotonic()
+            print(f"[MOCK DB] Compacted snapshot at seq {seq}.")
+
+    def _maintenance_loop(self):
+        while not self._stop.wait(JOURNAL_FSYNC_INTERVAL_S):
+            try:
+                if JOURNAL_FSYNC == "interval":
+                    with self._journal_lock:
+                        os.fsync(self._journal.fileno())
+                overdue = time.monotonic() - self._last_compaction >= COMPACT_INTERVAL_S
+                if self._journal_records >= COMPACT_THRESHOLD or (overdue and self._journal_records):
+                    self.compact()
+            except Exception as e:
+                print(f"[MOCK DB] Background maintenance failed: {e}")
+
+    def close(self):
+        """Drains pending commits, stops background threads and leaves a compacted snapshot behind."""
+        with self._commit_cond:
+            self._stop.set()
+            self._commit_cond.notify_all()
+        self._writer.join()
+        self._maintenance.join()
+        self.compact()
+        self._journal.close()
+        self._close_snapshot()
 
     def table(self, table_name):
         return MockTableQuery(self, table_name)
@@ -64,16 +492,33 @@ class MockTableQuery:
         self.client = client
         self.table = table
         self.filters = []
+        self.columns = None
+        self.order_by = None
+        self.offset_val = 0
         self.limit_val = None
         self.pending_insert = None
+        self.pending_update = None
+        self.pending_delete = False
+        self._from_index = False
 
     def select(self, columns="*"):
+        if columns.strip() != "*":
+            self.columns = [c.strip() for c in columns.split(",") if c.strip()]
         return self 
 
     def insert(self, record):
+        # A list inserts every record atomically in one journal entry
         self.pending_insert = record
         return self
 
+    def update(self, values):
+        self.pending_update = values
+        return self
+
+    def delete(self):
+        self.pending_delete = True
+        return self
+
     def eq(self, column, value):
         self.filters.append((column, value))
         return self
@@ -82,37 +527,122 @@ class MockTableQuery:
         self.limit_val = count
         return self
 
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def range(self, start, end):
+        # Supabase semantics: both bounds inclusive
+        self.offset_val = start
+        self.limit_val = max(end - start + 1, 0)
+        return self
+
     def execute(self):
         # Handle Insert
-        if self.pending_insert:
-            record = self.pending_insert
-            if "id" not in record:
-                record["id"] = str(uuid.uuid4())
-            record["created_at"] = datetime.datetime.now().isoformat()
+        if self.pending_insert is not None:
+            records = self.pending_insert if isinstance(self.pending_insert, list) else [self.pending_insert]
+            now = datetime.datetime.now().isoformat()
+            for record in records:
+                if not record.get("id"):
+                    record["id"] = str(uuid.uuid4())
+                record["created_at"] = now
             
-            self.client.data.setdefault(self.table, []).append(record)
-            self.client._save_db(self.client.data)
-            return MockResponse([record])
+            self.client._commit("insert", self.table, records=records)
+            return MockResponse(records)
+
+        if (self.pending_update is not None or self.pending_delete) and not self.filters:
+            raise ValueError("update() and delete() require at least one eq() filter")
+        if self.pending_update is not None and "id" in self.pending_update:
+            raise ValueError("update() cannot change a row's id")
+
+        # Update and delete match against every commit queued before them and queue themselves in the
+        # same lock hold, so the ids they act on cannot go stale in between
+        # Handle Update
+        if self.pending_update is not None:
+            with self.client._commit_cond:
+                self.client._settle()
+                rows = [{**r, **self.pending_update} for r in self._match()]
+                if rows:
+                    self.client._commit_locked("update", self.table, {"ids": [r["id"] for r in rows], "values": self.pending_update})
+            return MockResponse(rows)
+
+        # Handle Delete
+        if self.pending_delete:
+            with self.client._commit_cond:
+                self.client._settle()
+                rows = [dict(r) for r in self._match()]
+                if rows:
+                    self.client._commit_locked("delete", self.table, {"targets": self.client._delete_targets(self.table, rows)})
+            return MockResponse(rows)
 
         # Handle Select
-        rows = self.client.data.get(self.table, [])
-        
+        with self.client._lock:
+            rows = self._match()
+            end = self.offset_val + self.limit_val if self.limit_val else None
+
+            # Apply Order (only the first `end` rows are ever materialized in order)
+            if self.order_by:
+                col, desc = self.order_by
+                if col == INSERTION_ORDER_COLUMN:
+                    if self._from_index:
+                        positions = self.client._positions
+                        rows = sorted(rows, key=lambda r: positions[id(r)])
+                    if desc:
+                        rows = rows[::-1] if end is None else rows[:-end - 1:-1]
+                else:
+                    # Nulls last ascending, first descending (as in Postgres)
+                    key = lambda r: (r.get(col) is None, r.get(col))
+                    if end is None:
+                        rows = sorted(rows, key=key, reverse=desc)
+                    else:
+                        rows = (heapq.nlargest if desc else heapq.nsmallest)(end, rows, key=key)
+
+            # Apply Range / Limit
+            rows = rows[self.offset_val:end]
+
+            # Apply Projection. Rows are copied, so callers can modify results without touching stored rows
+            if self.columns:
+                rows = [{c: r[c] for c in self.columns if c in r} for r in rows]
+            else:
+                rows = [dict(r) for r in rows]
+
+        return MockResponse(rows)
+
+    def _match(self):
+        """Live rows matching the filters. Caller must hold the client lock."""
+        rows = None
+        filters = self.filters
+
+        # Plan: serve the most selective indexed equality from its hash bucket
+        best = None
+        for i, (col, val) in enumerate(filters):
+            hit = self.client._lookup(self.table, col, val)
+            if hit is not None and (best is None or len(hit) < len(best[1])):
+                best = (i, hit)
+        self._from_index = best is not None
+        if best is not None:
+            rows = best[1]
+            filters = filters[:best[0]] + filters[best[0] + 1:]
+        else:
+            rows = self.client._live_rows(self.table)
+
         # Apply Filters
-        for col, val in self.filters:
+        for col, val in filters:
             rows = [r for r in rows if str(r.get(col)) == str(val)]
-            
-        # Apply Limit
-        if self.limit_val:
-            rows = rows[:self.limit_val]
-            
-        return MockResponse(rows)
+        return rows
 
 class MockResponse:
     def __init__(self, data):
         self.data = data
 
-# Initialize Mock Client
-supabase = MockSupabaseClient()
+def _create_client():
+    if DB_BACKEND == "sqlite":
+        from backend.sqlite_db import SQLiteClient
+        return SQLiteClient()
+    return MockSupabaseClient()
+
+# Initialize the configured client
+supabase = _create_client()
 
 def get_db():
     return supabase
@@ -0,0 +1,95 @@
+import os
+import numpy as np
+from backend import physics
+
+# Design of experiments over process settings. Cases are expanded here, evaluated in chunks
+# on the geometry pool (evaluate_chunk runs in the workers, so this module must not import
+# the DB or API layers), and reduced to a feasible window and a Pareto front.
+FACTORS = ("melt_temp_c", "mold_temp_c", "thickness_scale", "gate_count")
+INTEGER_FACTORS = ("gate_count",)
+DOE_MAX_CASES = int(os.environ.get("DOE_MAX_CASES", "200000"))
+DOE_MIN_CHUNK = 5000 # Fewer cases than this per worker cost more in IPC than they save
+# Objectives minimized by the front: (cycle time, injection pressure, clamp tonnage)
+OBJECTIVES = ("cycle_time_s", "injection_pressure_mpa", "clamp_tonnage_tons")
+
+def grid(ranges):
+    """Full factorial design: every combination of each factor's evenly spaced levels.
+
+    ranges maps factor -> (low, high, levels). Returns factor -> 1-D array of cases.
+    """
+    axes = []
+    for name in FACTORS:
+        low, high, levels = ranges[name]
+        values = np.linspace(low, high, max(int(levels), 1)) if high > low else np.array([float(low)])
+        if name in INTEGER_FACTORS:
+            values = np.unique(np.round(values))
+        axes.append(values)
+    mesh = np.meshgrid(*axes, indexing="ij")
+    return {name: m.ravel() for name, m in zip(FACTORS, mesh)}
+
+def latin_hypercube(ranges, samples, seed=0):
+    """Latin hypercube design: each factor's range split into `samples` strata, one case per stratum."""
+    rng = np.random.default_rng(seed)
+    cases = {}
+    for name in FACTORS:
+        low, high, _ = ranges[name]
+        strata = (rng.permutation(samples) + rng.random(samples)) / samples
+        values = low + strata * (high - low)
+        if name in INTEGER_FACTORS:
+            # Equal-width bins per integer so the end values are as likely as the middle ones
+            values = np.minimum(np.floor(low + strata * (high - low + 1)), high)
+        cases[name] = values
+    return cases
+
+def case_count(ranges, design, samples):
+    if design == "lhs":
+        return samples
+    counts = [1 if ranges[name][1] <= ranges[name][0] else max(int(ranges[name][2]), 1) for name in FACTORS]
+    return int(np.prod(counts, dtype=np.int64))
+
+def pareto_front(points):
+    """Indices of the non-dominated rows of `points` (minimizing every column), ordered by the first column."""
+    points = np.asarray(points, dtype=np.float64)
+    order = np.lexsort(points.T[::-1])
+    candidates = order
+    front = []
+    # Sorted lexicographically, the first remaining candidate is never dominated by a later one
+    while len(candidates):
+        best = candidates[0]
+        front.append(best)
+        rest = candidates[1:]
+        dominated = np.all(points[rest] >= points[best], axis=1)
+        candidates = rest[~dominated]
+    return np.array(front, dtype=np.int64)
+
+def evaluate_chunk(geometry, props, cases, tonnage_limit=None):
+    """Worker job: evaluates one chunk of cases. Returns the objectives, feasibility and the chunk's own front."""
+    results = physics.evaluate_process(geometry, props, cases, tonnage_limit)
+    feasible = np.flatnonzero(results["feasible"])
+    objectives = np.stack([results[name] for name in OBJECTIVES], axis=1)
+    # The global front is the front of the chunks' fronts
+    front = feasible[pareto_front(objectives[feasible])] if len(feasible) else feasible
+    return {**results, "front": front}
+
+def split(cases, chunks):
+    """Splits a design into `chunks` contiguous pieces."""
+    bounds = np.linspace(0, len(cases[FACTORS[0]]), chunks + 1).astype(int)
+    return [{name: values[a:b] for name, values in cases.items()} for a, b in zip(bounds[:-1], bounds[1:])]
+
+def window(cases, feasible):
+    """Per factor: the range covered by feasible cases and the feasible fraction at each level tried."""
+    summary = {}
+    for name in FACTORS:
+        values = cases[name]
+        if not feasible.any():
+            summary[name] = None
+            continue
+        entry = {"min": float(values[feasible].min()), "max": float(values[feasible].max())}
+        levels = np.unique(values)
+        if len(levels) <= 50: # Grid designs and integer factors; LHS levels are all distinct
+            entry["levels"] = [
+                {"value": float(level), "feasible_fraction": float(feasible[values == level].mean())}
+                for level in levels
+            ]
+        summary[name] = entry
+    return summary
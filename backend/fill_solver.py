@@ -0,0 +1,338 @@
+import os
+import struct
+import numpy as np
+from scipy import ndimage
+from backend import mesh_analysis
+from backend import physics
+
+# Voxel fill-front solver. The part is voxelized, every voxel gets a local wall thickness, and the
+# melt front's arrival time T solves the eikonal equation |grad T| = 1 / F from the gates, with
+# Hele-Shaw front speed F = FLOW_SPEED_MM_S * (t / t_nominal)^2: thin sections fill slower.
+# T is found by the group marching method, a fast-marching variant that accepts every front voxel
+# within one causal step of the earliest at once, so each step is a NumPy operation over the
+# whole group rather than a heap pop per voxel.
+#
+# Budget, per occupied voxel (benchmark_fill.py tracks both and fails when they regress):
+#   time:   ~2.5-4.5 us on one core (voxelize, thickness, march, regions); thin walls at coarse
+#           resolutions take the most marching steps per voxel
+#   memory: ~450-500 bytes peak
+# FILL_MAX_VOXELS (default 1.5M) therefore keeps one solve under ~6s and ~750MB in a geometry
+# worker; finer requests are coarsened to fit.
+FILL_SOLVER_VERSION = "1"
+FILL_RESOLUTION = int(os.environ.get("FILL_RESOLUTION", "128")) # Voxels along the longest bbox axis
+FILL_MAX_RESOLUTION = 512
+FILL_VOXELS_PER_WALL = 3 # Thinner voxels than this across the nominal wall and thin walls leak
+FILL_MAX_VOXELS = int(os.environ.get("FILL_MAX_VOXELS", "1500000"))
+FILL_MAX_GRID_CELLS = 32_000_000 # Dense grid, occupied or not: 1 byte each while voxelizing
+FILL_SPEED_RATIO = (0.05, 20.0) # Clamp on (t / t_nominal)^2
+FILL_LAST_FRACTION = 0.95 # The volume filled after this fraction of it is "last to fill"
+FILL_MIN_REGION_VOXELS = 2
+FILL_MAX_REGIONS = 10
+FILL_CURVE_POINTS = 10
+# Sample points sit this far off the voxel grid (in voxels) so column rays never graze shared edges
+RAY_JITTER = (1.2345e-4, 2.3456e-4)
+
+FIELD_MAGIC = b"MFFF"
+FIELD_VERSION = 1
+# magic, version, nx, ny, nz, origin xyz (mm), voxel size (mm); then float32 fill times, C order, -1 outside
+FIELD_HEADER = struct.Struct("<4sI3I3ff")
+
+# Voxels this close to a gate (in voxels) start at their straight-line arrival time: the first-order
+# march is least accurate next to a point source
+GATE_SEED_RADIUS = 2.0
+
+class FillError(Exception):
+    """The part cannot be voxelized or filled at the requested settings."""
+
+def choose_voxel_size(extent, wall_mm=None, resolution=None, max_cells=FILL_MAX_GRID_CELLS):
+    """Voxel edge (mm): `resolution` voxels along the longest axis, refined to resolve the nominal wall."""
+    extent = np.maximum(np.asarray(extent, dtype=np.float64), 1e-6)
+    size = float(extent.max()) / (resolution or FILL_RESOLUTION)
+    if wall_mm and not resolution:
+        size = min(size, wall_mm / FILL_VOXELS_PER_WALL)
+    size = max(size, float(extent.max()) / FILL_MAX_RESOLUTION)
+    cells = np.prod(np.ceil(extent / size))
+    if cells > max_cells:
+        size *= (cells / max_cells) ** (1 / 3)
+    return size
+
+def voxelize(triangles, voxel_size):
+    """Solid occupancy grid of a closed mesh: (grid, origin). A voxel is solid when its centre is inside.
+
+    Each (x, y) column of voxel centres is a ray along Z; the mesh's crossings are rasterized per
+    triangle and the parity of crossings below each centre decides inside/outside.
+    """
+    tri = np.asarray(triangles, dtype=np.float64)
+    lo = tri.reshape(-1, 3).min(axis=0)
+    hi = tri.reshape(-1, 3).max(axis=0)
+    shape = np.maximum(np.ceil((hi - lo) / voxel_size).astype(np.int64), 1)
+    nx, ny, nz = (int(n) for n in shape)
+    # Odd number of crossings just below each voxel centre, XOR-accumulated up the column
+    flips = np.zeros((nx, ny, nz), dtype=np.uint8)
+
+    for start in range(0, len(tri), mesh_analysis.CHUNK_TRIANGLES):
+        chunk = (tri[start:start + mesh_analysis.CHUNK_TRIANGLES] - lo) / voxel_size
+        chunk[:, :, 0] -= RAY_JITTER[0]
+        chunk[:, :, 1] -= RAY_JITTER[1]
+        normal = np.cross(chunk[:, 1] - chunk[:, 0], chunk[:, 2] - chunk[:, 0])
+        for owner, px, py in mesh_analysis.raster_cells(chunk[:, :, :2], shape[:2]):
+            v0, n = chunk[owner, 0], normal[owner]
+            # Height of the triangle's plane above the column centre
+            z = v0[:, 2] - (n[:, 0] * (px + 0.5 - v0[:, 0]) + n[:, 1] * (py + 0.5 - v0[:, 1])) / n[:, 2]
+            k = np.maximum(np.ceil(z - 0.5).astype(np.int64), 0)
+            below = k < nz
+            flat, counts = np.unique((px[below] * ny + py[below]) * nz + k[below], return_counts=True)
+            flips.reshape(-1)[flat] ^= (counts & 1).astype(np.uint8)
+
+    # uint8 wraps at 256, an even number, so the running parity survives overflow
+    grid = (np.cumsum(flips, axis=2, dtype=np.uint8) & 1).astype(bool)
+    return grid, lo
+
+def local_thickness(grid):
+    """Per voxel: the diameter (in voxels) of the largest inscribed ball containing it, 0 outside.
+
+    The distance transform gives each voxel's inscribed radius. Every ball then floods outward
+    one voxel per pass along each axis, carrying its centre, and a voxel adopts a larger ball
+    whenever it lies within that ball's radius. Passes: at most the largest radius in voxels.
+    """
+    # Padded: a part that fills its whole grid still needs outside voxels to measure from
+    radius = ndimage.distance_transform_edt(np.pad(grid, 1))[1:-1, 1:-1, 1:-1].astype(np.float32)
+    best = radius
+    centre = np.indices(grid.shape, dtype=np.int16)
+    for _ in range(int(np.ceil(radius.max())) + 1):
+        changed = False
+        for axis in range(3):
+            for shift in (1, -1):
+                src = [slice(None)] * 3
+                dst = [slice(None)] * 3
+                src[axis], dst[axis] = (slice(None, -1), slice(1, None)) if shift == 1 else (slice(1, None), slice(None, -1))
+                src, dst = tuple(src), tuple(dst)
+                # Only voxels next to a larger ball need the containment test
+                at = np.nonzero(grid[dst] & (best[src] > best[dst]))
+                if not len(at[0]):
+                    continue
+                voxel = tuple(a + (s.start or 0) for a, s in zip(at, dst))
+                nb = tuple(a + (s.start or 0) for a, s in zip(at, src))
+                nb_centre = centre[(slice(None),) + nb]
+                offset = np.stack(voxel).astype(np.float32) - nb_centre
+                # The radius reaches the nearest outside voxel centre; the surface lies half a voxel beyond it
+                take = (offset ** 2).sum(axis=0) <= (best[nb] + 0.5) ** 2
+                if take.any():
+                    voxel = tuple(v[take] for v in voxel)
+                    best[voxel] = best[tuple(n[take] for n in nb)]
+                    centre[(slice(None),) + voxel] = nb_centre[:, take]
+                    changed = True
+        if not changed:
+            break
+    # A section n voxels across has centres up to (n + 1) / 2 voxels from the outside
+    return np.where(grid, np.maximum(2 * best - 1, 1), 0)
+
+def _neighbours(grid, index):
+    """(voxels, 6) indices of each solid voxel's face neighbours (-x, +x, -y, +y, -z, +z); -1 outside."""
+    padded = np.pad(index, 1, constant_values=-1)
+    centre = np.argwhere(grid) + 1
+    columns = []
+    for axis in range(3):
+        for step in (-1, 1):
+            at = centre.copy()
+            at[:, axis] += step
+            columns.append(padded[at[:, 0], at[:, 1], at[:, 2]])
+    return np.stack(columns, axis=1)
+
+def _godunov(arrival, neighbours, cost, idx):
+    """First-order upwind eikonal update of voxels idx: (new arrival times, neighbour each is fed from)."""
+    # arrival carries a trailing inf that the -1 neighbour slots index
+    values = arrival[neighbours[idx]]
+    a = np.minimum(values[:, 0::2], values[:, 1::2])
+    a.sort(axis=1)
+    f = cost[idx]
+    with np.errstate(invalid="ignore", over="ignore"):
+        t = a[:, 0] + f
+        # Fed from two axes
+        two = t > a[:, 1]
+        t2 = (a[:, 0] + a[:, 1] + np.sqrt(np.maximum(2 * f * f - (a[:, 0] - a[:, 1]) ** 2, 0))) / 2
+        t = np.where(two, t2, t)
+        # ...or all three
+        three = two & (t > a[:, 2])
+        total = a.sum(axis=1)
+        t3 = (total + np.sqrt(np.maximum(total ** 2 - 3 * ((a ** 2).sum(axis=1) - f * f), 0))) / 3
+        t = np.where(three, t3, t)
+    upwind = neighbours[idx, np.argmin(values, axis=1)]
+    return t, upwind
+
+def march(cost, neighbours, seeds, seed_times, seed_sources):
+    """Group marching from seed voxels. Returns (arrival time, index of the seed source) per voxel.
+
+    cost is seconds per voxel length at each voxel. Each step accepts every front voxel within
+    min(cost) / sqrt(3) of the earliest, which cannot affect one another, then updates their
+    neighbours twice (the GMM's two sweeps).
+    """
+    count = len(cost)
+    arrival = np.full(count + 1, np.inf)
+    source = np.full(count + 1, -1, dtype=np.int64)
+    accepted = np.zeros(count + 1, dtype=bool)
+    accepted[count] = True # The outside slot
+    arrival[seeds] = seed_times
+    source[seeds] = seed_sources
+    accepted[seeds] = True
+
+    def relax(idx):
+        for _ in range(2):
+            t, upwind = _godunov(arrival, neighbours, cost, idx)
+            better = t < arrival[idx]
+            arrival[idx[better]] = t[better]
+            source[idx[better]] = source[upwind[better]]
+
+    def frontier(group):
+        near = neighbours[group].ravel()
+        return np.unique(near[~accepted[near]])
+
+    band = frontier(seeds)
+    relax(band)
+    step = float(cost.min()) / np.sqrt(3)
+    while len(band):
+        times = arrival[band]
+        group = band[times <= times.min() + step]
+        accepted[group] = True
+        fresh = frontier(group)
+        relax(fresh)
+        band = np.union1d(band[~accepted[band]], fresh)
+    return arrival[:count], source[:count]
+
+def _regions(mask, fill_time, sources, origin, voxel_size, order_by):
+    """Connected (26-neighbour) regions of a mask: centroid, size and fill time, largest or latest first."""
+    labels, count = ndimage.label(mask, structure=np.ones((3, 3, 3), dtype=bool))
+    if not count:
+        return []
+    ids = np.arange(1, count + 1)
+    sizes = ndimage.sum_labels(mask, labels, ids)
+    keep = ids[sizes >= FILL_MIN_REGION_VOXELS]
+    if not len(keep):
+        return []
+    centroids = np.array(ndimage.center_of_mass(mask, labels, keep)).reshape(-1, 3)
+    times = ndimage.mean(fill_time, labels, keep)
+    sizes = sizes[keep - 1]
+    rank = np.argsort(-times if order_by == "time" else -sizes)[:FILL_MAX_REGIONS]
+    regions = []
+    for i in rank:
+        member = labels == keep[i]
+        regions.append({
+            "centroid_mm": [round(float(v), 3) for v in origin + (centroids[i] + 0.5) * voxel_size],
+            "voxels": int(sizes[i]),
+            "volume_mm3": round(float(sizes[i]) * voxel_size ** 3, 3),
+            "fill_time_s": round(float(times[i]), 4),
+            "gates": sorted(int(g) for g in np.unique(sources[member])),
+        })
+    return regions
+
+def solve(triangles, gates=None, wall_mm=None, resolution=None, flow_speed=physics.FLOW_SPEED_MM_S, max_voxels=FILL_MAX_VOXELS):
+    """Fills the part from its gates. Returns (summary dict, dense fill-time field, origin, voxel size).
+
+    gates are points in mesh coordinates (mm), snapped to the nearest solid voxel; by default one
+    gate at the solid voxel nearest the part's centroid. The field is float32 seconds, -1 outside
+    the part or where the melt never arrives (regions disconnected at this resolution).
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    if not len(triangles):
+        raise FillError("Mesh is empty")
+    extent = np.ptp(triangles.reshape(-1, 3), axis=0)
+    voxel_size = choose_voxel_size(extent, wall_mm, resolution)
+    grid, origin = voxelize(triangles, voxel_size)
+    occupied = int(grid.sum())
+    if occupied > max_voxels:
+        # Coarsen once to fit the budget; occupancy scales with the cube of the voxel count per axis
+        voxel_size *= (occupied / max_voxels) ** (1 / 3) * 1.02
+        grid, origin = voxelize(triangles, voxel_size)
+        occupied = int(grid.sum())
+    if not occupied:
+        raise FillError("No voxels inside the mesh; is it closed, and thicker than a voxel?")
+
+    index = np.full(grid.shape, -1, dtype=np.int64)
+    index[grid] = np.arange(occupied)
+    coords = np.argwhere(grid) # Same order as index
+    neighbours = _neighbours(grid, index)
+    t_local = local_thickness(grid)[grid]
+    t_nominal = float(np.median(t_local))
+    speed = flow_speed * np.clip((t_local / t_nominal) ** 2, *FILL_SPEED_RATIO)
+    cost = voxel_size / speed # Seconds per voxel length
+
+    centres = origin + (coords + 0.5) * voxel_size
+    if gates is None or not len(gates):
+        gates = [centres.mean(axis=0)]
+    gates = np.asarray(gates, dtype=np.float64).reshape(-1, 3)
+    gate_voxels = np.array([int(np.argmin(((centres - g) ** 2).sum(axis=1))) for g in gates])
+
+    # Seeds: the voxels around each gate, at straight-line time from it; nearest gate wins
+    seeds, seed_times, seed_sources = [], [], []
+    for number, voxel in enumerate(gate_voxels):
+        distance = np.sqrt(((coords - coords[voxel]) ** 2).sum(axis=1))
+        near = np.flatnonzero(distance <= GATE_SEED_RADIUS)
+        seeds.append(near)
+        seed_times.append(distance[near] * cost[near])
+        seed_sources.append(np.full(len(near), number))
+    seeds, seed_times, seed_sources = np.concatenate(seeds), np.concatenate(seed_times), np.concatenate(seed_sources)
+    order = np.lexsort((seed_times, seeds))
+    first = np.r_[True, seeds[order][1:] != seeds[order][:-1]]
+    seeds, seed_times, seed_sources = seeds[order][first], seed_times[order][first], seed_sources[order][first]
+
+    arrival, gate_of = march(cost, neighbours, seeds, seed_times, seed_sources)
+    reached = np.isfinite(arrival)
+    gate_of[~reached] = -1
+
+    field = np.full(grid.shape, -1.0, dtype=np.float32)
+    field[grid] = np.where(reached, arrival, -1.0)
+    source_grid = np.full(grid.shape, -1, dtype=np.int64)
+    source_grid[grid] = gate_of
+    filled = grid & (field >= 0)
+    fill_time = float(arrival[reached].max())
+
+    # Weld-line candidates: fronts from different gates meet, or one front closes around a
+    # feature (arrival time peaks along an axis between two filled neighbours)
+    weld = np.zeros(grid.shape, dtype=bool)
+    for axis in range(3):
+        before = [slice(None)] * 3
+        here = [slice(None)] * 3
+        after = [slice(None)] * 3
+        before[axis], here[axis], after[axis] = slice(0, -2), slice(1, -1), slice(2, None)
+        before, here, after = tuple(before), tuple(here), tuple(after)
+        inner = filled[before] & filled[here] & filled[after]
+        peak = inner & (field[here] > field[before]) & (field[here] > field[after])
+        meet = filled[here] & filled[after] & (source_grid[here] != source_grid[after])
+        weld[here] |= peak | meet
+    last = filled & (field >= np.quantile(arrival[reached], FILL_LAST_FRACTION))
+
+    # Time at which each tenth of the volume is filled
+    curve = np.quantile(arrival[reached], np.linspace(0.1, 1.0, FILL_CURVE_POINTS))
+    summary = {
+        "fill_time_s": round(fill_time, 4),
+        "voxel_size_mm": round(float(voxel_size), 4),
+        "grid_shape": [int(n) for n in grid.shape],
+        "voxels": occupied,
+        "unfilled_fraction": round(float(1 - reached.mean()), 5),
+        "nominal_thickness_mm": round(t_nominal * voxel_size, 3),
+        "gates": [
+            {"requested_mm": [round(float(v), 3) for v in g], "voxel_mm": [round(float(v), 3) for v in centres[i]]}
+            for g, i in zip(gates, gate_voxels)
+        ],
+        "fill_curve": [
+            {"volume_fraction": round(float(f), 2), "time_s": round(float(t), 4)}
+            for f, t in zip(np.linspace(0.1, 1.0, FILL_CURVE_POINTS), curve)
+        ],
+        "last_to_fill": _regions(last, field, source_grid, origin, voxel_size, order_by="time"),
+        "weld_line_candidates": _regions(weld, field, source_grid, origin, voxel_size, order_by="size"),
+    }
+    return summary, field, origin, voxel_size
+
+def encode_field(field, origin, voxel_size):
+    """Binary fill-time field for the viewer: FIELD_HEADER, then float32 seconds (-1 = no melt)."""
+    nx, ny, nz = field.shape
+    header = FIELD_HEADER.pack(FIELD_MAGIC, FIELD_VERSION, nx, ny, nz, *(float(v) for v in origin), float(voxel_size))
+    return header + np.ascontiguousarray(field, dtype="<f4").tobytes()
+
+def decode_field(data):
+    """Inverse of encode_field: (field, origin, voxel size)."""
+    magic, version, nx, ny, nz, ox, oy, oz, voxel_size = FIELD_HEADER.unpack_from(data)
+    if magic != FIELD_MAGIC or version != FIELD_VERSION:
+        raise ValueError("Not a fill field buffer")
+    field = np.frombuffer(data, dtype="<f4", count=nx * ny * nz, offset=FIELD_HEADER.size).reshape(nx, ny, nz)
+    return field, np.array([ox, oy, oz]), voxel_size
@@ -0,0 +1,196 @@
+import os
+import shutil
+import hashlib
+import logging
+import functools
+import threading
+import numpy as np
+import trimesh
+from backend import mesh_analysis
+from backend import static_assets
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed geometry store: converted STLs live at static/geometry/<sha256>.stl,
+# keyed by the hash of the uploaded bytes, with their analysis in the "geometry_blobs" table.
+STATIC_DIR = "static"
+GEOMETRY_SUBDIR = "geometry"
+GEOMETRY_TABLE = "geometry_blobs"
+CHUNK_SIZE = 1024 * 1024
+# Transforms are metadata: a (base file, 4x4 matrix) record in "mesh_transforms". The transformed
+# STL is only written to static/transformed/<key>.stl the first time someone downloads it.
+# Viewer LOD buffers (see backend/lod.py) live next to the blobs as geometry/lod/<key>_<percent>.bin
+LOD_SUBDIR = "lod"
+TRANSFORMS_TABLE = "mesh_transforms"
+DERIVED_SUBDIR = "transformed"
+# Fill solver output: <key>.bin (fill-time field) and <key>.json (summary), keyed by mesh, transform and settings
+FILL_SUBDIR = "fill"
+# Base meshes kept loaded between transform calls (memory maps for binary STLs, parsed arrays for ASCII)
+BASE_MESH_CACHE = int(os.environ.get("BASE_MESH_CACHE", "8"))
+
+# Check-then-write of records keyed by content: one at a time, so concurrent writers never both insert
+_records_lock = threading.Lock()
+
+class FileTooLarge(Exception):
+    pass
+
+def save_and_hash(src, dest_path, max_bytes=None):
+    """Streams a file object to dest_path in chunks, hashing on the way. Returns (sha256 hex, size).
+
+    Raises FileTooLarge as soon as more than max_bytes have been read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(dest_path, "wb") as out:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise FileTooLarge(size)
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest(), size
+
+def blob_key(digest, mesh_size=None):
+    """Store key for an upload: its hash, plus the meshing options when they change the output."""
+    if mesh_size is None:
+        return digest
+    return hashlib.sha256(f"{digest}:mesh_size={mesh_size}".encode()).hexdigest()
+
+def blob_filename(digest):
+    """Path of a stored blob relative to the static directory (what /geometry/transform expects)."""
+    return f"{GEOMETRY_SUBDIR}/{digest}.stl"
+
+def lookup(db, digest):
+    """Returns the stored blob record for an upload hash, or None if it was never seen."""
+    res = db.table(GEOMETRY_TABLE).select("*").eq("id", digest).limit(1).execute()
+    if not res.data:
+        return None
+    record = res.data[0]
+    # Analyzed before the analysis last changed (e.g. no wall-thickness map yet): analyze again
+    if record.get("analysis_version") != mesh_analysis.ANALYSIS_VERSION:
+        return None
+    # The record can outlive its file (e.g. static/ wiped on redeploy); treat that as a miss
+    path = os.path.join(STATIC_DIR, record["filename"])
+    if not os.path.exists(path):
+        return None
+    # Mark it used, so the static GC keeps it while the new part record is being linked
+    os.utime(path)
+    return record
+
+def lod_dir():
+    return os.path.join(STATIC_DIR, GEOMETRY_SUBDIR, LOD_SUBDIR)
+
+def fill_dir():
+    return os.path.join(STATIC_DIR, FILL_SUBDIR)
+
+def lod_entries(levels):
+    """Blob-record form of mesh_jobs.build_lods() output: paths become static filenames and URLs."""
+    entries = []
+    for level in levels:
+        filename = os.path.relpath(level["path"], STATIC_DIR).replace(os.sep, "/")
+        entries.append({
+            "ratio": level["ratio"],
+            "filename": filename,
+            "url": f"/{STATIC_DIR}/{filename}",
+            "triangles": level["triangles"],
+            "size_bytes": level["size_bytes"]
+        })
+    return entries
+
+def store(db, digest, stl_path, stats, lods=None):
+    """Copies a converted STL into the store under its upload hash and records its analysis and LODs."""
+    filename = blob_filename(digest)
+    final_path = os.path.join(STATIC_DIR, filename)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+
+    # Copy then rename, so a concurrent reader never sees a half-written file
+    tmp_path = static_assets.temp_path(final_path)
+    shutil.copyfile(stl_path, tmp_path)
+    os.replace(tmp_path, final_path)
+
+    record = {
+        "id": digest,
+        "filename": filename,
+        "file_url": f"/{STATIC_DIR}/{filename}",
+        "size_bytes": os.path.getsize(final_path),
+        "stats": stats,
+        "analysis_version": mesh_analysis.ANALYSIS_VERSION,
+        "lods": lods or [],
+    }
+    with _records_lock:
+        existing = db.table(GEOMETRY_TABLE).select("id").eq("id", digest).limit(1).execute()
+        if existing.data:
+            # Same bytes uploaded concurrently, or re-analyzed after an ANALYSIS_VERSION bump: keep one record
+            db.table(GEOMETRY_TABLE).update({k: v for k, v in record.items() if k != "id"}).eq("id", digest).execute()
+        else:
+            db.table(GEOMETRY_TABLE).insert(record).execute()
+    logger.info(f"Stored geometry blob {digest[:12]} ({record['size_bytes']} bytes)")
+    return record
+
+def static_path(filename):
+    """Absolute path of a stored file named by a client, or None if missing or outside STATIC_DIR."""
+    return static_assets.resolve(filename, STATIC_DIR)
+
+def static_filename(file_url):
+    """Path relative to the static directory for a /static/... URL stored on a part."""
+    prefix = f"/{STATIC_DIR}/"
+    return file_url[len(prefix):] if file_url.startswith(prefix) else file_url
+
+@functools.lru_cache(maxsize=BASE_MESH_CACHE)
+def _load_base_triangles(path, mtime_ns, size):
+    # mtime/size are part of the cache key, so a replaced file is reloaded
+    triangles = mesh_analysis.load_triangles(path)
+    if triangles is None:
+        # ASCII STL: parse once, then serve the array from the cache
+        triangles = np.asarray(trimesh.load(path, file_type='stl').triangles, dtype=np.float32)
+    return triangles
+
+def load_base_triangles(filename):
+    """(N, 3, 3) triangles of a stored STL, cached across calls."""
+    path = os.path.join(STATIC_DIR, filename)
+    st = os.stat(path)
+    return _load_base_triangles(path, st.st_mtime_ns, st.st_size)
+
+def transform_key(filename, matrix):
+    rounded = np.round(np.asarray(matrix, dtype=np.float64), 9) + 0.0 # + 0.0 folds -0.0 into 0.0
+    return hashlib.sha256(filename.encode() + b":" + rounded.tobytes()).hexdigest()
+
+def record_transform(db, filename, matrix):
+    """Records (base file, transform) and returns its key; the same pair always maps to the same key."""
+    key = transform_key(filename, matrix)
+    with _records_lock:
+        existing = db.table(TRANSFORMS_TABLE).select("id").eq("id", key).limit(1).execute()
+        if not existing.data:
+            db.table(TRANSFORMS_TABLE).insert({
+                "id": key,
+                "base_filename": filename,
+                "transform": np.asarray(matrix, dtype=np.float64).tolist(),
+            }).execute()
+    return key
+
+def materialize(db, key):
+    """Path of the transformed STL for a key, writing it on first request. None if the key is unknown
+    or its base file is gone."""
+    res = db.table(TRANSFORMS_TABLE).select("*").eq("id", key).limit(1).execute()
+    if not res.data:
+        return None
+    record = res.data[0]
+    final_path = os.path.join(STATIC_DIR, DERIVED_SUBDIR, f"{key}.stl")
+    if os.path.exists(final_path):
+        return final_path
+
+    try:
+        base = load_base_triangles(record["base_filename"])
+    except FileNotFoundError:
+        return None
+    triangles = mesh_analysis.apply_transform(base, record["transform"])
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    tmp_path = static_assets.temp_path(final_path)
+    mesh_analysis.write_binary_stl(tmp_path, triangles.astype(np.float32))
+    os.replace(tmp_path, final_path)
+    static_assets.precompress([final_path])
+    logger.info(f"Materialized transformed mesh {key[:12]}")
+    return final_path
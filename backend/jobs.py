@@ -0,0 +1,247 @@
+import os
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+import inspect
+import threading
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+# Local job queue: long work (upload conversion + analysis, simulations) is submitted here and
+# runs on the server's event loop, so the request that submitted it returns a job id at once.
+# Each job type has its own concurrency limit; within a type, higher priority runs first, then FIFO.
+JOB_LIMITS = {
+    "upload": int(os.environ.get("JOB_UPLOAD_CONCURRENCY", "4")),
+    "simulation": int(os.environ.get("JOB_SIMULATION_CONCURRENCY", "4")),
+}
+DEFAULT_JOB_LIMIT = 2 # Types not listed above
+JOB_PRIORITIES = {"simulation": 10, "upload": 0} # Defaults; simulations are short and interactive
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "1000"))
+# Finished jobs (and their results) are kept this long for polling
+JOB_RETENTION_S = float(os.environ.get("JOB_RETENTION_S", "3600"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# The job the current task/thread is running for; report_progress() is a no-op outside a job
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+class QueueFull(Exception):
+    """Too many jobs are waiting; the client should retry later."""
+
+class JobFailed(Exception):
+    """Raised by a job to fail with an HTTP-style status code and detail."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def report_progress(stage, progress=None):
+    """Records the running job's current stage and fraction done (0-1). Safe from any thread."""
+    job = _current_job.get()
+    if job is not None:
+        job.queue._update(job, stage=stage, progress=progress)
+
+class Job:
+    def __init__(self, queue, job_type, fn, args, kwargs, priority):
+        self.queue = queue
+        self.id = str(uuid.uuid4())
+        self.type = job_type
+        self.priority = priority
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.status = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.seq = 0
+        self.version = 0
+        self._changed = None # asyncio.Event on the queue's loop, replaced after each notification
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "priority": self.priority,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobQueue:
+    """Priority queue of jobs with per-type concurrency limits, run as tasks on one event loop.
+
+    Job functions may be coroutine functions (run on the loop) or plain functions (run in a
+    thread). submit() and report_progress() may be called from any thread.
+    """
+
+    def __init__(self, limits=None, max_pending=JOB_MAX_PENDING, retention_s=JOB_RETENTION_S):
+        self.limits = dict(JOB_LIMITS if limits is None else limits)
+        self.max_pending = max_pending
+        self.retention_s = retention_s
+        self._jobs = {}
+        self._pending = {} # type -> heap of (-priority, seq, job)
+        self._running = {} # type -> count
+        self._tasks = set()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._closed = False
+
+    def start(self):
+        """Binds the queue to the running event loop; call from the app's startup."""
+        self._loop = asyncio.get_running_loop()
+        self._closed = False
+        self._dispatch()
+        return self
+
+    async def stop(self):
+        """Cancels running jobs; queued ones stay queued until the next start()."""
+        self._closed = True
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+    def submit(self, job_type, fn, *args, priority=None, **kwargs):
+        """Queues fn(*args, **kwargs) and returns the job's status record."""
+        priority = JOB_PRIORITIES.get(job_type, 0) if priority is None else priority
+        with self._lock:
+            self._prune()
+            pending = sum(len(heap) for heap in self._pending.values())
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs already waiting")
+            job = Job(self, job_type, fn, args, kwargs, priority)
+            self._jobs[job.id] = job
+            self._seq += 1
+            job.seq = self._seq
+            heapq.heappush(self._pending.setdefault(job_type, []), (-priority, job.seq, job))
+            status = job.describe()
+        self._call_on_loop(self._dispatch)
+        return status
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """The job's status record with its queue position, or None for an unknown id."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = job.describe()
+            if job.status == QUEUED:
+                # Jobs of the same type that will start before this one
+                status["queue_position"] = sum(1 for entry in self._pending.get(job.type, []) if entry[:2] < (-job.priority, job.seq))
+            return status
+
+    async def wait_for_change(self, job, version, timeout):
+        """Waits until the job changes past `version` or the timeout passes. Returns its current version."""
+        if job.version != version:
+            return job.version
+        if job._changed is None:
+            job._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(job._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job.version
+
+    def _call_on_loop(self, fn, *args):
+        loop = self._loop
+        if loop is None:
+            # Not started yet; start() dispatches whatever was queued before it
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            fn(*args)
+        else:
+            loop.call_soon_threadsafe(fn, *args)
+
+    def _update(self, job, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                if value is not None:
+                    setattr(job, key, value)
+            job.version += 1
+        self._call_on_loop(self._notify, job)
+
+    def _notify(self, job):
+        event, job._changed = job._changed, None
+        if event is not None:
+            event.set()
+
+    def _dispatch(self):
+        while not self._closed:
+            with self._lock:
+                # Highest-priority head among the types that have a free slot
+                ready = [
+                    heap[0] for job_type, heap in self._pending.items()
+                    if heap and self._running.get(job_type, 0) < self.limits.get(job_type, DEFAULT_JOB_LIMIT)
+                ]
+                if not ready:
+                    return
+                _, _, job = min(ready)
+                heapq.heappop(self._pending[job.type])
+                self._running[job.type] = self._running.get(job.type, 0) + 1
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.version += 1
+            self._notify(job)
+            task = self._loop.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job):
+        token = _current_job.set(job)
+        fields = {}
+        try:
+            if inspect.iscoroutinefunction(job.fn):
+                result = await job.fn(*job.args, **job.kwargs)
+            else:
+                result = await asyncio.to_thread(job.fn, *job.args, **job.kwargs)
+            fields = {"status": SUCCEEDED, "result": result, "progress": 1.0}
+        except asyncio.CancelledError:
+            fields = {"status": FAILED, "error": {"status_code": 503, "detail": "Server shut down before the job finished"}}
+            raise
+        except Exception as e:
+            status_code, detail = getattr(e, "status_code", 500), getattr(e, "detail", None)
+            if detail is None:
+                logger.error(f"Job {job.id} ({job.type}) failed: {e}")
+                detail = f"{type(e).__name__}: {e}"
+            fields = {"status": FAILED, "error": {"status_code": status_code, "detail": detail}}
+        finally:
+            _current_job.reset(token)
+            with self._lock:
+                self._running[job.type] -= 1
+                # Arguments can hold large objects (file paths, DB handles); the result is all that's needed now
+                job.fn = job.args = job.kwargs = None
+            self._update(job, finished_at=time.time(), **fields)
+            self._dispatch()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_s
+        expired = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+_queue = JobQueue()
+
+def get_queue():
+    return _queue
@@ -0,0 +1,91 @@
+import os
+import struct
+import numpy as np
+
+# Level-of-detail meshes for the 3D viewer. Each level is a compact binary buffer:
+#
+#   header (44 bytes): magic b"MFLD", version u32, vertex count u32, triangle count u32,
+#                      index size u32 (2 or 4), origin 3 x f32, scale 3 x f32
+#   positions:         vertex count x 3 x u16, position = origin + q * scale
+#   (zero padding to a 4-byte boundary)
+#   indices:           triangle count x 3 x u16/u32
+#
+# 16-bit quantization over the bounding box keeps the error under 1/65535 of the part size,
+# far below a pixel, at a third of the size of a float32 STL.
+LOD_MAGIC = b"MFLD"
+LOD_VERSION = 1
+LOD_HEADER = struct.Struct("<4sIIII3f3f")
+LOD_RATIOS = tuple(float(r) for r in os.environ.get("LOD_LEVELS", "0.05,0.25,1.0").split(","))
+# Grid refinements when searching for the cluster size that hits a level's triangle budget
+CLUSTER_ITERATIONS = 5
+# Levels never go below this many triangles; small parts just repeat the full mesh
+MIN_LOD_TRIANGLES = 256
+
+def _cluster(vertices, faces, cell):
+    # Merge all vertices in each grid cell into their centroid, then drop collapsed and duplicate faces
+    lo = vertices.min(axis=0)
+    q = np.floor((vertices - lo) / cell).astype(np.int64)
+    dims = q.max(axis=0) + 1
+    cell_ids = (q[:, 0] * dims[1] + q[:, 1]) * dims[2] + q[:, 2]
+    _, remap, counts = np.unique(cell_ids, return_inverse=True, return_counts=True)
+    merged = np.stack([np.bincount(remap, weights=vertices[:, a]) for a in range(3)], axis=1) / counts[:, None]
+
+    f = remap[faces]
+    keep = (f[:, 0] != f[:, 1]) & (f[:, 1] != f[:, 2]) & (f[:, 0] != f[:, 2])
+    f = f[keep]
+    _, first = np.unique(np.sort(f, axis=1), axis=0, return_index=True)
+    f = f[np.sort(first)]
+
+    # Only keep vertices still referenced
+    used, f = np.unique(f, return_inverse=True)
+    return merged[used], f.reshape(-1, 3)
+
+def decimate(vertices, faces, ratio):
+    """Vertex-clustering simplification to about ratio * len(faces) triangles.
+
+    The grid cell starts from the size a uniform mesh of that many triangles would have over
+    the surface, then is rescaled a few times toward the budget (face count ~ 1/cell^2).
+    """
+    target = max(MIN_LOD_TRIANGLES, int(len(faces) * ratio))
+    if ratio >= 1.0 or len(faces) <= target:
+        return vertices, faces
+    v = vertices.astype(np.float64)
+    tri = v[faces]
+    surface = float(np.linalg.norm(np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]), axis=1).sum()) / 2.0
+    cell = max(np.sqrt(2.0 * surface / target), 1e-9)
+
+    best = None
+    for _ in range(CLUSTER_ITERATIONS):
+        out_v, out_f = _cluster(v, faces, cell)
+        if len(out_f) and (best is None or abs(len(out_f) - target) < abs(len(best[1]) - target)):
+            best = (out_v, out_f)
+        if not len(out_f) or abs(len(out_f) - target) <= 0.1 * target:
+            break
+        cell *= np.sqrt(max(len(out_f), 1) / target)
+    return best or (vertices, faces)
+
+def encode(vertices, faces):
+    """The LOD buffer (see the format above) for an indexed mesh."""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    lo = vertices.min(axis=0)
+    scale = np.maximum(vertices.max(axis=0) - lo, 1e-9) / 65535.0
+    q = np.round((vertices - lo) / scale).astype(np.uint16)
+    index_size = 2 if len(vertices) <= 0xFFFF else 4
+    indices = faces.astype(np.uint16 if index_size == 2 else np.uint32)
+
+    positions = q.tobytes()
+    padding = b"\0" * (-len(positions) % 4)
+    header = LOD_HEADER.pack(LOD_MAGIC, LOD_VERSION, len(vertices), len(faces), index_size, *lo, *scale)
+    return header + positions + padding + indices.tobytes()
+
+def decode(buffer):
+    """(vertices float32 (V, 3), faces (N, 3)) from an LOD buffer."""
+    magic, version, vertex_count, triangle_count, index_size, *rest = LOD_HEADER.unpack_from(buffer)
+    if magic != LOD_MAGIC or version != LOD_VERSION:
+        raise ValueError("Not an LOD buffer")
+    origin, scale = np.array(rest[:3]), np.array(rest[3:])
+    offset = LOD_HEADER.size
+    q = np.frombuffer(buffer, dtype="<u2", count=vertex_count * 3, offset=offset).reshape(-1, 3)
+    offset += q.nbytes + (-q.nbytes % 4)
+    faces = np.frombuffer(buffer, dtype="<u2" if index_size == 2 else "<u4", count=triangle_count * 3, offset=offset)
+    return (origin + q * scale).astype(np.float32), faces.reshape(-1, 3)
@@ -0,0 +1,58 @@
+import bisect
+import threading
+import numpy as np
+from backend import physics
+
+# Machines sorted by clamp tonnage (then shot volume), so the smallest machine for a part is a
+# binary search for its tonnage followed by a filter over the larger machines only, in blocks, until
+# enough fit. Built from the machines table on first use; invalidate() after the table changes.
+MACHINE_SCAN_BLOCK = 256 # Machines checked per vectorized step past the tonnage bound
+
+_index = None
+_version = 0
+_lock = threading.Lock()
+
+def _value(machine, column):
+    value = machine.get(column)
+    return float(value) if value is not None else 0.0
+
+class MachineIndex:
+    def __init__(self, machines):
+        self.machines = sorted(machines, key=lambda m: (_value(m, "clamp_tonnage"), _value(m, "max_shot_volume")))
+        self.tonnage = [_value(m, "clamp_tonnage") for m in self.machines]
+        self.shot_volume = np.array([_value(m, "max_shot_volume") for m in self.machines])
+        self.tie_x = np.array([_value(m, "tie_bar_spacing_x") for m in self.machines])
+        self.tie_y = np.array([_value(m, "tie_bar_spacing_y") for m in self.machines])
+
+    def __len__(self):
+        return len(self.machines)
+
+    def select(self, tonnage, shot_volume_cm3, bbox, count=2):
+        """The `count` smallest machines with at least this clamp tonnage and shot volume whose tie bars clear the bbox."""
+        found = []
+        start = bisect.bisect_left(self.tonnage, tonnage)
+        for lo in range(start, len(self.machines), MACHINE_SCAN_BLOCK):
+            hi = min(lo + MACHINE_SCAN_BLOCK, len(self.machines))
+            fits = (self.shot_volume[lo:hi] >= shot_volume_cm3) & physics.tie_bar_clearance(bbox, self.tie_x[lo:hi], self.tie_y[lo:hi])
+            found.extend(lo + np.flatnonzero(fits))
+            if len(found) >= count:
+                break
+        return [self.machines[i] for i in found[:count]]
+
+def get(db):
+    """The index of the machines table, built on first use and after invalidate()."""
+    global _index
+    with _lock:
+        if _index is None:
+            _index = MachineIndex(db.table("machines").select("*").execute().data or [])
+        return _index
+
+def version():
+    """Changes whenever the index is invalidated; results that depend on the catalog key on it."""
+    return _version
+
+def invalidate():
+    global _index, _version
+    with _lock:
+        _index = None
+        _version += 1
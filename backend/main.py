@@ -4,7 +4,11 @@ from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import os
 
-from backend.api import geometry, simulation, reports, projects, materials, machines
+from backend.api import geometry, simulation, reports, projects, materials, machines, assets, jobs
+from backend.database import get_db
+from backend.workers import shutdown_pools
+from backend.static_gc import StaticCollector
+from backend.jobs import get_queue
 
 # Static directory for served files
 os.makedirs("static", exist_ok=True)
@@ -13,8 +17,17 @@ os.makedirs("static", exist_ok=True)
 async def lifespan(app: FastAPI):
     # V2: Mock DB handles seeding internally on load
     print("🚀 V2 Backend Started (Mock Mode)")
+    # Reference-counted cleanup of static/ under STATIC_QUOTA_MB
+    collector = StaticCollector(get_db).start()
+    # Background uploads and simulations (/jobs) run as tasks on this loop
+    job_queue = get_queue().start()
     yield
     print("🛑 Shutting down")
+    await job_queue.stop()
+    collector.stop()
+    shutdown_pools()
+    # Fold the write-ahead journal into the snapshot so the next start replays nothing
+    get_db().close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -33,10 +46,10 @@ app.include_router(geometry.router)
 app.include_router(simulation.router)
 app.include_router(reports.router)
 app.include_router(projects.router)
+app.include_router(jobs.router)
 
-os.makedirs("static", exist_ok=True)
-# Mount static files for geometry (existing)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Static geometry: ETag/304, immutable caching, precompressed variants and ranges (replaces a plain StaticFiles mount)
+app.include_router(assets.router)
 
 @app.get("/health")
 async def health_check():
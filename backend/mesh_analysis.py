@@ -0,0 +1,271 @@
+import os
+import numpy as np
+from backend.bvh import TriangleBVH
+
+# Vectorized analysis straight off the binary STL triangle buffer. No Trimesh objects and no
+# per-vertex Python objects: the file is memory-mapped and viewed as a structured array.
+# Bump whenever the stats this module produces change; stored geometry blobs analyzed by an
+# older version are treated as cache misses and analyzed again
+ANALYSIS_VERSION = 4
+STL_HEADER_BYTES = 80
+STL_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+# Triangles converted to float64 at a time; bounds the temporary memory of each pass (~19 MB)
+CHUNK_TRIANGLES = 262144
+# Raster cells along the longer side of the projected silhouette (true projected area)
+PROJECTION_RESOLUTION = int(os.environ.get("PROJECTION_RESOLUTION", "512"))
+# Rays cast for the wall-thickness distribution; larger parts are sampled by face area
+THICKNESS_MAX_RAYS = int(os.environ.get("THICKNESS_MAX_RAYS", "50000"))
+THICKNESS_BINS = 20
+# Candidate pixels tested per rasterization batch; bounds its temporaries
+RASTER_BATCH_CELLS = 4_000_000
+
+def read_triangle_count(path):
+    """Triangle count of a binary STL, or None if the file is not one (ASCII or malformed)."""
+    size = os.path.getsize(path)
+    if size < STL_HEADER_BYTES + 4:
+        return None
+    with open(path, "rb") as f:
+        f.seek(STL_HEADER_BYTES)
+        count = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+    # ASCII files also start with 80 bytes, but never match the binary size exactly
+    if size != STL_HEADER_BYTES + 4 + count * STL_DTYPE.itemsize:
+        return None
+    return count
+
+def load_triangles(path):
+    """Memory-maps a binary STL as an (N, 3, 3) float32 view. Returns None for non-binary STLs."""
+    count = read_triangle_count(path)
+    if count is None:
+        return None
+    if count == 0:
+        return np.empty((0, 3, 3), dtype=np.float32)
+    records = np.memmap(path, dtype=STL_DTYPE, mode="r", offset=STL_HEADER_BYTES + 4, shape=(count,))
+    return records["vertices"]
+
+def _chunks(triangles):
+    for start in range(0, len(triangles), CHUNK_TRIANGLES):
+        yield np.asarray(triangles[start:start + CHUNK_TRIANGLES], dtype=np.float64)
+
+def triangle_stats(triangles):
+    """Volume (mm3) and bounds of a closed triangle soup, in one chunked pass."""
+    volume = 0.0
+    lo = np.full(3, np.inf)
+    hi = np.full(3, -np.inf)
+    for tri in _chunks(triangles):
+        v0, v1, v2 = tri[:, 0], tri[:, 1], tri[:, 2]
+        # Signed tetrahedron volumes against the origin (divergence theorem)
+        volume += float(np.einsum("ij,ij->", v0, np.cross(v1, v2))) / 6.0
+        flat = tri.reshape(-1, 3)
+        lo = np.minimum(lo, flat.min(axis=0))
+        hi = np.maximum(hi, flat.max(axis=0))
+    # Inward-facing winding makes the volume negative; callers take abs() for the enclosed volume
+    return volume, lo, hi
+
+def raster_cells(tri, shape):
+    """Yields (triangle index, pixel x, pixel y) for every pixel centre inside a 2-D triangle.
+
+    tri is (n, 3, 2) in pixel units (pixel i has its centre at i + 0.5) and shape the raster size.
+    Pixel centres inside each triangle's bounding box are tested with edge functions; triangles are
+    grouped by bounding-box size so each group is one broadcast test. Zero-area triangles are skipped.
+    """
+    area2 = (tri[:, 1, 0] - tri[:, 0, 0]) * (tri[:, 2, 1] - tri[:, 0, 1]) - \
+            (tri[:, 1, 1] - tri[:, 0, 1]) * (tri[:, 2, 0] - tri[:, 0, 0])
+    index = np.flatnonzero(np.abs(area2) > 1e-12)
+    tri = tri[index]
+    first = np.ceil(tri.min(axis=1) - 0.5).astype(np.int64)
+    last = np.minimum(np.floor(tri.max(axis=1) - 0.5).astype(np.int64), np.asarray(shape) - 1)
+    first = np.maximum(first, 0)
+    span = (last - first + 1).max(axis=1)
+    keep = span > 0
+    index, tri, first, last, span = index[keep], tri[keep], first[keep], last[keep], span[keep]
+    if not len(tri):
+        return
+
+    # Power-of-two size classes: each class tests a k x k block of candidate pixels per triangle
+    size_class = 2 ** np.ceil(np.log2(span)).astype(np.int64)
+    for k in np.unique(size_class):
+        members = np.flatnonzero(size_class == k)
+        offsets = np.stack(np.meshgrid(np.arange(k), np.arange(k), indexing="ij"), axis=-1).reshape(-1, 2)
+        step = max(1, RASTER_BATCH_CELLS // (k * k))
+        for batch in range(0, len(members), step):
+            sel = members[batch:batch + step]
+            px = first[sel, None, :] + offsets[None, :, :]
+            inside = np.all(px <= last[sel, None, :], axis=2)
+            cx = px[..., 0] + 0.5
+            cy = px[..., 1] + 0.5
+            t = tri[sel]
+            edges = []
+            for a, b in ((0, 1), (1, 2), (2, 0)):
+                ax, ay = t[:, a, 0, None], t[:, a, 1, None]
+                bx, by = t[:, b, 0, None], t[:, b, 1, None]
+                edges.append((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+            e0, e1, e2 = edges
+            # Either winding: all edge functions share a sign
+            inside &= ((e0 >= 0) & (e1 >= 0) & (e2 >= 0)) | ((e0 <= 0) & (e1 <= 0) & (e2 <= 0))
+            owner = np.broadcast_to(index[sel, None], inside.shape)
+            yield owner[inside], px[inside][:, 0], px[inside][:, 1]
+
+def projected_area(triangles, axis=2, resolution=PROJECTION_RESOLUTION):
+    """Area (mm2) of the part's silhouette along `axis` (Z, the clamp axis, by default).
+
+    Every triangle is projected onto the parting plane and rasterized; overlapping triangles
+    simply mark the same pixels. Walls parallel to the clamp axis project to slivers with no
+    area of their own and are skipped.
+    """
+    keep = [a for a in range(3) if a != axis]
+    flat = np.asarray(triangles[:, :, keep], dtype=np.float64)
+    if not len(flat):
+        return 0.0
+    lo = flat.reshape(-1, 2).min(axis=0)
+    hi = flat.reshape(-1, 2).max(axis=0)
+    cell = max(float((hi - lo).max()) / resolution, 1e-9)
+    shape = np.maximum(np.ceil((hi - lo) / cell).astype(np.int64), 1)
+    covered = np.zeros(shape, dtype=bool)
+
+    for start in range(0, len(flat), CHUNK_TRIANGLES):
+        tri = (flat[start:start + CHUNK_TRIANGLES] - lo) / cell
+        for _, px, py in raster_cells(tri, shape):
+            covered[px, py] = True
+
+    return float(covered.sum()) * cell * cell
+
+def wall_thickness(triangles, max_rays=THICKNESS_MAX_RAYS, bins=THICKNESS_BINS, seed=0):
+    """Wall-thickness distribution from one inward ray per face, cast against a BVH of the part.
+
+    The thickness at a face is the distance along its inward normal to the opposite wall. Up to
+    max_rays faces are used, sampled in proportion to their area (fixed seed, so the same part
+    always gets the same answer). Returns summary percentiles and an area-weighted histogram, with
+    each bin's mean thickness, over the rays that hit a wall; rays that escape (open meshes, gaps)
+    only count towards unresolved_fraction, and the statistics are None with an empty histogram
+    when none hit.
+    """
+    tri = np.asarray(triangles, dtype=np.float64)
+    if not len(tri):
+        return None
+    cross = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    doubled_area = np.linalg.norm(cross, axis=1)
+    faces = np.flatnonzero(doubled_area > 0)
+    if not len(faces):
+        return None
+    weights = doubled_area[faces]
+    if len(faces) > max_rays:
+        faces = np.random.default_rng(seed).choice(faces, size=max_rays, p=weights / weights.sum())
+        weights = np.ones(len(faces))
+
+    # Outward normals for a positively wound mesh; flip everything if the winding is inverted
+    volume, lo, hi = triangle_stats(tri)
+    normals = cross[faces] / doubled_area[faces, None]
+    inward = -normals if volume >= 0 else normals
+    # No ray inside the part is longer than its bounding-box diagonal
+    t_max = float(np.linalg.norm(hi - lo)) * 1.01 or 1.0
+    origins = tri[faces].mean(axis=1)
+
+    bvh = TriangleBVH(tri)
+    thickness, hit = bvh.intersect(origins, inward, t_max, ignore=faces)
+    rays = int(len(faces))
+    unresolved = float(np.mean(hit < 0))
+    resolved = hit >= 0
+    if not resolved.any():
+        return {
+            "mean_mm": None, "median_mm": None, "p10_mm": None, "p90_mm": None, "max_mm": None,
+            "rays": rays,
+            "unresolved_fraction": unresolved,
+            "histogram": {"bin_edges_mm": [], "area_fraction": [], "mean_mm": []}
+        }
+    # An escaped ray keeps t_max (the bbox diagonal), which is no wall thickness
+    thickness, weights = thickness[resolved], weights[resolved]
+
+    order = np.argsort(thickness)
+    cumulative = np.cumsum(weights[order]) / weights.sum()
+    def percentile(q):
+        return float(thickness[order][min(np.searchsorted(cumulative, q), len(order) - 1)])
+
+    counts, edges = np.histogram(thickness, bins=bins, range=(0.0, float(thickness.max()) or t_max), weights=weights)
+    # Area-weighted wall of each bin: a coarse bin's centre can be far from the walls in it
+    sums, _ = np.histogram(thickness, bins=edges, weights=weights * thickness)
+    means = np.where(counts > 0, sums / np.where(counts > 0, counts, 1.0), (edges[:-1] + edges[1:]) / 2)
+    return {
+        "mean_mm": float(np.average(thickness, weights=weights)),
+        "median_mm": percentile(0.5),
+        "p10_mm": percentile(0.1),
+        "p90_mm": percentile(0.9),
+        "max_mm": float(thickness.max()),
+        "rays": rays,
+        "unresolved_fraction": unresolved,
+        "histogram": {
+            "bin_edges_mm": [round(float(e), 4) for e in edges],
+            "area_fraction": [round(float(c), 6) for c in counts / weights.sum()],
+            "mean_mm": [round(float(m), 4) for m in means]
+        }
+    }
+
+def stats_from_triangles(triangles, thickness=True):
+    """The /geometry stats dict for a triangle array, or None when the mesh is empty.
+
+    thickness=False skips the ray-cast wall-thickness map (it does not change with orientation).
+    """
+    if len(triangles) == 0:
+        return None
+    volume, lo, hi = triangle_stats(triangles)
+    dims = hi - lo
+    stats = {
+        "volume_mm3": abs(volume),
+        "projected_area_mm2": projected_area(triangles),
+        "bbox_projected_area_mm2": float(dims[0] * dims[1]),
+        "bbox": {
+            "x": float(dims[0]),
+            "y": float(dims[1]),
+            "z": float(dims[2])
+        }
+    }
+    if thickness:
+        stats["wall_thickness"] = wall_thickness(triangles)
+    return stats
+
+def weld(triangles):
+    """Indexed form of a triangle soup: (unique vertices (V, 3), faces (N, 3) indices into them).
+
+    STL repeats every shared vertex; exact duplicates are merged through a bytes view, so the
+    dedupe is one 1-D sort instead of np.unique(axis=0).
+    """
+    # + 0.0 turns -0.0 into 0.0, which would otherwise compare unequal bytewise
+    flat = np.ascontiguousarray(np.asarray(triangles).reshape(-1, 3)) + 0.0
+    keys = flat.view(np.dtype((np.void, flat.dtype.itemsize * 3))).ravel()
+    unique, inverse = np.unique(keys, return_inverse=True)
+    vertices = unique.view(flat.dtype).reshape(-1, 3)
+    return vertices, inverse.reshape(-1, 3)
+
+def rotation_matrix(rotation_x=0.0, rotation_y=0.0, rotation_z=0.0):
+    """3x3 rotation applying X, then Y, then Z (degrees), as successive apply_transform calls did."""
+    ax, ay, az = np.radians([rotation_x, rotation_y, rotation_z])
+    rx = np.array([[1, 0, 0], [0, np.cos(ax), -np.sin(ax)], [0, np.sin(ax), np.cos(ax)]])
+    ry = np.array([[np.cos(ay), 0, np.sin(ay)], [0, 1, 0], [-np.sin(ay), 0, np.cos(ay)]])
+    rz = np.array([[np.cos(az), -np.sin(az), 0], [np.sin(az), np.cos(az), 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+def rotation_transform(rotation_x=0.0, rotation_y=0.0, rotation_z=0.0):
+    """rotation_matrix() as a 4x4 homogeneous transform, composable with a part's stored transform."""
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation_matrix(rotation_x, rotation_y, rotation_z)
+    return matrix
+
+def apply_transform(triangles, matrix):
+    """(N, 3, 3) triangles mapped through a 4x4 affine transform, as float64."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return np.asarray(triangles, dtype=np.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+
+def write_binary_stl(path, triangles):
+    """Writes an (N, 3, 3) triangle array as a binary STL with recomputed facet normals."""
+    records = np.zeros(len(triangles), dtype=STL_DTYPE)
+    records["vertices"] = triangles
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    records["normal"] = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    with open(path, "wb") as f:
+        f.write(b"\0" * STL_HEADER_BYTES)
+        f.write(np.uint32(len(triangles)).tobytes())
+        records.tofile(f)
@@ -0,0 +1,131 @@
+# CPU-bound geometry jobs. They run inside worker processes (see backend/workers.py),
+# so this module must not import the database or the API layer.
+import os
+import json
+import logging
+import trimesh
+from backend import mesh_analysis
+from backend import orientation
+from backend import lod
+from backend import fill_solver
+from backend import static_assets
+try:
+    import gmsh
+    GMSH_AVAILABLE = True
+except OSError as e:
+    # Render or environment missing libGLU
+    logging.warning(f"GMSH import failed (likely missing libGLU): {e}. STEP conversion disabled.")
+    GMSH_AVAILABLE = False
+except ImportError as e:
+    logging.warning(f"GMSH not installed: {e}. STEP conversion disabled.")
+    GMSH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Default GMSH threads per conversion; 1 suits the low-memory free tier, big assemblies can ask for more
+GMSH_THREADS = int(os.environ.get("GMSH_THREADS", "1"))
+GMSH_MAX_THREADS = os.cpu_count() or 1
+
+def convert_step_to_stl(input_path: str, output_path: str, mesh_size: float = None, threads: int = None):
+    """Meshes a STEP file with GMSH and writes a binary STL.
+
+    GMSH stays initialized between calls; the worker running this is recycled by its pool
+    instead of paying initialize/finalize on every conversion.
+    """
+    if not GMSH_AVAILABLE:
+        raise RuntimeError("GMSH libraries not available in worker")
+
+    if not gmsh.is_initialized():
+        gmsh.initialize()
+        gmsh.option.setNumber("General.Terminal", 1)    # Log output
+        gmsh.option.setNumber("Mesh.Algorithm", 6)      # Frontal-Delaunay 2D (Usually efficient)
+        gmsh.option.setNumber("Mesh.Binary", 1)         # Write Binary STL (Faster, smaller)
+
+    gmsh.clear()
+
+    # Per-job options are always set, so nothing leaks over from the previous job
+    threads = max(1, min(threads or GMSH_THREADS, GMSH_MAX_THREADS))
+    gmsh.option.setNumber("General.NumThreads", threads)
+    gmsh.option.setNumber("Mesh.MaxNumThreads2D", threads)
+    gmsh.option.setNumber("Mesh.MeshSizeMax", mesh_size if mesh_size else 1e22)
+
+    try:
+        gmsh.open(input_path)
+        gmsh.model.mesh.generate(2)
+        gmsh.write(output_path)
+    finally:
+        gmsh.clear()
+
+def _load_stl_triangles(path):
+    # Binary STL: the memory-mapped triangle buffer; ASCII STL: let Trimesh parse it
+    triangles = mesh_analysis.load_triangles(path)
+    if triangles is None:
+        mesh = trimesh.load(path, file_type='stl')
+        if mesh.is_empty:
+            raise ValueError("Mesh is empty")
+        triangles = mesh.triangles
+    return triangles
+
+def analyze_stl(path: str):
+    """Geometry stats of an STL as returned by /geometry/upload: volume, bounding box,
+    true projected area along the clamp axis and the wall-thickness distribution."""
+    stats = mesh_analysis.stats_from_triangles(_load_stl_triangles(path))
+    if stats is None:
+        raise ValueError("Mesh is empty")
+    return stats
+
+def orient_stl(path: str, top_n: int = 5, tie_bars=None):
+    """Best molding orientations of an STL for /geometry/orient. Nothing is written to disk."""
+    triangles = _load_stl_triangles(path)
+    if len(triangles) == 0:
+        raise ValueError("Mesh is empty")
+    evaluated, current, best = orientation.search_orientations(triangles, top_n=top_n, tie_bars=tie_bars)
+    return {
+        "candidates_evaluated": evaluated,
+        "current": current,
+        "orientations": best
+    }
+
+def build_lods(path: str, out_dir: str, name: str, ratios=lod.LOD_RATIOS):
+    """Writes one LOD buffer per ratio as <out_dir>/<name>_<percent>.bin. Returns their metadata."""
+    vertices, faces = mesh_analysis.weld(_load_stl_triangles(path))
+    os.makedirs(out_dir, exist_ok=True)
+    levels = []
+    for ratio in sorted(ratios):
+        level_vertices, level_faces = lod.decimate(vertices, faces, ratio)
+        buffer = lod.encode(level_vertices, level_faces)
+        final_path = os.path.join(out_dir, f"{name}_{round(ratio * 100)}.bin")
+        tmp_path = static_assets.temp_path(final_path)
+        with open(tmp_path, "wb") as f:
+            f.write(buffer)
+        os.replace(tmp_path, final_path)
+        levels.append({
+            "ratio": ratio,
+            "path": final_path,
+            "triangles": int(len(level_faces)),
+            "size_bytes": len(buffer)
+        })
+    return levels
+
+def fill_stl(path: str, out_dir: str, key: str, transform=None, gates=None, wall_mm=None, resolution=None):
+    """Runs the fill solver on a stored STL (with its part transform) and writes <key>.bin and <key>.json.
+
+    The JSON summary is written last, so its presence means both files are complete.
+    """
+    triangles = _load_stl_triangles(path)
+    if transform is not None:
+        triangles = mesh_analysis.apply_transform(triangles, transform)
+    summary, field, origin, voxel_size = fill_solver.solve(triangles, gates, wall_mm, resolution)
+    os.makedirs(out_dir, exist_ok=True)
+    field_path = os.path.join(out_dir, f"{key}.bin")
+    summary_path = os.path.join(out_dir, f"{key}.json")
+    for final_path, data in ((field_path, fill_solver.encode_field(field, origin, voxel_size)),
+                             (summary_path, json.dumps(summary).encode())):
+        tmp_path = static_assets.temp_path(final_path)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, final_path)
+        if final_path == field_path:
+            # Mostly -1 outside the part: compresses well
+            static_assets.precompress([field_path])
+    return summary
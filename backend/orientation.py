@@ -0,0 +1,164 @@
+import os
+import numpy as np
+from scipy.spatial import ConvexHull
+from scipy.spatial import QhullError
+from backend import mesh_analysis
+from backend.bvh import TriangleBVH
+
+# Auto-orientation search: which way should the part sit in the mold (clamp axis = +Z after rotation)?
+# Every candidate is screened in one batched pass, then a shortlist gets the exact projected
+# area and an undercut estimate.
+ORIENT_DIRECTIONS = int(os.environ.get("ORIENT_DIRECTIONS", "256")) # Clamp directions over a hemisphere
+ORIENT_YAW_STEPS = 6 # In-plane angles tried per direction (0-150 deg); only the tie-bar fit depends on them
+ORIENT_SHORTLIST = 8
+ORIENT_UNDERCUT_RAYS = 4000 # Per shortlisted direction
+ORIENT_RESOLUTION = 256 # Raster cells for the shortlist's exact projected area
+HULL_CHUNK = 1024 # Hull points projected per pass when measuring candidate bounding boxes
+# Score = projected area * (1 + UNDERCUT_PENALTY * undercut fraction): side actions cost more than tonnage
+UNDERCUT_PENALTY = 2.0
+# Faces this close to parallel with the draw direction are walls, not undercuts
+WALL_COSINE = 0.05
+
+def hemisphere_directions(count):
+    """Fibonacci-spiral unit vectors over the z >= 0 hemisphere (d and -d mold the same way)."""
+    i = np.arange(count) + 0.5
+    z = 1.0 - i / count
+    r = np.sqrt(1.0 - z * z)
+    phi = np.pi * (3.0 - np.sqrt(5.0)) * i
+    return np.stack([r * np.cos(phi), r * np.sin(phi), z], axis=1)
+
+def direction_angles(directions):
+    """rotation_x/rotation_y (degrees) that turn each direction onto +Z, in /geometry/transform terms."""
+    dx, dy, dz = directions[:, 0], directions[:, 1], directions[:, 2]
+    rotation_x = np.arctan2(dy, dz)
+    rotation_y = np.arctan2(-dx, np.hypot(dy, dz))
+    return np.degrees(rotation_x), np.degrees(rotation_y)
+
+def _rotations(rotation_x, rotation_y, rotation_z):
+    """Batched mesh_analysis.rotation_matrix: (C, 3, 3) for C angle triples in degrees."""
+    ax, ay, az = (np.radians(a) for a in (rotation_x, rotation_y, rotation_z))
+    zero, one = np.zeros_like(ax), np.ones_like(ax)
+    rx = np.stack([one, zero, zero, zero, np.cos(ax), -np.sin(ax), zero, np.sin(ax), np.cos(ax)], -1).reshape(-1, 3, 3)
+    ry = np.stack([np.cos(ay), zero, np.sin(ay), zero, one, zero, -np.sin(ay), zero, np.cos(ay)], -1).reshape(-1, 3, 3)
+    rz = np.stack([np.cos(az), -np.sin(az), zero, np.sin(az), np.cos(az), zero, zero, zero, one], -1).reshape(-1, 3, 3)
+    return rz @ ry @ rx
+
+def _hull_points(triangles):
+    # Bounding boxes only depend on the convex hull; usually a tiny fraction of the vertices
+    points, _ = mesh_analysis.weld(triangles)
+    try:
+        return points[ConvexHull(points).vertices]
+    except (QhullError, ValueError):
+        # Flat or degenerate part
+        return points
+
+def undercut_fractions(bvh, triangles, cross, doubled_area, directions, rays=ORIENT_UNDERCUT_RAYS, seed=0):
+    """Fraction of surface area (excluding walls) that cannot be pulled straight out along each direction.
+
+    A face is pulled toward whichever mold half it faces; if a ray from it in that direction hits
+    the part, the face is shadowed and would need a side action. All directions' rays go
+    through the BVH as one batch.
+    """
+    rng = np.random.default_rng(seed)
+    diag = float(np.ptp(triangles.reshape(-1, 3), axis=0).max()) * 2.0
+    centroids = triangles.mean(axis=1)
+    origins, pulls, faces, owner = [], [], [], []
+    for k, d in enumerate(directions):
+        cosine = cross @ d / np.where(doubled_area > 0, doubled_area, 1.0)
+        candidates = np.flatnonzero(np.abs(cosine) > WALL_COSINE)
+        if not len(candidates):
+            continue
+        weights = doubled_area[candidates]
+        picked = rng.choice(candidates, size=min(rays, len(candidates)), p=weights / weights.sum())
+        pull = np.sign(cosine[picked])[:, None] * d
+        origins.append(centroids[picked])
+        pulls.append(pull)
+        faces.append(picked)
+        owner.append(np.full(len(picked), k))
+    fractions = np.zeros(len(directions))
+    if not origins:
+        return fractions
+    owner = np.concatenate(owner)
+    _, hit = bvh.intersect(np.concatenate(origins), np.concatenate(pulls), diag, ignore=np.concatenate(faces), rounds=1)
+    blocked = np.bincount(owner, weights=hit >= 0, minlength=len(directions))
+    counted = np.bincount(owner, minlength=len(directions))
+    np.divide(blocked, counted, out=fractions, where=counted > 0)
+    return fractions
+
+def search_orientations(triangles, top_n=5, tie_bars=None, directions=ORIENT_DIRECTIONS, yaw_steps=ORIENT_YAW_STEPS):
+    """Ranks candidate molding orientations. Returns (candidates evaluated, current orientation, top_n best).
+
+    tie_bars is the machine's (x, y) tie-bar spacing in mm; when given, orientations whose
+    footprint fits between the tie bars rank first.
+    """
+    tri = np.asarray(triangles, dtype=np.float64)
+    cross = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    doubled_area = np.linalg.norm(cross, axis=1)
+    volume, _, _ = mesh_analysis.triangle_stats(tri)
+
+    # Candidate clamp directions; the current orientation (+Z) is always candidate 0
+    dirs = np.vstack([[0.0, 0.0, 1.0], hemisphere_directions(directions)])
+    rotation_x, rotation_y = direction_angles(dirs)
+    yaws = np.arange(yaw_steps) * (180.0 / yaw_steps)
+
+    # Screening pass. For a closed mesh, half the sum of |face area vector . d| is the area the
+    # surface shadows along d counting every layer: exact for single-layer silhouettes, an upper bound otherwise.
+    layered_area = np.zeros(len(dirs))
+    for start in range(0, len(cross), mesh_analysis.CHUNK_TRIANGLES):
+        layered_area += np.abs(cross[start:start + mesh_analysis.CHUNK_TRIANGLES] @ dirs.T).sum(axis=0)
+    layered_area /= 4.0 # doubled areas, two surface crossings per layer
+
+    # Bounding boxes of every (direction, yaw) pair: one matmul over the hull points
+    rot = _rotations(np.repeat(rotation_x, yaw_steps), np.repeat(rotation_y, yaw_steps), np.tile(yaws, len(dirs)))
+    axes = rot.reshape(-1, 3).T
+    hi = np.full(axes.shape[1], -np.inf)
+    lo = np.full(axes.shape[1], np.inf)
+    hull = _hull_points(tri)
+    for start in range(0, len(hull), HULL_CHUNK):
+        projected = hull[start:start + HULL_CHUNK] @ axes
+        hi = np.maximum(hi, projected.max(axis=0))
+        lo = np.minimum(lo, projected.min(axis=0))
+    extents = (hi - lo).reshape(len(dirs), yaw_steps, 3)
+
+    if tie_bars:
+        margin = np.minimum(tie_bars[0] - extents[..., 0], tie_bars[1] - extents[..., 1])
+        best_yaw = np.argmax(margin, axis=1)
+    else:
+        margin = None
+        best_yaw = np.argmin(extents[..., 0] * extents[..., 1], axis=1)
+    fits = np.ones(len(dirs), dtype=bool) if margin is None else margin[np.arange(len(dirs)), best_yaw] >= 0
+
+    # Shortlist by the cheap metrics, then refine: exact projected area and undercuts
+    order = np.lexsort((layered_area, ~fits))
+    shortlist = np.unique(np.concatenate([[0], order[:max(ORIENT_SHORTLIST, 2 * top_n)]]))
+    bvh = TriangleBVH(tri)
+    undercut = undercut_fractions(bvh, tri, cross, doubled_area, dirs[shortlist])
+    surface_area = float(doubled_area.sum()) / 2.0
+
+    # Outward normals; for a closed mesh the faces turned toward the moving half cover the whole silhouette
+    outward = cross if volume >= 0 else -cross
+
+    def describe(i, yaw, undercut_fraction):
+        rotation = rot[i * yaw_steps + yaw]
+        front = tri[outward @ dirs[i] > 0]
+        area = mesh_analysis.projected_area(front @ rotation.T, resolution=ORIENT_RESOLUTION)
+        yaw_margin = None if margin is None else float(margin[i, yaw])
+        return {
+            "rotation_x": round(float(rotation_x[i]), 2),
+            "rotation_y": round(float(rotation_y[i]), 2),
+            "rotation_z": round(float(yaws[yaw]), 2),
+            "clamp_axis": [round(float(v), 4) for v in dirs[i]],
+            "projected_area_mm2": area,
+            "bbox": {"x": float(extents[i, yaw, 0]), "y": float(extents[i, yaw, 1]), "z": float(extents[i, yaw, 2])},
+            "tie_bar_fit": yaw_margin is None or yaw_margin >= 0,
+            "tie_bar_margin_mm": yaw_margin,
+            "undercut_fraction": float(undercut_fraction),
+            "undercut_area_mm2": float(undercut_fraction) * surface_area,
+            "score": area * (1.0 + UNDERCUT_PENALTY * float(undercut_fraction)),
+        }
+
+    results = [describe(i, best_yaw[i], undercut[k]) for k, i in enumerate(shortlist)]
+    ranked = sorted(results, key=lambda r: (not r["tie_bar_fit"], r["score"]))
+    # The part as it is now: candidate 0 without any in-plane rotation
+    current = describe(0, 0, undercut[0])
+    return len(dirs) * yaw_steps, current, ranked[:top_n]
@@ -0,0 +1,314 @@
+import numpy as np
+
+# Molding heuristics as array operations: one part against any number of materials (and machines)
+# in a single pass. /simulation/run is the one-material case of the same code.
+# Bump whenever a formula or constant below changes results; it keys the simulation result cache
+SOLVER_VERSION = "3"
+MIN_THICKNESS_MM = 0.5
+DEFAULT_ALPHA = 0.08 # Thermal diffusivity, mm^2/s
+MAX_LT_RATIO = 200 # Generic flow length / thickness limit
+MAX_PRESSURE_MPA = 180
+BASE_PRESSURE_MPA = 40 # Per 100 units of L/t
+VISCOSITY_FACTOR = 1.0 # Placeholder until materials carry a viscosity model
+CAVITY_PRESSURE_RATIO = 0.5
+CLAMP_SAFETY = 1.1
+NEWTONS_PER_TON = 9800
+EJECT_BELOW_MELT_C = 100 # Approximate ejection temperature: this far below the melt
+CYCLE_OVERHEAD_S = 5 # Fill, pack, open/close on top of cooling
+FLOW_SPEED_MM_S = 100
+MIN_FILL_TIME_S = 0.5
+MIN_COOLING_S = 1.0
+
+# Transient cooling across the wall-thickness histogram. With constant properties the slab problem
+# is self-similar in the Fourier number Fo = a t / s^2, so the explicit march runs once per
+# material, in Fo, and every thickness bin's time is Fo_eject * s^2 / a.
+COOLING_NODES = 41 # Across the wall, mold faces included; odd so one node sits on the centreline
+COOLING_STABILITY = 0.4 # Explicit step, dFo / dx^2; the stability limit is 0.5
+COOLING_MAX_FOURIER = 2.0 # The centreline is within 1e-8 of the mold temperature by then
+COOLING_EJECT_MARGIN_C = 5 # A mold at or above the ejection temperature: eject this far above the mold
+COOLING_MIN_AREA_FRACTION = 0.001 # Sparser bins (a few stray rays) are reported but never limit the cycle
+# Only bins up to this share of the area, thinnest first, can limit the cycle: the thickest tail is
+# rays that ran along a wall instead of across it (from edge faces, the whole length of the part)
+COOLING_AREA_PERCENTILE = 0.9
+
+FEASIBLE, BORDERLINE, NOT_RECOMMENDED = "Feasible", "Borderline", "Not Recommended"
+# Index = rank, best first
+FEASIBILITY_LEVELS = (FEASIBLE, BORDERLINE, NOT_RECOMMENDED)
+
+# Material columns and their defaults when a record lacks them
+MATERIAL_COLUMNS = {
+    "melt_temp_c": ("melt_temp_c", 230.0),
+    "mold_temp_c": ("mold_temp_c", 50.0),
+    "density": ("density_g_cm3", 1.0),
+    "shrinkage": ("shrinkage", 0.01),
+    # 0 = unknown: DEFAULT_ALPHA is used for the diffusivity
+    "conductivity": ("thermal_conductivity_w_mk", 0.0),
+    "specific_heat": ("specific_heat_j_kgk", 0.0),
+}
+
+def estimate_thickness(vol, area):
+    """Volume / projected area, at least MIN_THICKNESS_MM; 1mm when the area is zero."""
+    vol, area = np.asarray(vol, dtype=np.float64), np.asarray(area, dtype=np.float64)
+    thickness = np.maximum(vol / np.where(area == 0, 1.0, area), MIN_THICKNESS_MM)
+    return np.where(area == 0, 1.0, thickness)
+
+def nominal_thickness(part):
+    """Median wall thickness from the part's ray-cast thickness map, else the vol/area estimate."""
+    wall = part.get("wall_thickness") or {}
+    if wall.get("median_mm"):
+        return max(float(wall["median_mm"]), MIN_THICKNESS_MM)
+    return float(estimate_thickness(float(part.get("volume", 0)), float(part.get("projected_area", 1))))
+
+def cooling_time(thickness_mm, melt_temp, mold_temp, eject_temp, alpha=DEFAULT_ALPHA):
+    """Slab cooling time to ejection, t = s^2 / (pi^2 a) * ln(4/pi * (Tm - Tw) / (Te - Tw)), at least 1s.
+
+    10s when the ejection and mold temperatures coincide; 1s when the log argument is not positive.
+    """
+    thickness_mm, melt_temp, mold_temp, eject_temp, alpha = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (thickness_mm, melt_temp, mold_temp, eject_temp, alpha)))
+    delta = eject_temp - mold_temp
+    ratio = (4 / np.pi) * (melt_temp - mold_temp) / np.where(delta == 0, 1.0, delta)
+    seconds = np.maximum(thickness_mm ** 2 / (np.pi ** 2 * alpha) * np.log(np.where(ratio > 0, ratio, 1.0)), 1.0)
+    seconds = np.where(ratio <= 0, 1.0, seconds)
+    return np.where(delta == 0, 10.0, seconds)
+
+def thermal_diffusivity(props):
+    """Diffusivity (mm^2/s) from material_arrays(): k / (rho c), DEFAULT_ALPHA where k or c is unknown."""
+    known = (props["conductivity"] > 0) & (props["specific_heat"] > 0) & (props["density"] > 0)
+    # W/(m K) over g/cm^3 * J/(kg K) is 1e-3 m^2/s, i.e. 1e3 mm^2/s
+    alpha = 1e3 * props["conductivity"] / np.where(known, props["density"] * props["specific_heat"], 1.0)
+    return np.where(known, alpha, DEFAULT_ALPHA)
+
+def eject_fourier(theta_eject, nodes=COOLING_NODES):
+    """Fourier number at which a slab's centreline reaches theta_eject, one per entry.
+
+    theta_eject is (ejection - mold) / (melt - mold). The slab starts uniformly at 1 and both faces
+    are held at 0; explicit finite differences march once, down to the lowest target, and every
+    entry's crossing is interpolated within its step. 0 for targets at or above the melt; inf for
+    targets the march never reaches.
+    """
+    theta_eject = np.atleast_1d(np.asarray(theta_eject, dtype=np.float64))
+    fourier = np.where(theta_eject >= 1, 0.0, np.inf)
+    pending = np.flatnonzero((theta_eject < 1) & (theta_eject > 0))
+    if not len(pending):
+        return fourier
+
+    dx = 1.0 / (nodes - 1)
+    step_fo = COOLING_STABILITY * dx * dx
+    centre = nodes // 2
+    temp = np.ones(nodes)
+    temp[0] = temp[-1] = 0.0
+    lowest = theta_eject[pending].min()
+    curve = [1.0]
+    for _ in range(int(COOLING_MAX_FOURIER / step_fo)):
+        temp[1:-1] += COOLING_STABILITY * (temp[:-2] - 2 * temp[1:-1] + temp[2:])
+        curve.append(temp[centre])
+        if temp[centre] <= lowest:
+            break
+    # The centreline only falls, so the curve reversed is increasing
+    curve = np.array(curve)
+    target = theta_eject[pending]
+    reached = target >= curve[-1]
+    fourier[pending[reached]] = np.interp(target[reached], curve[::-1], np.arange(len(curve))[::-1] * step_fo)
+    return fourier
+
+def ejection_theta(melt, mold):
+    """Dimensionless ejection temperature, (ejection - mold) / (melt - mold), per entry.
+
+    Ejection is EJECT_BELOW_MELT_C under the melt, or COOLING_EJECT_MARGIN_C over a mold that is
+    at least that hot; 1 (no cooling needed) when the mold is not below the melt.
+    """
+    eject = np.maximum(melt - EJECT_BELOW_MELT_C, mold + COOLING_EJECT_MARGIN_C)
+    span = melt - mold
+    return np.where(span > 0, (eject - mold) / np.where(span > 0, span, 1.0), 1.0)
+
+def limiting_candidates(fractions):
+    """Bins that may limit the cycle: at least COOLING_MIN_AREA_FRACTION of the surface, starting below
+    COOLING_AREA_PERCENTILE of it."""
+    below = np.concatenate([[0.0], np.cumsum(fractions)[:-1]]) / fractions.sum()
+    return (fractions >= min(COOLING_MIN_AREA_FRACTION, fractions.max())) & (below < COOLING_AREA_PERCENTILE)
+
+def thickness_bins(part):
+    """(bin edges, area fractions, mean wall per bin) of the part's wall-thickness histogram; one bin at
+    the nominal wall without it. Histograms without per-bin means use the bin centres."""
+    histogram = (part.get("wall_thickness") or {}).get("histogram")
+    if histogram and histogram.get("area_fraction"):
+        edges = np.asarray(histogram["bin_edges_mm"], dtype=np.float64)
+        fractions = np.asarray(histogram["area_fraction"], dtype=np.float64)
+        walls = histogram.get("mean_mm")
+        walls = np.asarray(walls, dtype=np.float64) if walls else (edges[:-1] + edges[1:]) / 2
+        return edges, fractions, walls
+    nominal = nominal_thickness(part)
+    return np.array([nominal, nominal]), np.array([1.0]), np.array([nominal])
+
+def cooling_by_thickness(walls, fractions, props):
+    """(materials, bins) seconds for each thickness bin's centreline to reach the ejection temperature.
+
+    Also returns each material's cycle-limiting bin: the slowest of the limiting_candidates().
+    """
+    fourier = eject_fourier(ejection_theta(props["melt_temp_c"], props["mold_temp_c"]))
+    thickness = np.maximum(walls, MIN_THICKNESS_MM)
+    seconds = fourier[:, None] * thickness[None, :] ** 2 / thermal_diffusivity(props)[:, None]
+    seconds = np.maximum(seconds, MIN_COOLING_S)
+    candidate = limiting_candidates(fractions)
+    limiting = np.argmax(np.where(candidate[None, :], seconds, -np.inf), axis=1)
+    return seconds, limiting
+
+def material_arrays(materials):
+    """Column arrays (melt_temp_c, mold_temp_c, density, shrinkage) over a list of material records."""
+    return {
+        name: np.array([float(m.get(column) if m.get(column) is not None else default) for m in materials])
+        for name, (column, default) in MATERIAL_COLUMNS.items()
+    }
+
+def part_inputs(part):
+    """The geometry inputs of the heuristics from a parts record."""
+    bbox = np.array([float(part.get(f"bbox_{axis}", 0)) for axis in "xyz"])
+    return {
+        "volume_mm3": float(part.get("volume", 0)),
+        "projected_area_mm2": float(part.get("projected_area", 1)),
+        "bbox": bbox,
+        "thickness_mm": nominal_thickness(part),
+        "thickness_bins": thickness_bins(part),
+        # Flow length: the bbox diagonal
+        "flow_length_mm": float(np.sqrt((bbox ** 2).sum())),
+    }
+
+def evaluate(part, materials):
+    """Runs every heuristic for one part across all materials. Returns arrays of len(materials)."""
+    geometry = part_inputs(part)
+    props = material_arrays(materials)
+    n = len(materials)
+    thickness = np.full(n, geometry["thickness_mm"])
+
+    lt_ratio = geometry["flow_length_mm"] / thickness
+    pressure = BASE_PRESSURE_MPA * VISCOSITY_FACTOR * (lt_ratio / 100)
+    clamp_force_n = geometry["projected_area_mm2"] * pressure * CAVITY_PRESSURE_RATIO
+    clamp_tonnage = clamp_force_n / NEWTONS_PER_TON * CLAMP_SAFETY
+
+    edges, fractions, walls = geometry["thickness_bins"]
+    cooling_bins, limiting = cooling_by_thickness(walls, fractions, props)
+    cooling = cooling_bins[np.arange(n), limiting]
+    short_shot_risk = lt_ratio > MAX_LT_RATIO
+    high_pressure = pressure > MAX_PRESSURE_MPA
+    # A pressure problem is reported over a flow-length one, as /simulation/run always has
+    feasibility = np.where(high_pressure, 1, np.where(short_shot_risk, 2, 0))
+
+    return {
+        "thickness_mm": thickness,
+        "lt_ratio": lt_ratio,
+        "fill_time_s": np.full(n, max(MIN_FILL_TIME_S, geometry["flow_length_mm"] / FLOW_SPEED_MM_S)),
+        "injection_pressure_mpa": pressure,
+        "clamp_tonnage_tons": clamp_tonnage,
+        "cooling_time_s": cooling,
+        "cooling_bins_s": cooling_bins,
+        "cooling_limiting_bin": limiting,
+        "thickness_bin_edges_mm": edges,
+        "thickness_bin_fraction": fractions,
+        "mold_too_hot": props["mold_temp_c"] + COOLING_EJECT_MARGIN_C > props["melt_temp_c"] - EJECT_BELOW_MELT_C,
+        "cycle_time_s": cooling + CYCLE_OVERHEAD_S,
+        "shot_volume_cm3": np.full(n, geometry["volume_mm3"] / 1000),
+        "shot_weight_g": geometry["volume_mm3"] / 1000 * props["density"],
+        "shrinkage": props["shrinkage"],
+        "short_shot_risk": short_shot_risk,
+        "high_pressure": high_pressure,
+        "feasibility": feasibility,
+    }
+
+def evaluate_process(geometry, props, cases, tonnage_limit=None):
+    """Heuristics across process settings for one part and material.
+
+    geometry is part_inputs() and props material_arrays() of the one material; cases holds
+    equal-length arrays of melt_temp_c, mold_temp_c, thickness_scale (on every wall) and gate_count
+    (each gate fills an equal share of the flow length). Cooling is evaluate()'s: the slowest
+    limiting bin of the scaled thickness histogram. A case is feasible when it has no short-shot
+    risk, stays within MAX_PRESSURE_MPA and, given a limit, fits its tonnage.
+    """
+    melt, mold = np.asarray(cases["melt_temp_c"], dtype=np.float64), np.asarray(cases["mold_temp_c"], dtype=np.float64)
+    scale = np.asarray(cases["thickness_scale"], dtype=np.float64)
+    gates = np.maximum(np.asarray(cases["gate_count"], dtype=np.float64), 1.0)
+
+    thickness = np.maximum(geometry["thickness_mm"] * scale, MIN_THICKNESS_MM)
+    flow_length = geometry["flow_length_mm"] / gates
+    lt_ratio = flow_length / thickness
+    pressure = BASE_PRESSURE_MPA * VISCOSITY_FACTOR * (lt_ratio / 100)
+    clamp_tonnage = geometry["projected_area_mm2"] * pressure * CAVITY_PRESSURE_RATIO / NEWTONS_PER_TON * CLAMP_SAFETY
+    # Scaling every wall keeps their order, so the limiting bin is the same in every case
+    _, fractions, walls = geometry["thickness_bins"]
+    limiting_wall = walls[np.argmax(np.where(limiting_candidates(fractions), walls, -np.inf))]
+    wall = np.maximum(limiting_wall * scale, MIN_THICKNESS_MM)
+    cooling = np.maximum(eject_fourier(ejection_theta(melt, mold)) * wall ** 2 / thermal_diffusivity(props)[0], MIN_COOLING_S)
+
+    short_shot_risk = lt_ratio > MAX_LT_RATIO
+    high_pressure = pressure > MAX_PRESSURE_MPA
+    over_tonnage = clamp_tonnage > tonnage_limit if tonnage_limit else np.zeros(len(melt), dtype=bool)
+    return {
+        "lt_ratio": lt_ratio,
+        "fill_time_s": np.maximum(MIN_FILL_TIME_S, flow_length / FLOW_SPEED_MM_S),
+        "injection_pressure_mpa": pressure,
+        "clamp_tonnage_tons": clamp_tonnage,
+        "cooling_time_s": cooling,
+        "cycle_time_s": cooling + CYCLE_OVERHEAD_S,
+        # Wall thickness scales the volume roughly in proportion
+        "shot_weight_g": geometry["volume_mm3"] * scale / 1000 * props["density"][0],
+        "short_shot_risk": short_shot_risk,
+        "high_pressure": high_pressure,
+        "over_tonnage": over_tonnage,
+        "feasible": ~(short_shot_risk | high_pressure | over_tonnage),
+    }
+
+def tie_bar_clearance(bbox, tie_x, tie_y):
+    """Whether the part passes between the tie bars, in either in-plane orientation."""
+    return ((bbox[0] <= tie_x) & (bbox[1] <= tie_y)) | ((bbox[1] <= tie_x) & (bbox[0] <= tie_y))
+
+def machine_fit(results, part, machines):
+    """(materials, machines) boolean arrays: clamp tonnage, shot volume and tie-bar clearance each suffice."""
+    bbox = part_inputs(part)["bbox"]
+    tonnage = np.array([float(m.get("clamp_tonnage", 0)) for m in machines])
+    shot = np.array([float(m.get("max_shot_volume", 0)) for m in machines])
+    tie_x = np.array([float(m.get("tie_bar_spacing_x", 0)) for m in machines])
+    tie_y = np.array([float(m.get("tie_bar_spacing_y", 0)) for m in machines])
+    clears = tie_bar_clearance(bbox, tie_x, tie_y)
+    return {
+        "tonnage_ok": results["clamp_tonnage_tons"][:, None] <= tonnage[None, :],
+        "shot_volume_ok": results["shot_volume_cm3"][:, None] <= shot[None, :],
+        "tie_bar_ok": np.broadcast_to(clears[None, :], (len(results["cycle_time_s"]), len(machines))),
+    }
+
+def summarize(results, i):
+    """The /simulation/run result for material i of an evaluate() run."""
+    warnings = []
+    if results["short_shot_risk"][i]:
+        warnings.append(f"High Flow/Thickness ratio ({results['lt_ratio'][i]:.1f}). Risk of short shot.")
+    if results["high_pressure"][i]:
+        warnings.append("High injection pressure required.")
+    if results["mold_too_hot"][i]:
+        warnings.append(f"Mold temperature is within {COOLING_EJECT_MARGIN_C}°C of the ejection temperature; cooling time assumes ejection {COOLING_EJECT_MARGIN_C}°C above the mold.")
+    edges, fractions = results["thickness_bin_edges_mm"], results["thickness_bin_fraction"]
+    bins = [
+        {
+            "thickness_min_mm": round(float(edges[b]), 3),
+            "thickness_max_mm": round(float(edges[b + 1]), 3),
+            "area_fraction": round(float(fractions[b]), 4),
+            "cooling_time_s": round(float(results["cooling_bins_s"][i, b]), 1),
+        }
+        for b in range(len(fractions)) if fractions[b] > 0
+    ]
+    limiting = int(results["cooling_limiting_bin"][i])
+    return {
+        "fill_time_s": round(float(results["fill_time_s"][i]), 2),
+        "injection_pressure_mpa": round(float(results["injection_pressure_mpa"][i]), 1),
+        "clamp_tonnage_tons": round(float(results["clamp_tonnage_tons"][i]), 1),
+        "cooling_time_s": round(float(results["cooling_time_s"][i]), 1),
+        "cycle_time_s": round(float(results["cycle_time_s"][i]), 1),
+        "shot_weight_g": round(float(results["shot_weight_g"][i]), 1),
+        "feasibility": FEASIBILITY_LEVELS[int(results["feasibility"][i])],
+        "warnings": warnings,
+        "recommendations": [f"Expected shrinkage: ~{results['shrinkage'][i]*100:.1f}%"],
+        "cooling_limiting_region": {
+            "thickness_min_mm": round(float(edges[limiting]), 3),
+            "thickness_max_mm": round(float(edges[limiting + 1]), 3),
+            "area_fraction": round(float(fractions[limiting]), 4),
+        },
+        "cooling_by_thickness": bins
+    }
@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from backend import physics
+
+# Memoized /simulation/run results. The key hashes everything the heuristics read (the part's
+# geometry inputs, the material's properties) plus physics.SOLVER_VERSION, so a changed part,
+# material or solver misses on its own; invalidate() just drops entries that can no longer hit.
+# Results carry the auto-selected machines too, so the machine catalog's version is in the key.
+SIMULATION_CACHE_SIZE = int(os.environ.get("SIMULATION_CACHE_SIZE", "1024"))
+
+_entries = OrderedDict() # key -> {"result", "part_id", "material_id", "saved_for"}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def cache_key(part, material, catalog_version=None):
+    geometry = physics.part_inputs(part)
+    props = physics.material_arrays([material])
+    payload = {
+        "solver": physics.SOLVER_VERSION,
+        "machines": catalog_version,
+        "volume_mm3": geometry["volume_mm3"],
+        "projected_area_mm2": geometry["projected_area_mm2"],
+        "bbox": geometry["bbox"].tolist(),
+        "thickness_mm": geometry["thickness_mm"],
+        # Cooling is limited by the histogram, not just the nominal wall
+        "thickness_bins": [values.tolist() for values in geometry["thickness_bins"]],
+        "material": {name: float(values[0]) for name, values in props.items()},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def get(key):
+    """The cached entry for a key (marked most recently used), or None."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry
+
+def put(key, result, part_id, material_id, project_id=None):
+    """Caches a result; project_id marks it as already saved as that project's latest simulation."""
+    with _lock:
+        _entries[key] = {
+            "result": result,
+            "part_id": part_id,
+            "material_id": material_id,
+            "saved_for": {project_id} if project_id else set(),
+        }
+        _entries.move_to_end(key)
+        while len(_entries) > SIMULATION_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+def mark_saved(entry, project_id):
+    with _lock:
+        entry["saved_for"].add(project_id)
+
+def forget_project(project_id):
+    """Another simulation record became the project's latest; its next cached run must write again."""
+    with _lock:
+        for entry in _entries.values():
+            entry["saved_for"].discard(project_id)
+
+def invalidate(part_id=None, material_id=None):
+    """Drops entries computed for a part or material that has been updated."""
+    with _lock:
+        stale = [
+            key for key, entry in _entries.items()
+            if (part_id and entry["part_id"] == part_id) or (material_id and entry["material_id"] == material_id)
+        ]
+        for key in stale:
+            del _entries[key]
+        _stats["invalidations"] += len(stale)
+        return len(stale)
+
+def stats():
+    with _lock:
+        return {**_stats, "entries": len(_entries), "capacity": SIMULATION_CACHE_SIZE}
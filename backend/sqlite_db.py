@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import uuid
+import queue
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+
+from backend.database import MockResponse, INDEXED_COLUMNS, DEFAULT_INDEXED_COLUMNS, CASCADES, seed_materials
+
+# SQLite document store. Each table holds one JSON document per row; indexed columns
+# get expression indexes so eq() lookups are B-tree seeks instead of scans.
+SQLITE_DB_FILE = os.environ.get("SQLITE_DB_FILE", os.path.join(os.path.dirname(__file__), "store.db"))
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def _identifier(name):
+    # Table and column names are interpolated into SQL, so only plain identifiers are accepted
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return name
+
+def _value_expr(column):
+    if column in ("id", "created_at"):
+        return column
+    return f"json_extract(doc, '$.{_identifier(column)}')"
+
+def _column_expr(column):
+    if column == "id":
+        return "id"
+    # Compare as text to match the str() semantics of the mock client
+    return f"CAST({_value_expr(column)} AS TEXT)"
+
+class SQLiteClient:
+    def __init__(self, path=SQLITE_DB_FILE, pool_size=SQLITE_POOL_SIZE):
+        self.path = path
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        # SQLite allows one writer at a time; serializing here avoids busy retries
+        self._write_lock = threading.Lock()
+        self._tables = set()
+        self._tables_lock = threading.Lock()
+
+        with self._connection() as conn:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+            self._tables.update(r[0] for r in rows)
+
+        if not self.table("materials").select("id").limit(1).execute().data:
+            print("[SQLITE DB] Seeding materials...")
+            with self.transaction() as conn:
+                self._ensure_table(conn, "materials")
+                self._insert_rows(conn, "materials", seed_materials())
+
+        count = self._count("materials")
+        print(f"[SQLITE DB] Opened {self.path} (WAL). Materials: {count}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Yields a pooled connection inside BEGIN IMMEDIATE; commits on success, rolls back on error."""
+        with self._write_lock, self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _ensure_table(self, conn, table):
+        if table in self._tables:
+            return
+        with self._tables_lock:
+            name = _identifier(table)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (id TEXT PRIMARY KEY, created_at TEXT, doc TEXT NOT NULL)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{name}_created_at" ON "{name}" (created_at)')
+            for col in INDEXED_COLUMNS.get(table, DEFAULT_INDEXED_COLUMNS):
+                if col != "id":
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{name}_{col}" ON "{name}" ({_column_expr(col)})')
+            self._tables.add(table)
+
+    def _insert_rows(self, conn, table, records):
+        conn.executemany(
+            f'INSERT INTO "{_identifier(table)}" (id, created_at, doc) VALUES (?, ?, ?)',
+            [(str(r["id"]), r.get("created_at"), json.dumps(r, default=str)) for r in records],
+        )
+
+    def _delete_cascade(self, conn, table, ids):
+        for child, foreign_key in CASCADES.get(table, ()):
+            if child not in self._tables:
+                continue
+            for row_id in ids:
+                child_ids = [r[0] for r in conn.execute(
+                    f'SELECT id FROM "{_identifier(child)}" WHERE {_column_expr(foreign_key)} = ?', (row_id,)
+                )]
+                if child_ids:
+                    self._delete_cascade(conn, child, child_ids)
+                    conn.executemany(f'DELETE FROM "{_identifier(child)}" WHERE id = ?', [(i,) for i in child_ids])
+
+    def _count(self, table):
+        if table not in self._tables:
+            return 0
+        with self._connection() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM "{_identifier(table)}"').fetchone()[0]
+
+    def table(self, table_name):
+        return SQLiteTableQuery(self, table_name)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get().close()
+
+class SQLiteTableQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.filters = []
+        self.columns = None
+        self.order_by = None
+        self.offset_val = 0
+        self.limit_val = None
+        self.pending_insert = None
+        self.pending_update = None
+        self.pending_delete = False
+
+    def select(self, columns="*"):
+        if columns.strip() != "*":
+            self.columns = [c.strip() for c in columns.split(",") if c.strip()]
+        return self
+
+    def insert(self, record):
+        # A list inserts every record in one transaction
+        self.pending_insert = record
+        return self
+
+    def update(self, values):
+        self.pending_update = values
+        return self
+
+    def delete(self):
+        self.pending_delete = True
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def limit(self, count):
+        self.limit_val = count
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def range(self, start, end):
+        # Supabase semantics: both bounds inclusive
+        self.offset_val = start
+        self.limit_val = max(end - start + 1, 0)
+        return self
+
+    def _where(self):
+        if not self.filters:
+            return "", []
+        clause = " WHERE " + " AND ".join(f"{_column_expr(col)} = ?" for col, _ in self.filters)
+        return clause, [str(val) for _, val in self.filters]
+
+    def execute(self):
+        # Handle Insert
+        if self.pending_insert is not None:
+            records = self.pending_insert if isinstance(self.pending_insert, list) else [self.pending_insert]
+            now = datetime.datetime.now().isoformat()
+            for record in records:
+                if not record.get("id"):
+                    record["id"] = str(uuid.uuid4())
+                record["created_at"] = now
+
+            with self.client.transaction() as conn:
+                self.client._ensure_table(conn, self.table)
+                self.client._insert_rows(conn, self.table, records)
+            return MockResponse(records)
+
+        if (self.pending_update is not None or self.pending_delete) and not self.filters:
+            raise ValueError("update() and delete() require at least one eq() filter")
+        if self.pending_update is not None and "id" in self.pending_update:
+            # The id column is the row's key; the doc must not drift from it
+            raise ValueError("update() cannot change a row's id")
+        if self.table not in self.client._tables:
+            return MockResponse([])
+
+        name = _identifier(self.table)
+        where, params = self._where()
+
+        # Handle Update
+        if self.pending_update is not None:
+            with self.client.transaction() as conn:
+                rows = [{**json.loads(r[0]), **self.pending_update} for r in conn.execute(f'SELECT doc FROM "{name}"{where}', params)]
+                conn.executemany(
+                    f'UPDATE "{name}" SET doc = ? WHERE id = ?',
+                    [(json.dumps(r, default=str), str(r["id"])) for r in rows],
+                )
+            return MockResponse(rows)
+
+        # Handle Delete
+        if self.pending_delete:
+            with self.client.transaction() as conn:
+                rows = [json.loads(r[0]) for r in conn.execute(f'SELECT doc FROM "{name}"{where}', params)]
+                ids = [str(r["id"]) for r in rows]
+                self.client._delete_cascade(conn, self.table, ids)
+                conn.executemany(f'DELETE FROM "{name}" WHERE id = ?', [(i,) for i in ids])
+            return MockResponse(rows)
+
+        # Handle Select
+        sql = f'SELECT doc FROM "{name}"{where} ORDER BY '
+        if self.order_by:
+            col, desc = self.order_by
+            # Nulls last ascending, first descending (as in Postgres)
+            expr = _value_expr(col)
+            direction = " DESC" if desc else ""
+            sql += f"({expr} IS NULL){direction}, {expr}{direction}, rowid{direction}"
+        else:
+            sql += "rowid"
+        if self.limit_val or self.offset_val:
+            sql += " LIMIT ? OFFSET ?"
+            params += [self.limit_val if self.limit_val else -1, self.offset_val]
+
+        with self.client._connection() as conn:
+            rows = [json.loads(r[0]) for r in conn.execute(sql, params)]
+        if self.columns:
+            rows = [{c: r[c] for c in self.columns if c in r} for r in rows]
+        return MockResponse(rows)
@@ -0,0 +1,146 @@
+import os
+import re
+import gzip
+import uuid
+import shutil
+import hashlib
+import logging
+import functools
+import mimetypes
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    # Optional: without it only gzip variants are generated and served
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Geometry assets under static/ are served with strong ETags, long-lived cache headers for
+# content-addressed names, precompressed .gz/.br siblings written at upload time, and ranges.
+STATIC_DIR = "static"
+GZIP_LEVEL = 6
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+# Below this size compression is not worth a second request-path branch
+PRECOMPRESS_MIN_BYTES = 1024
+# A variant is kept only if it saves at least this fraction of the original
+PRECOMPRESS_MIN_SAVING = 0.05
+# Preferred first when the client accepts both
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+COPY_BUFFER = 1024 * 1024
+
+# Names carrying a SHA-256 (geometry/<key>.stl, geometry/lod/<key>_5.bin, transformed/<key>.stl)
+# never change content, so browsers may cache them forever
+CONTENT_KEY = re.compile(r"(?:^|/)([0-9a-f]{64})(?:_\d+)?\.[^/]+$")
+
+mimetypes.add_type("model/stl", ".stl")
+
+def resolve(path, root=None):
+    """Absolute path of a file under static/ (or root), or None if missing or outside the directory."""
+    root = os.path.realpath(STATIC_DIR if root is None else root)
+    full = os.path.realpath(os.path.join(root, path))
+    if not full.startswith(root + os.sep) or not os.path.isfile(full):
+        return None
+    return full
+
+def is_immutable(path):
+    return CONTENT_KEY.search(path.replace(os.sep, "/")) is not None
+
+@functools.lru_cache(maxsize=1024)
+def _file_digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(COPY_BUFFER)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+def content_hash(path):
+    """Hex content identity of a static file: from its name if content-addressed, else a SHA-256 of its bytes."""
+    if is_immutable(path):
+        # The name pins the content; hash it rather than the bytes (LOD levels share one key)
+        return hashlib.sha256(os.path.basename(path).encode()).hexdigest()[:32]
+    st = os.stat(path)
+    return _file_digest(path, st.st_mtime_ns, st.st_size)[:32]
+
+def accepted_encodings(header):
+    """Encodings with q > 0 in an Accept-Encoding header."""
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token and q > 0:
+            accepted.add(token.strip().lower())
+    return accepted
+
+def negotiate(path, accept_encoding):
+    """(path to send, content encoding or None) for the best precompressed variant the client accepts."""
+    accepted = accepted_encodings(accept_encoding or "")
+    for encoding, suffix in ENCODINGS:
+        variant = path + suffix
+        if (encoding in accepted or "*" in accepted) and os.path.exists(variant):
+            return variant, encoding
+    return path, None
+
+def has_variants(path):
+    return any(os.path.exists(path + suffix) for _, suffix in ENCODINGS)
+
+def temp_path(final_path):
+    """Where to write final_path before renaming it into place: unique to this writer, so concurrent
+    writers of the same file never share one (threads of a process share its pid)."""
+    return f"{final_path}.{uuid.uuid4().hex}.tmp"
+
+def _write_variant(path, suffix, compress):
+    final_path = path + suffix
+    tmp_path = temp_path(final_path)
+    try:
+        with open(path, "rb") as src, open(tmp_path, "wb") as out:
+            compress(src, out)
+        if os.path.getsize(tmp_path) > os.path.getsize(path) * (1 - PRECOMPRESS_MIN_SAVING):
+            # Incompressible; serving the original is just as good
+            return None
+        os.replace(tmp_path, final_path)
+        return final_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _gzip(src, out):
+    # mtime=0 keeps the output byte-identical for identical input
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as gz:
+        shutil.copyfileobj(src, gz, COPY_BUFFER)
+
+def _brotli(src, out):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    while True:
+        block = src.read(COPY_BUFFER)
+        if not block:
+            break
+        out.write(compressor.process(block))
+    out.write(compressor.finish())
+
+def precompress(paths):
+    """Writes .gz (and .br when brotli is installed) siblings for each file. Returns the variants written."""
+    written = []
+    for path in paths:
+        if not os.path.exists(path) or os.path.getsize(path) < PRECOMPRESS_MIN_BYTES:
+            continue
+        variant = _write_variant(path, ".gz", _gzip)
+        if variant:
+            written.append(variant)
+        if BROTLI_AVAILABLE:
+            variant = _write_variant(path, ".br", _brotli)
+            if variant:
+                written.append(variant)
+    return written
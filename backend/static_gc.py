@@ -0,0 +1,183 @@
+import os
+import re
+import time
+import logging
+import threading
+from backend import geometry_store
+
+logger = logging.getLogger(__name__)
+
+# Garbage collection for static/. Files are grouped (a blob with its LODs and .gz/.br variants,
+# a materialized transform with its variants, a fill-solver result, a legacy file) and a group is live while a
+# parts record points at it. Everything else is evictable: it expires after a TTL, and when
+# static/ is over quota the least recently used evictable groups go first. Evicting a base mesh
+# drops the transform records built on it.
+STATIC_QUOTA_MB = int(os.environ.get("STATIC_QUOTA_MB", "2048"))
+STATIC_GC_INTERVAL_S = float(os.environ.get("STATIC_GC_INTERVAL_S", "600"))
+# Nothing touched this recently is evicted: covers uploads between storing a blob and linking its part
+STATIC_GC_GRACE_S = float(os.environ.get("STATIC_GC_GRACE_S", "600"))
+STATIC_GC_UNREFERENCED_TTL_S = float(os.environ.get("STATIC_GC_UNREFERENCED_TTL_H", "72")) * 3600
+VARIANT_SUFFIXES = (".gz", ".br")
+
+KEY = r"[0-9a-f]{64}"
+BLOB_FILE = re.compile(rf"^{geometry_store.GEOMETRY_SUBDIR}/({KEY})\.stl$")
+LOD_FILE = re.compile(rf"^{geometry_store.GEOMETRY_SUBDIR}/{geometry_store.LOD_SUBDIR}/({KEY})_\d+\.bin$")
+TMP_FILE = re.compile(r"\.[0-9a-f]+\.tmp$") # static_assets.temp_path(), or a pid from older versions
+
+_last_access = {}
+_access_lock = threading.Lock()
+_run_lock = threading.Lock()
+_totals = {"runs": 0, "evicted_files": 0, "reclaimed_bytes": 0, "last_run": None}
+
+def group_of(relpath):
+    """(kind, key) of the eviction group a static file belongs to; key is the group's main file."""
+    relpath = relpath.replace(os.sep, "/")
+    for suffix in VARIANT_SUFFIXES:
+        if relpath.endswith(suffix):
+            relpath = relpath[:-len(suffix)]
+            break
+    match = BLOB_FILE.match(relpath) or LOD_FILE.match(relpath)
+    if match:
+        return "blob", geometry_store.blob_filename(match.group(1))
+    if relpath.startswith(f"{geometry_store.DERIVED_SUBDIR}/"):
+        return "transform", relpath
+    if relpath.startswith(f"{geometry_store.FILL_SUBDIR}/"):
+        # Field and summary go together
+        return "fill", os.path.splitext(relpath)[0]
+    return "file", relpath
+
+def touch(relpath):
+    """Records a read of a static file; LRU eviction ranks groups by their latest read."""
+    _, key = group_of(relpath)
+    with _access_lock:
+        _last_access[key] = time.time()
+
+def _scan():
+    groups = {}
+    temp_files = []
+    for dirpath, _, filenames in os.walk(geometry_store.STATIC_DIR):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if TMP_FILE.search(name):
+                temp_files.append((path, st))
+                continue
+            kind, key = group_of(os.path.relpath(path, geometry_store.STATIC_DIR))
+            group = groups.setdefault(key, {"kind": kind, "files": [], "size": 0, "last_used": 0.0})
+            group["files"].append(path)
+            group["size"] += st.st_size
+            group["last_used"] = max(group["last_used"], st.st_mtime)
+    with _access_lock:
+        for key, group in groups.items():
+            group["last_used"] = max(group["last_used"], _last_access.get(key, 0.0))
+    return groups, temp_files
+
+def _referenced(db):
+    res = db.table("parts").select("file_url").execute()
+    return {geometry_store.static_filename(row["file_url"]) for row in res.data if row.get("file_url")}
+
+def _evict(db, key, group):
+    removed = 0
+    for path in group["files"]:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    if group["kind"] == "blob":
+        # Its analysis is useless without the file; the next upload of these bytes starts over
+        digest = os.path.basename(key)[:-len(".stl")]
+        db.table(geometry_store.GEOMETRY_TABLE).delete().eq("id", digest).execute()
+    if group["kind"] in ("blob", "file"):
+        # Transforms of it can no longer be materialized; their urls 404 from now on
+        db.table(geometry_store.TRANSFORMS_TABLE).delete().eq("base_filename", key).execute()
+    with _access_lock:
+        _last_access.pop(key, None)
+    return removed
+
+def collect(db, quota_bytes=None):
+    """One collection pass over static/. Returns what it found and what it reclaimed."""
+    quota_bytes = STATIC_QUOTA_MB * 1024 * 1024 if quota_bytes is None else quota_bytes
+    with _run_lock:
+        started = time.monotonic()
+        now = time.time()
+        groups, temp_files = _scan()
+        referenced = _referenced(db)
+
+        evicted_files = 0
+        reclaimed = 0
+        # Leftovers of interrupted writes
+        for path, st in temp_files:
+            if now - st.st_mtime > STATIC_GC_GRACE_S:
+                try:
+                    os.remove(path)
+                    evicted_files += 1
+                    reclaimed += st.st_size
+                except FileNotFoundError:
+                    pass
+
+        total = sum(group["size"] for group in groups.values())
+        referenced_bytes = sum(group["size"] for key, group in groups.items() if key in referenced)
+        evictable = sorted(
+            ((group["last_used"], key) for key, group in groups.items()
+             if key not in referenced and now - group["last_used"] > STATIC_GC_GRACE_S),
+        )
+
+        # Oldest first: expired groups always go, then more until static/ is under quota
+        for last_used, key in evictable:
+            expired = now - last_used > STATIC_GC_UNREFERENCED_TTL_S
+            if not expired and total <= quota_bytes:
+                break
+            group = groups[key]
+            evicted_files += _evict(db, key, group)
+            total -= group["size"]
+            reclaimed += group["size"]
+
+        stats = {
+            "total_bytes": total,
+            "referenced_bytes": referenced_bytes,
+            "quota_bytes": quota_bytes,
+            "groups": len(groups),
+            "referenced_groups": len(referenced & groups.keys()),
+            "evicted_files": evicted_files,
+            "reclaimed_bytes": reclaimed,
+            "duration_s": round(time.monotonic() - started, 3),
+        }
+        _totals["runs"] += 1
+        _totals["evicted_files"] += evicted_files
+        _totals["reclaimed_bytes"] += reclaimed
+        _totals["last_run"] = {"at": now, **stats}
+    if evicted_files:
+        logger.info(f"Static GC reclaimed {reclaimed / 1024 / 1024:.1f}MB in {evicted_files} files")
+    return stats
+
+def totals():
+    """Cumulative collector stats since the process started."""
+    return dict(_totals)
+
+class StaticCollector:
+    """Runs collect() every STATIC_GC_INTERVAL_S on a daemon thread."""
+
+    def __init__(self, get_db, interval_s=STATIC_GC_INTERVAL_S):
+        self._get_db = get_db
+        self._interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="static-gc", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self._interval_s):
+            try:
+                collect(self._get_db())
+            except Exception as e:
+                logger.error(f"Static GC failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
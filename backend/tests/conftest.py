@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+import tempfile
+
+# Tests run against a throwaway mock DB, static/ and uploads/: configured before backend is imported
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+WORK_DIR = tempfile.mkdtemp(prefix="moldflow-tests-")
+os.environ["MOCK_DB_DIR"] = WORK_DIR
+os.environ["UPLOAD_DIR"] = os.path.join(WORK_DIR, "uploads")
+
+import pytest
+
+from backend import database
+from backend import mesh_analysis
+
+@pytest.fixture(scope="session", autouse=True)
+def work_dir():
+    # static/ is relative to the working directory
+    previous = os.getcwd()
+    os.chdir(WORK_DIR)
+    yield WORK_DIR
+    os.chdir(previous)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+@pytest.fixture
+def mock_db(tmp_path, monkeypatch):
+    """Factory for MockSupabaseClients on files in tmp_path; calling it again reopens the same files."""
+    monkeypatch.setattr(database, "MOCK_DB_SNAPSHOT", str(tmp_path / "mock_db.snapshot"))
+    monkeypatch.setattr(database, "MOCK_DB_FILE", str(tmp_path / "mock_db.json"))
+    monkeypatch.setattr(database, "MOCK_DB_JOURNAL", str(tmp_path / "mock_db.journal"))
+    clients = []
+
+    def open_client():
+        client = database.MockSupabaseClient()
+        clients.append(client)
+        return client
+
+    yield open_client
+    for client in clients:
+        if not client._stop.is_set():
+            client.close()
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def write_stl(tmp_path):
+    def write(triangles, name="part.stl"):
+        path = str(tmp_path / name)
+        mesh_analysis.write_binary_stl(path, triangles)
+        return path
+    return write
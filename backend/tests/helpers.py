@@ -0,0 +1,33 @@
+import os
+import numpy as np
+import trimesh
+
+def box_triangles(extents, hollow_wall=None, open_top=False):
+    """Triangles of a box centred on the origin; a closed shell of that wall when hollow_wall is given."""
+    outer = trimesh.creation.box(extents=extents)
+    triangles = outer.triangles
+    if open_top:
+        triangles = triangles[outer.triangles_center[:, 2] < extents[2] / 2 - 1e-6]
+    if hollow_wall:
+        inner = trimesh.creation.box(extents=[e - 2 * hollow_wall for e in extents])
+        inner.invert()
+        triangles = np.concatenate([triangles, inner.triangles])
+    return np.asarray(triangles, dtype=np.float32)
+
+def upload_part(client, path, name="Test project"):
+    """Creates a project and uploads an STL into it. Returns (project id, upload response)."""
+    project_id = client.post("/projects/", json={"name": name}).json()["id"]
+    with open(path, "rb") as f:
+        response = client.post("/geometry/upload", files={"file": (os.path.basename(path), f)}, data={"project_id": project_id})
+    assert response.status_code == 200, response.text
+    return project_id, response.json()
+
+def stop_without_compacting(client):
+    """Stops a client's background threads the way a crash would: the journal is left as is."""
+    with client._commit_cond:
+        client._stop.set()
+        client._commit_cond.notify_all()
+    client._writer.join()
+    client._maintenance.join()
+    client._journal.close()
+    client._close_snapshot()
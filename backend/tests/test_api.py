@@ -0,0 +1,174 @@
+import os
+import time
+import pytest
+from backend import geometry_store
+from backend import physics
+from backend import static_assets
+from helpers import box_triangles, upload_part
+
+def test_health(client):
+    assert client.get("/health").json() == {"status": "ok"}
+
+def test_materials_are_seeded(client):
+    materials = client.get("/materials/").json()
+    assert len(materials) == 18
+    assert all(m["melt_temp_c"] > m["mold_temp_c"] for m in materials)
+
+def test_upload_analyzes_part(client, write_stl):
+    project_id, upload = upload_part(client, write_stl(box_triangles((10, 20, 30))))
+    stats = upload["stats"]
+    assert abs(stats["volume_mm3"] - 6000) < 1e-3
+    project = client.get(f"/projects/{project_id}").json()
+    assert project["parts"][0]["id"] == upload["part_id"]
+
+def test_background_simulation_matches_inline(client, write_stl):
+    project_id, _ = upload_part(client, write_stl(box_triangles((40, 30, 20), hollow_wall=2)))
+    material_id = client.get("/materials/").json()[0]["id"]
+    request = {"project_id": project_id, "material_id": material_id}
+    inline = client.post("/simulation/run", json=request)
+    assert inline.status_code == 200, inline.text
+
+    queued = client.post("/simulation/run", json={**request, "background": True})
+    assert queued.status_code == 202, queued.text
+    for _ in range(200):
+        result = client.get(queued.json()["result_url"])
+        if result.status_code != 202:
+            break
+        time.sleep(0.05)
+    assert result.status_code == 200, result.text
+    assert result.json()["cooling_time_s"] == inline.json()["cooling_time_s"]
+
+def test_cached_rerun_is_saved_as_latest(client, write_stl):
+    project_id, _ = upload_part(client, write_stl(box_triangles((50, 40, 10), hollow_wall=2)))
+    first, second = [m["id"] for m in client.get("/materials/").json()[:2]]
+
+    def run(material_id):
+        response = client.post("/simulation/run", json={"project_id": project_id, "material_id": material_id})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    a = run(first)
+    b = run(second)
+    assert a != b
+    # A, B, then A again: a cache hit, but still the project's latest result
+    assert run(first) == a
+    assert client.get(f"/projects/{project_id}").json()["simulation_result"] == a
+
+def test_geometry_filenames_stay_inside_static(client, write_stl):
+    _, upload = upload_part(client, write_stl(box_triangles((60, 40, 10))))
+    oriented = client.post("/geometry/orient", json={"filename": upload["filename"], "top_n": 2})
+    assert oriented.status_code == 200, oriented.text
+    assert len(oriented.json()["orientations"]) == 2
+    transformed = client.post("/geometry/transform", json={"filename": upload["filename"], "rotation_x": 90})
+    assert transformed.status_code == 200, transformed.text
+
+    outside = os.path.relpath(os.path.abspath(__file__), geometry_store.STATIC_DIR)
+    for filename in ("../../../etc/passwd", outside, "/etc/passwd"):
+        assert client.post("/geometry/orient", json={"filename": filename}).status_code == 404
+        assert client.post("/geometry/transform", json={"filename": filename, "rotation_x": 90}).status_code == 404
+
+def add_machine(client, name, tonnage, tie_bars=(500, 500), shot_volume=1000):
+    response = client.post("/machines/", json={
+        "name": name, "clamp_tonnage": tonnage, "max_shot_volume": shot_volume,
+        "tie_bar_spacing_x": tie_bars[0], "tie_bar_spacing_y": tie_bars[1],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_sweep_ranks_every_material_machine_pair(client, write_stl):
+    project_id, _ = upload_part(client, write_stl(box_triangles((60, 40, 10), hollow_wall=2)))
+    material_ids = [m["id"] for m in client.get("/materials/").json()[:2]]
+    machines = {
+        "tiny": add_machine(client, "Sweep tiny", 0.001),
+        "narrow": add_machine(client, "Sweep narrow", 1000, tie_bars=(10, 10)),
+        "big": add_machine(client, "Sweep big", 1000),
+        "huge": add_machine(client, "Sweep huge", 5000),
+    }
+    response = client.post("/simulation/sweep", json={
+        "project_id": project_id, "material_ids": material_ids,
+        "machine_ids": [str(m["id"]) for m in machines.values()], "save": False,
+    })
+    assert response.status_code == 200, response.text
+    sweep = response.json()
+    assert (sweep["materials"], sweep["machines"], sweep["combinations"]) == (2, 4, 8)
+    rows = sweep["rows"]
+    assert [row["rank"] for row in rows] == list(range(1, 9))
+    assert {(row["material_id"], row["machine_id"]) for row in rows} == {(i, m["id"]) for i in material_ids for m in machines.values()}
+
+    # Feasible first, then machines that fit, then shorter cycles, then smaller machines
+    tonnage = {m["id"]: m["clamp_tonnage"] for m in machines.values()}
+    keys = [(physics.FEASIBILITY_LEVELS.index(row["feasibility"]), not row["machine_fit"], row["cycle_time_s"], tonnage[row["machine_id"]]) for row in rows]
+    assert keys == sorted(keys)
+
+    by_machine = {name: [row for row in rows if row["machine_id"] == m["id"]] for name, m in machines.items()}
+    for row in by_machine["tiny"]:
+        assert row["machine_checks"] == {"clamp_tonnage": False, "shot_volume": True, "tie_bar_spacing": True}
+    for row in by_machine["narrow"]:
+        assert row["machine_checks"] == {"clamp_tonnage": True, "shot_volume": True, "tie_bar_spacing": False}
+    for row in by_machine["big"] + by_machine["huge"]:
+        assert row["machine_fit"] and all(row["machine_checks"].values())
+    assert sum(row["machine_fit"] for row in rows) == 4
+    fastest = min(by_machine["big"], key=lambda row: row["cycle_time_s"])
+    assert sweep["best"] == rows[0] and rows[0]["machine_id"] == machines["big"]["id"]
+    assert rows[0]["material_id"] == fastest["material_id"]
+
+@pytest.fixture
+def static_file():
+    """A compressible file under static/ with its precompressed variants. Returns (url, bytes)."""
+    path = os.path.join(static_assets.STATIC_DIR, "test-assets", "sample.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = b"".join(b"line %d of a compressible static file\n" % i for i in range(500))
+    with open(path, "wb") as f:
+        f.write(data)
+    static_assets.precompress([path])
+    yield "/static/test-assets/sample.txt", data
+    for suffix in ("", ".gz", ".br"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def test_static_etag_and_not_modified(client, static_file):
+    url, data = static_file
+    response = client.get(url, headers={"accept-encoding": "identity"})
+    assert response.status_code == 200 and response.content == data
+    assert response.headers["cache-control"] == static_assets.REVALIDATE_CACHE_CONTROL
+    etag = response.headers["etag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        again = client.get(url, headers={"accept-encoding": "identity", "if-none-match": header})
+        assert again.status_code == 304 and again.content == b""
+        assert again.headers["etag"] == etag
+    assert client.get(url, headers={"accept-encoding": "identity", "if-none-match": '"other"'}).status_code == 200
+
+def test_static_picks_the_accepted_encoding(client, static_file):
+    url, data = static_file
+    expected = [("gzip", "gzip"), ("gzip;q=0", None), ("identity", None), ("*", "br" if static_assets.BROTLI_AVAILABLE else "gzip")]
+    if static_assets.BROTLI_AVAILABLE:
+        expected += [("gzip, br", "br"), ("br;q=0, gzip", "gzip")]
+    etags = set()
+    for accept, encoding in expected:
+        response = client.get(url, headers={"accept-encoding": accept})
+        assert response.status_code == 200
+        assert response.headers.get("content-encoding") == encoding, accept
+        assert "Accept-Encoding" in response.headers["vary"]
+        # Decoded by the client either way
+        assert response.content == data
+        etags.add((encoding, response.headers["etag"]))
+    # One ETag per representation
+    assert len({etag for _, etag in etags}) == len({encoding for encoding, _ in etags})
+
+def test_static_byte_ranges(client, static_file):
+    url, data = static_file
+    response = client.get(url, headers={"range": "bytes=10-19", "accept-encoding": "gzip, br"})
+    assert response.status_code == 206
+    assert response.content == data[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(data)}"
+    assert "content-encoding" not in response.headers
+    assert client.get(url, headers={"range": "bytes=-5"}).content == data[-5:]
+    assert client.get(url, headers={"range": f"bytes={len(data) + 10}-"}).status_code == 416
+
+def test_static_paths_and_immutable_blobs(client, write_stl):
+    assert client.get("/static/..%2f..%2f..%2fetc/passwd").status_code == 404
+    assert client.get("/static/test-assets/missing.txt").status_code == 404
+    _, upload = upload_part(client, write_stl(box_triangles((10, 20, 30))))
+    response = client.get(upload["url"])
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == static_assets.IMMUTABLE_CACHE_CONTROL
@@ -0,0 +1,174 @@
+import os
+import json
+import random
+import threading
+import pytest
+from backend import database
+from helpers import stop_without_compacting
+
+def project_names(db):
+    return sorted(r["name"] for r in db.table("projects").select("name").execute().data)
+
+def test_journal_replays_after_crash(mock_db):
+    db = mock_db()
+    db.table("projects").insert([{"id": "a", "name": "A"}, {"id": "b", "name": "B"}]).execute()
+    db.table("projects").update({"name": "A2"}).eq("id", "a").execute()
+    db.table("projects").delete().eq("id", "b").execute()
+    stop_without_compacting(db)
+
+    reopened = mock_db()
+    assert project_names(reopened) == ["A2"]
+
+def test_compaction_keeps_every_commit(mock_db):
+    db = mock_db()
+    db.table("projects").insert({"id": "a", "name": "A"}).execute()
+    db.compact()
+    db.table("projects").insert({"id": "b", "name": "B"}).execute()
+    stop_without_compacting(db)
+    assert project_names(mock_db()) == ["A", "B"]
+
+class FailingJournal:
+    """A journal file whose writes fail, e.g. a full disk."""
+    def __init__(self, journal):
+        self.journal = journal
+
+    def write(self, data):
+        raise OSError("No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self.journal, name)
+
+def test_failed_journal_write_is_never_visible(mock_db):
+    db = mock_db()
+    journal = db._journal
+    db._journal = FailingJournal(journal)
+    with pytest.raises(RuntimeError):
+        db.table("projects").insert({"id": "lost", "name": "Lost"}).execute()
+    assert project_names(db) == []
+
+    db._journal = journal
+    db.table("projects").insert({"id": "kept", "name": "Kept"}).execute()
+    assert project_names(db) == ["Kept"]
+    stop_without_compacting(db)
+    assert project_names(mock_db()) == ["Kept"]
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    from backend.sqlite_db import SQLiteClient
+    client = SQLiteClient(path=str(tmp_path / "store.db"), pool_size=2)
+    yield client
+    client.close()
+
+@pytest.mark.parametrize("backend", ["mock", "sqlite"])
+def test_update_cannot_change_id(backend, mock_db, sqlite_db):
+    db = mock_db() if backend == "mock" else sqlite_db
+    db.table("projects").insert({"id": "a", "name": "A"}).execute()
+    with pytest.raises(ValueError):
+        db.table("projects").update({"id": "b", "name": "B"}).eq("id", "a").execute()
+    assert db.table("projects").select("id, name").eq("id", "a").execute().data == [{"id": "a", "name": "A"}]
+    assert db.table("projects").select("id").eq("id", "b").execute().data == []
+
+def test_concurrent_updates_and_deletes_keep_indexes_consistent(mock_db):
+    db = mock_db()
+    db.table("parts").insert([{"id": f"r{i}", "project_id": "p0"} for i in range(60)]).execute()
+
+    def move(source, target):
+        for _ in range(20):
+            db.table("parts").update({"project_id": target}).eq("project_id", source).execute()
+
+    def delete():
+        for i in range(0, 60, 3):
+            db.table("parts").delete().eq("id", f"r{i}").execute()
+
+    threads = [threading.Thread(target=move, args=("p0", "p1")), threading.Thread(target=move, args=("p1", "p0")), threading.Thread(target=delete)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rows = db.table("parts").select("*").execute().data
+    assert sorted(r["id"] for r in rows) == sorted(f"r{i}" for i in range(60) if i % 3)
+    for project_id in ("p0", "p1"):
+        indexed = db.table("parts").select("id").eq("project_id", project_id).execute().data
+        assert sorted(r["id"] for r in indexed) == sorted(r["id"] for r in rows if r["project_id"] == project_id)
+    stop_without_compacting(db)
+    assert sorted(map(str, mock_db().table("parts").select("*").execute().data)) == sorted(map(str, rows))
+
+@pytest.mark.parametrize("backend", ["mock", "sqlite"])
+def test_insertion_order_survives_updates(backend, mock_db, sqlite_db):
+    db = mock_db() if backend == "mock" else sqlite_db
+    for name in ("old", "middle", "new"):
+        db.table("simulations").insert({"id": name, "project_id": "p", "result": {}}).execute()
+    db.table("simulations").update({"result": {"edited": True}}).eq("id", "old").execute()
+    db.table("simulations").update({"result": {"edited": True}}).eq("id", "middle").execute()
+
+    latest = db.table("simulations").select("id").eq("project_id", "p").order("created_at", desc=True).limit(1).execute().data
+    assert latest == [{"id": "new"}]
+    ordered = db.table("simulations").select("id").eq("project_id", "p").order("created_at").execute().data
+    assert [r["id"] for r in ordered] == ["old", "middle", "new"]
+
+def test_legacy_json_snapshot_migrates_and_loads_lazily(mock_db):
+    legacy = {
+        "projects": [{"id": "p1", "name": "Legacy"}],
+        "parts": [{"id": "part1", "project_id": "p1", "volume": 12.5}],
+        "materials": [{"id": "m1", "name": "ABS"}],
+        "_meta": {"seq": 7},
+    }
+    with open(database.MOCK_DB_FILE, "w") as f:
+        json.dump(legacy, f)
+
+    db = mock_db()
+    assert os.path.exists(database.MOCK_DB_FILE + ".migrated") and not os.path.exists(database.MOCK_DB_FILE)
+    with open(database.MOCK_DB_SNAPSHOT, "rb") as f:
+        assert f.read(len(database.SNAPSHOT_MAGIC)) == database.SNAPSHOT_MAGIC
+    assert db._seq == 7
+    # Nothing is decoded until a table is read
+    assert "parts" not in db.data and "parts" in db._segments
+    assert db.table("parts").select("*").eq("project_id", "p1").execute().data == legacy["parts"]
+    assert "parts" in db.data and "projects" not in db.data
+
+    # Journal entries for a table still in the snapshot wait until it is loaded
+    db.table("projects").insert({"id": "p2", "name": "New"}).execute()
+    stop_without_compacting(db)
+    reopened = mock_db()
+    assert "projects" in reopened._segments and reopened._deferred["projects"]
+    assert project_names(reopened) == ["Legacy", "New"]
+
+    reopened.close()
+    compacted = mock_db()
+    assert project_names(compacted) == ["Legacy", "New"]
+    assert compacted.table("materials").select("name").execute().data == [{"name": "ABS"}]
+
+def test_indexed_lookups_match_a_full_scan(mock_db):
+    rng = random.Random(0)
+    db = mock_db()
+    projects = [f"p{i}" for i in range(5)]
+    db.table("parts").insert([{"id": f"r{i}", "project_id": rng.choice(projects), "name": f"n{i % 3}"} for i in range(80)]).execute()
+
+    def check(db):
+        rows = db.table("parts").select("*").execute().data
+        for project in projects + ["missing"]:
+            found = db.table("parts").select("*").eq("project_id", project).execute().data
+            assert sorted(r["id"] for r in found) == sorted(r["id"] for r in rows if r["project_id"] == project)
+            both = db.table("parts").select("id").eq("project_id", project).eq("name", "n1").execute().data
+            assert sorted(r["id"] for r in both) == sorted(r["id"] for r in rows if r["project_id"] == project and r["name"] == "n1")
+        for i in range(80):
+            found = db.table("parts").select("id").eq("id", f"r{i}").execute().data
+            assert found == [{"id": r["id"]} for r in rows if r["id"] == f"r{i}"]
+
+    for _ in range(60):
+        op = rng.random()
+        if op < 0.5:
+            # Moves the row to another index bucket
+            db.table("parts").update({"project_id": rng.choice(projects)}).eq("id", f"r{rng.randrange(80)}").execute()
+        elif op < 0.7:
+            db.table("parts").update({"name": "n1"}).eq("project_id", rng.choice(projects)).execute()
+        elif op < 0.9:
+            db.table("parts").delete().eq("id", f"r{rng.randrange(80)}").execute()
+        else:
+            db.table("parts").delete().eq("project_id", rng.choice(projects)).eq("name", "n2").execute()
+        check(db)
+
+    # Indexes rebuilt from the snapshot and journal agree too
+    stop_without_compacting(db)
+    check(mock_db())
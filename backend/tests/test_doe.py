@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from backend import doe
+from backend import physics
+from backend import workers
+from backend.api import simulation as simulation_api
+from helpers import box_triangles, upload_part
+
+RANGES = {
+    "melt_temp_c": (200.0, 240.0, 3),
+    "mold_temp_c": (40.0, 60.0, 2),
+    "thickness_scale": (0.8, 1.2, 5),
+    "gate_count": (1, 2, 5),
+}
+
+def test_grid_is_every_combination_of_the_levels():
+    cases = doe.grid(RANGES)
+    # Five levels between 1 and 2 gates round to two
+    assert doe.case_count(RANGES, "grid", None) == 3 * 2 * 5 * 5
+    assert len(cases["melt_temp_c"]) == 3 * 2 * 5 * 2
+    combos = set(zip(*(cases[name] for name in doe.FACTORS)))
+    assert len(combos) == len(cases["melt_temp_c"])
+    assert sorted(set(cases["melt_temp_c"])) == [200.0, 220.0, 240.0]
+    assert sorted(set(cases["gate_count"])) == [1.0, 2.0]
+
+def test_latin_hypercube_puts_one_case_in_each_stratum():
+    samples = 40
+    cases = doe.latin_hypercube(RANGES, samples, seed=3)
+    for name in ("melt_temp_c", "mold_temp_c", "thickness_scale"):
+        low, high, _ = RANGES[name]
+        strata = np.floor((cases[name] - low) / (high - low) * samples).astype(int)
+        assert sorted(strata) == list(range(samples))
+    assert set(cases["gate_count"]) == {1.0, 2.0}
+    again = doe.latin_hypercube(RANGES, samples, seed=3)
+    assert all(np.array_equal(cases[name], again[name]) for name in doe.FACTORS)
+
+def test_window_summarizes_feasible_levels():
+    cases = {
+        "melt_temp_c": np.array([200.0, 200.0, 240.0, 240.0]),
+        "mold_temp_c": np.array([40.0, 60.0, 40.0, 60.0]),
+        "thickness_scale": np.array([1.0, 1.0, 1.0, 1.0]),
+        "gate_count": np.array([1.0, 1.0, 2.0, 2.0]),
+    }
+    feasible = np.array([True, False, True, True])
+    window = doe.window(cases, feasible)
+    assert window["melt_temp_c"] == {
+        "min": 200.0, "max": 240.0,
+        "levels": [{"value": 200.0, "feasible_fraction": 0.5}, {"value": 240.0, "feasible_fraction": 1.0}],
+    }
+    assert window["mold_temp_c"]["levels"] == [{"value": 40.0, "feasible_fraction": 1.0}, {"value": 60.0, "feasible_fraction": 0.5}]
+    assert (window["gate_count"]["min"], window["gate_count"]["max"]) == (1.0, 2.0)
+    assert all(entry is None for entry in doe.window(cases, np.zeros(4, dtype=bool)).values())
+
+def test_split_keeps_every_case_in_order():
+    cases = doe.grid(RANGES)
+    chunks = doe.split(cases, 4)
+    assert len(chunks) == 4
+    for name in doe.FACTORS:
+        assert np.array_equal(np.concatenate([chunk[name] for chunk in chunks]), cases[name])
+
+def test_pareto_front_keeps_only_non_dominated_points():
+    points = np.array([[1, 5], [2, 2], [3, 3], [5, 1], [2, 4]])
+    assert doe.pareto_front(points).tolist() == [0, 1, 3]
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = workers.WorkerPool(size=3)
+    monkeypatch.setattr(simulation_api, "get_geometry_pool", lambda: pool)
+    yield pool
+    pool.shutdown()
+
+def test_process_window_in_chunks_matches_one_pass(client, write_stl, pool, monkeypatch):
+    monkeypatch.setattr(doe, "DOE_MIN_CHUNK", 10)
+    project_id, _ = upload_part(client, write_stl(box_triangles((300, 60, 10), hollow_wall=2)))
+    material = client.get("/materials/").json()[0]
+    ranges = {
+        "melt_temp_c": {"min": 200, "max": 240, "levels": 3},
+        "mold_temp_c": {"min": 40, "max": 60, "levels": 2},
+        # Thin enough at the low end for short shots and excess pressure
+        "thickness_scale": {"min": 0.05, "max": 1.0, "levels": 5},
+        "gate_count": {"min": 1, "max": 2, "levels": 2},
+    }
+    response = client.post("/simulation/process-window", json={"project_id": project_id, "material_id": material["id"], **ranges})
+    assert response.status_code == 200, response.text
+    window = response.json()
+    assert window["cases"] == 60
+    assert window["chunks"] == 3
+
+    # The same design in one pass, in this process
+    part = client.get(f"/projects/{project_id}").json()["parts"][0]
+    cases = doe.grid({name: (r["min"], r["max"], r["levels"]) for name, r in ranges.items()})
+    results = physics.evaluate_process(physics.part_inputs(part), physics.material_arrays([material]), cases)
+    feasible = results["feasible"]
+    assert window["feasible_cases"] == int(feasible.sum())
+    assert window["infeasible_reasons"] == {reason: int(results[reason].sum()) for reason in ("short_shot_risk", "high_pressure", "over_tonnage")}
+    assert window["infeasible_reasons"]["short_shot_risk"] > 0 and window["infeasible_reasons"]["high_pressure"] > 0
+    assert 0 < window["feasible_cases"] < window["cases"]
+    assert window["window"] == doe.window(cases, feasible)
+    front = doe.pareto_front(np.stack([results[name] for name in doe.OBJECTIVES], axis=1)[feasible])
+    assert window["pareto_front_size"] == len(front)
+
+    # A machine's clamp tonnage caps every case
+    machine = client.post("/machines/", json={"name": "DOE small", "clamp_tonnage": 2.0, "max_shot_volume": 1000,
+                                               "tie_bar_spacing_x": 500, "tie_bar_spacing_y": 500}).json()
+    response = client.post("/simulation/process-window", json={"project_id": project_id, "material_id": material["id"], "machine_id": str(machine["id"]), **ranges})
+    assert response.status_code == 200, response.text
+    limited = physics.evaluate_process(physics.part_inputs(part), physics.material_arrays([material]), cases, tonnage_limit=2.0)
+    assert 0 < response.json()["infeasible_reasons"]["over_tonnage"] == int(limited["over_tonnage"].sum())
+    assert response.json()["feasible_cases"] == int(limited["feasible"].sum())
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from backend import fill_solver
+from backend import physics
+from helpers import box_triangles, upload_part
+
+BAR = (100.0, 10.0, 10.0)
+END_GATE = [[-BAR[0] / 2, 0.0, 0.0]]
+
+def test_bar_fills_from_its_gate_to_the_far_end():
+    summary, field, origin, voxel_size = fill_solver.solve(box_triangles(BAR), gates=END_GATE, resolution=64)
+    assert summary["unfilled_fraction"] == 0
+    # Each cross-section fills after the one before it
+    inside = field >= 0
+    slab_times = [field[i][inside[i]].mean() for i in range(field.shape[0]) if inside[i].any()]
+    assert np.all(np.diff(slab_times) > 0)
+    assert summary["fill_time_s"] == pytest.approx(BAR[0] / physics.FLOW_SPEED_MM_S, rel=0.1)
+    times = [point["time_s"] for point in summary["fill_curve"]]
+    assert times == sorted(times)
+
+def test_field_round_trips_through_its_buffer():
+    _, field, origin, voxel_size = fill_solver.solve(box_triangles(BAR), gates=END_GATE, resolution=32)
+    decoded, decoded_origin, decoded_size = fill_solver.decode_field(fill_solver.encode_field(field, origin, voxel_size))
+    assert np.array_equal(decoded, field)
+    assert np.allclose(decoded_origin, origin) and decoded_size == pytest.approx(voxel_size)
+
+def test_repeat_fill_is_served_from_the_cache(client, write_stl):
+    project_id, _ = upload_part(client, write_stl(box_triangles(BAR)))
+    request = {"project_id": project_id, "gates": END_GATE, "resolution": 48}
+    first = client.post("/simulation/fill", json=request)
+    assert first.status_code == 200, first.text
+    second = client.post("/simulation/fill", json=request)
+    assert second.status_code == 200, second.text
+    assert (first.json()["cached"], second.json()["cached"]) == (False, True)
+    assert {k: v for k, v in second.json().items() if k != "cached"} == {k: v for k, v in first.json().items() if k != "cached"}
+
+    field, _, _ = fill_solver.decode_field(client.get(first.json()["field_url"]).content)
+    assert int((field >= 0).sum()) == first.json()["voxels"]
@@ -0,0 +1,106 @@
+import threading
+import numpy as np
+import pytest
+from backend import geometry_store
+from backend import mesh_analysis
+from helpers import box_triangles, upload_part
+
+def test_lookup_misses_blobs_from_an_older_analysis(mock_db, write_stl, monkeypatch):
+    db = mock_db()
+    path = write_stl(box_triangles((10, 20, 30)))
+    stats = mesh_analysis.stats_from_triangles(mesh_analysis.load_triangles(path))
+    geometry_store.store(db, "a" * 64, path, stats)
+    assert geometry_store.lookup(db, "a" * 64)["stats"] == stats
+
+    monkeypatch.setattr(mesh_analysis, "ANALYSIS_VERSION", mesh_analysis.ANALYSIS_VERSION + 1)
+    assert geometry_store.lookup(db, "a" * 64) is None
+    # Storing the new analysis replaces the record in place
+    geometry_store.store(db, "a" * 64, path, stats)
+    assert geometry_store.lookup(db, "a" * 64)["analysis_version"] == mesh_analysis.ANALYSIS_VERSION
+    assert len(db.table(geometry_store.GEOMETRY_TABLE).select("id").execute().data) == 1
+
+def test_concurrent_stores_of_the_same_bytes(mock_db, write_stl, tmp_path, monkeypatch):
+    monkeypatch.setattr(geometry_store, "STATIC_DIR", str(tmp_path / "static"))
+    db = mock_db()
+    path = write_stl(box_triangles((10, 20, 30)))
+    stats = mesh_analysis.stats_from_triangles(mesh_analysis.load_triangles(path))
+    errors = []
+
+    def store():
+        try:
+            geometry_store.store(db, "d" * 64, path, stats)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(db.table(geometry_store.GEOMETRY_TABLE).select("id").execute().data) == 1
+    stored = tmp_path / "static" / geometry_store.blob_filename("d" * 64)
+    assert stored.read_bytes() == open(path, "rb").read()
+    assert [p.name for p in stored.parent.iterdir()] == [stored.name]
+
+def test_reupload_is_a_cache_hit(client, write_stl):
+    path = write_stl(box_triangles((12, 14, 16)))
+    _, first = upload_part(client, path)
+    _, second = upload_part(client, path)
+    assert second["stats"] == first["stats"]
+    assert second["stats"]["wall_thickness"] is not None
+
+def test_evicting_a_base_forgets_its_transforms(mock_db, tmp_path, monkeypatch):
+    from backend import static_gc
+    monkeypatch.setattr(geometry_store, "STATIC_DIR", str(tmp_path / "static"))
+    monkeypatch.setattr(static_gc, "STATIC_GC_GRACE_S", -1.0)
+    db = mock_db()
+    filename = geometry_store.blob_filename("b" * 64)
+    path = tmp_path / "static" / filename
+    path.parent.mkdir(parents=True)
+    mesh_analysis.write_binary_stl(str(path), box_triangles((10, 20, 30)))
+    key = geometry_store.record_transform(db, filename, np.eye(4))
+    assert geometry_store.materialize(db, key) is not None
+
+    # Nothing references the blob, so a pass under a zero quota evicts it
+    static_gc.collect(db, quota_bytes=0)
+    assert not path.exists()
+    assert db.table(geometry_store.TRANSFORMS_TABLE).select("id").eq("id", key).execute().data == []
+    assert geometry_store.materialize(db, key) is None
+
+def test_materialize_without_its_base(mock_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(geometry_store, "STATIC_DIR", str(tmp_path / "static"))
+    db = mock_db()
+    key = geometry_store.record_transform(db, geometry_store.blob_filename("c" * 64), np.eye(4))
+    assert geometry_store.materialize(db, key) is None
+
+def test_concurrent_first_downloads_of_a_transform(mock_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(geometry_store, "STATIC_DIR", str(tmp_path / "static"))
+    db = mock_db()
+    filename = geometry_store.blob_filename("e" * 64)
+    base = tmp_path / "static" / filename
+    base.parent.mkdir(parents=True)
+    mesh_analysis.write_binary_stl(str(base), box_triangles((10, 20, 30)))
+    matrix = np.diag([2.0, 1.0, 1.0, 1.0])
+    keys = set()
+    paths, errors = [], []
+
+    def download():
+        try:
+            key = geometry_store.record_transform(db, filename, matrix)
+            keys.add(key)
+            paths.append(geometry_store.materialize(db, key))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=download) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(keys) == 1 and len(set(paths)) == 1
+    assert len(db.table(geometry_store.TRANSFORMS_TABLE).select("id").execute().data) == 1
+    volume, _, _ = mesh_analysis.triangle_stats(mesh_analysis.load_triangles(paths[0]).astype(np.float64))
+    assert abs(volume) == pytest.approx(2 * 10 * 20 * 30, rel=1e-5)
+    assert not [p for p in (tmp_path / "static").rglob("*.tmp")]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from backend import machine_catalog
+from backend.database import get_db
+from backend.main import app
+from helpers import box_triangles, upload_part
+
+def machine(name, tonnage, shot_volume=1000.0, tie_bars=(500.0, 500.0)):
+    return {"id": name, "name": name, "clamp_tonnage": tonnage, "max_shot_volume": shot_volume,
+            "tie_bar_spacing_x": tie_bars[0], "tie_bar_spacing_y": tie_bars[1]}
+
+CATALOG = [
+    machine("huge", 500.0),
+    machine("weak", 50.0),
+    machine("low shot", 110.0, shot_volume=10.0),
+    machine("narrow", 120.0, tie_bars=(100.0, 400.0)),
+    machine("best", 150.0),
+    machine("runner up", 200.0),
+]
+
+@pytest.mark.parametrize("block", [machine_catalog.MACHINE_SCAN_BLOCK, 1])
+def test_smallest_fitting_machine_and_runner_up(monkeypatch, block):
+    monkeypatch.setattr(machine_catalog, "MACHINE_SCAN_BLOCK", block)
+    index = machine_catalog.MachineIndex(CATALOG)
+    chosen = index.select(100.0, 50.0, np.array([300.0, 200.0, 50.0]))
+    assert [m["id"] for m in chosen] == ["best", "runner up"]
+
+def test_tie_bars_clear_in_either_orientation():
+    index = machine_catalog.MachineIndex(CATALOG)
+    # 90 x 350 passes between 100 x 400 tie bars once turned
+    chosen = index.select(100.0, 50.0, np.array([350.0, 90.0, 50.0]))
+    assert [m["id"] for m in chosen] == ["narrow", "best"]
+
+def test_no_machine_fits():
+    index = machine_catalog.MachineIndex(CATALOG)
+    assert index.select(1000.0, 50.0, np.array([300.0, 200.0, 50.0])) == []
+    assert index.select(100.0, 50.0, np.array([600.0, 200.0, 50.0])) == []
+
+@pytest.fixture
+def fresh_db(mock_db):
+    """The app on an empty mock DB, so only this test's machines are in the catalog."""
+    db = mock_db()
+    app.dependency_overrides[get_db] = lambda: db
+    machine_catalog.invalidate()
+    yield db
+    del app.dependency_overrides[get_db]
+    machine_catalog.invalidate()
+
+def test_simulation_picks_machines_and_sees_new_ones(client, fresh_db, write_stl):
+    project_id, _ = upload_part(client, write_stl(box_triangles((80, 50, 20), hollow_wall=2)))
+    material_id = client.get("/materials/").json()[0]["id"]
+
+    def run():
+        response = client.post("/simulation/run", json={"project_id": project_id, "material_id": material_id})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def add(name, tonnage, **kwargs):
+        record = machine(name, tonnage, **kwargs)
+        del record["id"]
+        response = client.post("/machines/", json=record)
+        assert response.status_code == 200, response.text
+
+    first = run()
+    assert first["machine"] is None
+    tonnage = first["clamp_tonnage_tons"]
+    add("weak", tonnage * 0.5)
+    add("low shot", tonnage * 1.1, shot_volume=0.001)
+    add("narrow", tonnage * 1.2, tie_bars=(10.0, 10.0))
+    add("best", tonnage * 1.5)
+    add("runner up", tonnage * 2)
+    add("largest", tonnage * 5)
+    result = run()
+    assert (result["machine"]["name"], result["runner_up_machine"]["name"]) == ("best", "runner up")
+    assert result["machine"]["tonnage_utilization"] == pytest.approx(1 / 1.5, abs=0.01)
+
+    # POST /machines rebuilds the catalog, and cached results for the old one no longer hit
+    add("new best", tonnage * 1.3)
+    result = run()
+    assert (result["machine"]["name"], result["runner_up_machine"]["name"]) == ("new best", "best")
+
+def test_simulation_warns_when_no_machine_fits(client, fresh_db, write_stl):
+    project_id, _ = upload_part(client, write_stl(box_triangles((700, 600, 10), hollow_wall=2)))
+    client.post("/machines/", json={"name": "Standard", "clamp_tonnage": 1e6, "max_shot_volume": 1e6,
+                                    "tie_bar_spacing_x": 500, "tie_bar_spacing_y": 500})
+    material_id = client.get("/materials/").json()[0]["id"]
+    result = client.post("/simulation/run", json={"project_id": project_id, "material_id": material_id}).json()
+    assert result["machine"] is None and result["runner_up_machine"] is None
+    assert any("No machine on file" in warning for warning in result["warnings"])
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from backend import mesh_analysis
+from helpers import box_triangles
+
+def test_wall_thickness_of_a_closed_shell():
+    wall = mesh_analysis.wall_thickness(box_triangles((100, 60, 40), hollow_wall=2.0))
+    assert wall["unresolved_fraction"] == 0
+    assert wall["median_mm"] == pytest.approx(2.0, rel=0.01)
+    assert sum(wall["histogram"]["area_fraction"]) == pytest.approx(1.0, abs=1e-4)
+
+def test_unresolved_rays_stay_out_of_the_statistics():
+    extents = (100, 60, 30)
+    wall = mesh_analysis.wall_thickness(box_triangles(extents, open_top=True))
+    # The bottom's rays escape through the missing top
+    assert 0 < wall["unresolved_fraction"] < 1
+    assert wall["max_mm"] <= max(extents) + 1e-6
+    assert wall["histogram"]["bin_edges_mm"][-1] <= max(extents) + 1e-3
+    assert sum(wall["histogram"]["area_fraction"]) == pytest.approx(1.0, abs=1e-4)
+
+def test_wall_thickness_when_no_ray_resolves():
+    triangle = np.array([[[0, 0, 0], [10, 0, 0], [0, 10, 0]]], dtype=np.float32)
+    wall = mesh_analysis.wall_thickness(triangle)
+    assert wall["unresolved_fraction"] == 1.0
+    assert wall["median_mm"] is None
+    assert wall["histogram"] == {"bin_edges_mm": [], "area_fraction": [], "mean_mm": []}
@@ -0,0 +1,27 @@
+import threading
+from backend import lod
+from backend import mesh_jobs
+from helpers import box_triangles
+
+def test_concurrent_lod_builds_of_the_same_mesh(tmp_path, write_stl):
+    path = write_stl(box_triangles((100, 60, 40), hollow_wall=2.0))
+    out_dir = str(tmp_path / "lod")
+    results, errors = [], []
+
+    def build():
+        try:
+            results.append(mesh_jobs.build_lods(path, out_dir, "part"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(results[0]) == len(lod.LOD_RATIOS)
+    for level in results[0]:
+        with open(level["path"], "rb") as f:
+            assert len(f.read()) == level["size_bytes"]
+    assert sorted(p.name for p in (tmp_path / "lod").iterdir()) == sorted(f"part_{round(r * 100)}.bin" for r in lod.LOD_RATIOS)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from backend import mesh_analysis
+from backend import physics
+from helpers import box_triangles
+
+MATERIAL = {"melt_temp_c": 230.0, "mold_temp_c": 50.0}
+
+def part_record(extents, hollow_wall=None):
+    triangles = box_triangles(extents, hollow_wall=hollow_wall)
+    volume, _, _ = mesh_analysis.triangle_stats(triangles.astype(np.float64))
+    return {
+        "volume": abs(volume),
+        "projected_area": extents[0] * extents[1],
+        **{f"bbox_{axis}": extent for axis, extent in zip("xyz", extents)},
+        "wall_thickness": mesh_analysis.wall_thickness(triangles),
+    }
+
+def slab_cooling(wall):
+    melt, mold = MATERIAL["melt_temp_c"], MATERIAL["mold_temp_c"]
+    return float(physics.cooling_time(wall, melt, mold, melt - physics.EJECT_BELOW_MELT_C))
+
+@pytest.mark.parametrize("extents", [(100, 60, 3), (150, 100, 2.5)])
+def test_flat_plate_cools_like_a_slab_at_its_wall(extents):
+    # Edge faces cast their rays along the plate; those lengths must not set the cycle
+    results = physics.evaluate(part_record(extents), [MATERIAL])
+    assert results["cooling_time_s"][0] == pytest.approx(slab_cooling(extents[2]), rel=0.05)
+
+def test_closed_shell_cools_like_a_slab_at_its_wall():
+    results = physics.evaluate(part_record((100, 60, 40), hollow_wall=2.0), [MATERIAL])
+    assert results["cooling_time_s"][0] == pytest.approx(slab_cooling(2.0), rel=0.05)
+
+def test_thick_tail_never_limits_the_cycle():
+    props = physics.material_arrays([MATERIAL])
+    walls = np.array([2.0, 4.0, 50.0])
+    seconds, limiting = physics.cooling_by_thickness(walls, np.array([0.85, 0.1, 0.05]), props)
+    assert limiting[0] == 1
+    assert seconds[0, 2] > seconds[0, 1]
+    # A thick wall over much of the part does limit it
+    _, limiting = physics.cooling_by_thickness(walls, np.array([0.5, 0.1, 0.4]), props)
+    assert limiting[0] == 2
+
+def test_thickness_bins_of_older_histograms_use_bin_centres():
+    part = {"wall_thickness": {"median_mm": 2.0, "histogram": {"bin_edges_mm": [0, 2, 4], "area_fraction": [0.5, 0.5]}}}
+    _, _, walls = physics.thickness_bins(part)
+    assert walls.tolist() == [1.0, 3.0]
+
+def test_process_cases_cool_like_evaluate():
+    part = part_record((100, 60, 40), hollow_wall=2.0)
+    materials = [MATERIAL, {"melt_temp_c": 120.0, "mold_temp_c": 110.0}]
+    results = physics.evaluate(part, materials)
+    geometry = physics.part_inputs(part)
+    for i, material in enumerate(materials):
+        cases = {"melt_temp_c": [material["melt_temp_c"]] * 2, "mold_temp_c": [material["mold_temp_c"]] * 2,
+                 "thickness_scale": [1.0, 2.0], "gate_count": [1, 1]}
+        process = physics.evaluate_process(geometry, physics.material_arrays([material]), cases)
+        assert process["cooling_time_s"][0] == pytest.approx(results["cooling_time_s"][i])
+        # Cooling goes with the square of the wall
+        assert process["cooling_time_s"][1] == pytest.approx(4 * process["cooling_time_s"][0])
+
+def test_seeded_materials_have_their_own_diffusivity():
+    from backend.database import seed_materials
+    alpha = physics.thermal_diffusivity(physics.material_arrays(seed_materials()))
+    assert not np.any(alpha == physics.DEFAULT_ALPHA)
+    # Polymers: within a factor of two of the generic value
+    assert np.all((alpha > physics.DEFAULT_ALPHA / 2) & (alpha < physics.DEFAULT_ALPHA * 2))
@@ -0,0 +1,22 @@
+import copy
+from backend import simulation_cache
+
+MATERIAL = {"melt_temp_c": 230.0, "mold_temp_c": 50.0}
+PART = {
+    "volume": 18000.0, "projected_area": 6000.0, "bbox_x": 100.0, "bbox_y": 60.0, "bbox_z": 3.0,
+    "wall_thickness": {
+        "median_mm": 3.0,
+        "histogram": {"bin_edges_mm": [0.0, 5.0, 10.0], "area_fraction": [0.9, 0.1], "mean_mm": [3.0, 8.0]},
+    },
+}
+
+def test_key_covers_the_thickness_histogram():
+    key = simulation_cache.cache_key(PART, MATERIAL)
+    assert simulation_cache.cache_key(copy.deepcopy(PART), MATERIAL) == key
+    # Same nominal wall, different distribution: cooling can differ, so the key must too
+    thicker = copy.deepcopy(PART)
+    thicker["wall_thickness"]["histogram"]["area_fraction"] = [0.5, 0.5]
+    assert simulation_cache.cache_key(thicker, MATERIAL) != key
+    moved = copy.deepcopy(PART)
+    moved["wall_thickness"]["histogram"]["mean_mm"] = [3.0, 9.0]
+    assert simulation_cache.cache_key(moved, MATERIAL) != key
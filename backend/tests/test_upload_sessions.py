@@ -0,0 +1,85 @@
+import os
+import time
+import asyncio
+import hashlib
+import pytest
+from backend import upload_sessions
+from helpers import box_triangles
+
+async def stream_of(data, piece=65536):
+    for start in range(0, len(data), piece):
+        yield data[start:start + piece]
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_sessions, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    return tmp_path / "uploads"
+
+def test_chunks_assemble_in_order(upload_dir, tmp_path):
+    data = os.urandom(2_500_000)
+    session = upload_sessions.create("part.stl", len(data), chunk_size=1_000_000, sha256=hashlib.sha256(data).hexdigest())
+
+    async def send_all():
+        # Out of order and concurrently, as parallel PUTs would arrive
+        await asyncio.gather(*(
+            upload_sessions.write_chunk(session, i, stream_of(data[i * 1_000_000:(i + 1) * 1_000_000]),
+                                        hashlib.sha256(data[i * 1_000_000:(i + 1) * 1_000_000]).hexdigest())
+            for i in (2, 0, 1)
+        ))
+
+    asyncio.run(send_all())
+    assert upload_sessions.received_chunks(session) == [0, 1, 2]
+    dest = str(tmp_path / "assembled.stl")
+    assert upload_sessions.assemble(session, dest) == hashlib.sha256(data).hexdigest()
+    with open(dest, "rb") as f:
+        assert f.read() == data
+
+def test_rejected_chunk_leaves_nothing_behind(upload_dir):
+    data = b"x" * 1000
+    session = upload_sessions.create("part.stl", len(data), chunk_size=1000)
+    with pytest.raises(upload_sessions.UploadError) as error:
+        asyncio.run(upload_sessions.write_chunk(session, 0, stream_of(data), "0" * 64))
+    assert error.value.status_code == 422
+    with pytest.raises(upload_sessions.UploadError) as error:
+        asyncio.run(upload_sessions.write_chunk(session, 0, stream_of(data + b"y"), hashlib.sha256(data).hexdigest()))
+    assert error.value.status_code == 413
+    assert upload_sessions.received_chunks(session) == []
+    assert os.listdir(upload_dir / session["upload_id"]) == ["session.json"]
+
+def test_chunk_writes_do_not_block_the_event_loop(upload_dir, monkeypatch):
+    data = b"x" * 1000
+    session = upload_sessions.create("part.stl", len(data), chunk_size=1000)
+    write_block = upload_sessions._write_block
+
+    def slow_write(out, digest, block):
+        time.sleep(0.3) # A slow disk
+        write_block(out, digest, block)
+
+    monkeypatch.setattr(upload_sessions, "_write_block", slow_write)
+
+    async def run():
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        task = asyncio.create_task(ticker())
+        await upload_sessions.write_chunk(session, 0, stream_of(data), hashlib.sha256(data).hexdigest())
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+def test_chunked_upload_endpoint(client, write_stl):
+    with open(write_stl(box_triangles((10, 20, 30))), "rb") as f:
+        data = f.read()
+    project_id = client.post("/projects/", json={"name": "Chunked"}).json()["id"]
+    session = client.post("/geometry/uploads", json={"filename": "box.stl", "size": len(data), "chunk_size": 256, "project_id": project_id}).json()
+    for i in range(session["chunk_count"]):
+        chunk = data[i * 256:(i + 1) * 256]
+        response = client.put(f"/geometry/uploads/{session['upload_id']}/chunks/{i}", content=chunk, headers={"X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()})
+        assert response.status_code == 200, response.text
+    assert client.get(f"/geometry/uploads/{session['upload_id']}").json()["complete"]
+    result = client.post(f"/geometry/uploads/{session['upload_id']}/complete", json={}).json()
+    assert abs(result["stats"]["volume_mm3"] - 6000) < 1e-3
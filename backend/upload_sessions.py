@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Chunked, resumable uploads. Each session is a directory holding session.json and one file per
+# verified chunk, so a dropped connection only costs the chunk in flight and parallel PUTs never race.
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "500"))
+DEFAULT_CHUNK_MB = 8
+MAX_CHUNK_MB = 64
+UPLOAD_SESSION_TTL_S = float(os.environ.get("UPLOAD_SESSION_TTL_H", "24")) * 3600
+COPY_BUFFER = 1024 * 1024
+
+class UploadError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def _session_dir(upload_id):
+    # upload_id comes from the URL; only accept ids this module generated
+    try:
+        upload_id = uuid.UUID(upload_id).hex
+    except ValueError:
+        raise UploadError(404, "Upload session not found")
+    return os.path.join(UPLOAD_DIR, upload_id)
+
+def _chunk_path(session_dir, index):
+    return os.path.join(session_dir, f"chunk_{index:06d}")
+
+def create(filename, size, chunk_size=None, sha256=None, project_id=None):
+    """Opens a session for a file of `size` bytes. Returns its metadata."""
+    if size <= 0:
+        raise UploadError(400, "Upload size must be positive")
+    if size > MAX_UPLOAD_MB * 1024 * 1024:
+        raise UploadError(413, f"File too large ({size/1024/1024:.1f}MB). Max size {MAX_UPLOAD_MB}MB.")
+    chunk_size = chunk_size or DEFAULT_CHUNK_MB * 1024 * 1024
+    if not 0 < chunk_size <= MAX_CHUNK_MB * 1024 * 1024:
+        raise UploadError(400, f"chunk_size must be between 1 byte and {MAX_CHUNK_MB}MB")
+
+    expire_stale()
+    session = {
+        "upload_id": uuid.uuid4().hex,
+        "filename": os.path.basename(filename),
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunk_count": -(-size // chunk_size),
+        "sha256": sha256.lower() if sha256 else None,
+        "project_id": project_id,
+        "created_at": time.time(),
+    }
+    session_dir = os.path.join(UPLOAD_DIR, session["upload_id"])
+    os.makedirs(session_dir)
+    with open(os.path.join(session_dir, "session.json"), "w") as f:
+        json.dump(session, f)
+    return session
+
+def load(upload_id):
+    session_dir = _session_dir(upload_id)
+    try:
+        with open(os.path.join(session_dir, "session.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError(404, "Upload session not found")
+
+def received_chunks(session):
+    session_dir = os.path.join(UPLOAD_DIR, session["upload_id"])
+    return sorted(
+        int(name[len("chunk_"):]) for name in os.listdir(session_dir)
+        if name.startswith("chunk_") and not name.endswith(".part")
+    )
+
+def expected_chunk_length(session, index):
+    if not 0 <= index < session["chunk_count"]:
+        raise UploadError(400, f"Chunk index out of range (0-{session['chunk_count'] - 1})")
+    return min(session["chunk_size"], session["size"] - index * session["chunk_size"])
+
+def _write_block(out, digest, block):
+    digest.update(block)
+    out.write(block)
+
+def _discard_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+async def write_chunk(session, index, stream, checksum):
+    """Streams one chunk body to disk, enforcing its length as bytes arrive and verifying its SHA-256.
+
+    The chunk only becomes visible (and counts as received) once verified, so a retried or
+    interrupted PUT leaves nothing behind. File writes and hashing run in the threadpool, a
+    COPY_BUFFER at a time, so a landing chunk never stalls the event loop.
+    """
+    expected = expected_chunk_length(session, index)
+    session_dir = os.path.join(UPLOAD_DIR, session["upload_id"])
+    final_path = _chunk_path(session_dir, index)
+    tmp_path = f"{final_path}.{uuid.uuid4().hex[:8]}.part"
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        out = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            buffered, buffered_bytes = [], 0
+            async for piece in stream:
+                written += len(piece)
+                if written > expected:
+                    raise UploadError(413, f"Chunk {index} exceeds its expected {expected} bytes")
+                buffered.append(piece)
+                buffered_bytes += len(piece)
+                if buffered_bytes >= COPY_BUFFER:
+                    await run_in_threadpool(_write_block, out, digest, b"".join(buffered))
+                    buffered, buffered_bytes = [], 0
+            if buffered:
+                await run_in_threadpool(_write_block, out, digest, b"".join(buffered))
+        finally:
+            await run_in_threadpool(out.close)
+        if written != expected:
+            raise UploadError(400, f"Chunk {index} is {written} bytes, expected {expected}")
+        if digest.hexdigest() != checksum.lower():
+            raise UploadError(422, f"Chunk {index} checksum mismatch")
+        await run_in_threadpool(os.replace, tmp_path, final_path)
+    finally:
+        await run_in_threadpool(_discard_file, tmp_path)
+    return written
+
+def assemble(session, dest_path):
+    """Concatenates the verified chunks into dest_path, hashing on the way. Returns the SHA-256."""
+    missing = sorted(set(range(session["chunk_count"])) - set(received_chunks(session)))
+    if missing:
+        raise UploadError(409, f"Missing chunks: {missing[:20]}")
+    session_dir = os.path.join(UPLOAD_DIR, session["upload_id"])
+    digest = hashlib.sha256()
+    with open(dest_path, "wb") as out:
+        for index in range(session["chunk_count"]):
+            with open(_chunk_path(session_dir, index), "rb") as chunk:
+                while True:
+                    block = chunk.read(COPY_BUFFER)
+                    if not block:
+                        break
+                    digest.update(block)
+                    out.write(block)
+    result = digest.hexdigest()
+    if session["sha256"] and result != session["sha256"]:
+        raise UploadError(422, "Assembled file checksum mismatch")
+    return result
+
+def discard(session):
+    shutil.rmtree(os.path.join(UPLOAD_DIR, session["upload_id"]), ignore_errors=True)
+
+def expire_stale():
+    """Removes sessions older than the TTL (abandoned uploads)."""
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    cutoff = time.time() - UPLOAD_SESSION_TTL_S
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Expired upload session {name}")
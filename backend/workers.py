@@ -0,0 +1,173 @@
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    # Windows: no per-process memory cap
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# CPU-bound geometry work (gmsh meshing, mesh analysis) runs in these worker processes
+GEOMETRY_WORKERS = int(os.environ.get("GEOMETRY_WORKERS", str(min(4, os.cpu_count() or 1))))
+GEOMETRY_JOB_TIMEOUT_S = float(os.environ.get("GEOMETRY_JOB_TIMEOUT_S", "300"))
+# Address-space cap per worker; 0 disables it
+GEOMETRY_WORKER_MEMORY_MB = int(os.environ.get("GEOMETRY_WORKER_MEMORY_MB", "4096"))
+
+# STEP meshing runs in its own pool of workers that keep GMSH initialized between jobs.
+# They are recycled after GMSH_MAX_JOBS_PER_WORKER jobs (GMSH leaks a little per model) or after any failure.
+GMSH_WORKERS = int(os.environ.get("GMSH_WORKERS", "2"))
+GMSH_MAX_JOBS_PER_WORKER = int(os.environ.get("GMSH_MAX_JOBS_PER_WORKER", "50"))
+
+class WorkerError(Exception):
+    """A job failed inside a worker process."""
+
+class WorkerTimeout(WorkerError):
+    """A job exceeded its time budget; its worker was killed."""
+
+class WorkerCrashed(WorkerError):
+    """A worker process died mid-job (segfault, abort, OOM kill)."""
+
+def _worker_main(conn, memory_mb):
+    if memory_mb and resource is not None:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args, kwargs = job
+        try:
+            conn.send((True, fn(*args, **kwargs)))
+        except BaseException as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+class _Worker:
+    def __init__(self, ctx, memory_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class WorkerPool:
+    """A bounded set of long-lived worker processes.
+
+    Each job runs in one worker. Unlike a ProcessPoolExecutor, a job that times out can be
+    killed on its own (its worker is replaced) without breaking the jobs running next to it.
+    """
+
+    def __init__(self, size=GEOMETRY_WORKERS, timeout_s=GEOMETRY_JOB_TIMEOUT_S, memory_mb=GEOMETRY_WORKER_MEMORY_MB,
+                 max_jobs_per_worker=None, recycle_on_error=False):
+        # spawn, not fork: the parent runs DB and server threads that must not be cloned mid-operation
+        self._ctx = multiprocessing.get_context("spawn")
+        self.size = size
+        self.timeout_s = timeout_s
+        self.memory_mb = memory_mb
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.recycle_on_error = recycle_on_error
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.conn.close()
+        return _Worker(self._ctx, self.memory_mb)
+
+    def _checkin(self, worker, failed):
+        worn_out = self.max_jobs_per_worker and worker.jobs >= self.max_jobs_per_worker
+        with self._lock:
+            if not self._closed and not worn_out and not (failed and self.recycle_on_error):
+                self._idle.append(worker)
+                return
+        worker.stop()
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Runs fn(*args, **kwargs) in a worker and blocks for the result. fn must be importable by name."""
+        timeout = self.timeout_s if timeout is None else timeout
+        with self._slots:
+            worker = self._checkout()
+            healthy = False
+            try:
+                worker.conn.send((fn, args, kwargs))
+                if not worker.conn.poll(timeout):
+                    raise WorkerTimeout(f"{fn.__name__} exceeded {timeout:.0f}s")
+                ok, value = worker.conn.recv()
+                worker.jobs += 1
+                healthy = True
+            except (EOFError, OSError):
+                raise WorkerCrashed(f"{fn.__name__}: worker process died mid-job")
+            finally:
+                if healthy:
+                    self._checkin(worker, failed=not ok)
+                else:
+                    worker.kill()
+        if not ok:
+            raise WorkerError(value)
+        return value
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """Awaitable call(): the event loop keeps serving while the job runs."""
+        return await asyncio.to_thread(self.call, fn, *args, timeout=timeout, **kwargs)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+_geometry_pool = None
+_gmsh_pool = None
+_pools_lock = threading.Lock()
+
+def get_geometry_pool():
+    """The shared geometry pool, created on first use so importing the app spawns nothing."""
+    global _geometry_pool
+    with _pools_lock:
+        if _geometry_pool is None:
+            _geometry_pool = WorkerPool()
+            logger.info(f"Geometry worker pool: {_geometry_pool.size} workers, {_geometry_pool.timeout_s:.0f}s timeout")
+        return _geometry_pool
+
+def get_gmsh_pool():
+    """Pool of long-lived GMSH workers for STEP conversion."""
+    global _gmsh_pool
+    with _pools_lock:
+        if _gmsh_pool is None:
+            _gmsh_pool = WorkerPool(size=GMSH_WORKERS, max_jobs_per_worker=GMSH_MAX_JOBS_PER_WORKER, recycle_on_error=True)
+            logger.info(f"GMSH worker pool: {_gmsh_pool.size} workers, recycled every {GMSH_MAX_JOBS_PER_WORKER} jobs")
+        return _gmsh_pool
+
+def shutdown_pools():
+    for pool in (_geometry_pool, _gmsh_pool):
+        if pool is not None:
+            pool.shutdown()